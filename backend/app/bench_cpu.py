@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+CPU microbenchmarks for the per-request work in main.py
+
+Covers prompt building, fallback persona construction, cultural map
+fence-stripping/repair parsing and result serialization for every language
+in LANGUAGE_MAPPING. Each run is appended to bench_results/cpu.jsonl and
+compared against the previous run, so regressions show up as numbers.
+
+Usage:
+    python bench_cpu.py                 # run all cases
+    python bench_cpu.py --filter parse  # only cases whose name contains "parse"
+    python bench_cpu.py --check         # exit 1 if a case regressed past --threshold
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+from datetime import datetime, timezone
+
+import main
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results")
+RESULTS_FILE = os.path.join(RESULTS_DIR, "cpu.jsonl")
+
+SAMPLE_INPUT = {
+    "movies": "Inception, The Matrix, Spirited Away",
+    "music": "Radiohead, BTS",
+    "brands": "Apple, Nike",
+    "gender": "female",
+}
+
+
+def build_payloads(language: str) -> dict:
+    """Representative persona and GPT cultural map content for one language"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        persona = main.build_fallback_persona(language=language, variation=7, **SAMPLE_INPUT)
+
+    # GPT returns one entry per requested country; reuse the fallback prose for size
+    fallback_entries = list(main.build_fallback_cultural_map(language).values())
+    entries = []
+    for i, country in enumerate(main.SAMPLE_COUNTRIES):
+        entry = dict(fallback_entries[i % len(fallback_entries)])
+        entry["country"] = country
+        entries.append(entry)
+
+    clean = json.dumps(entries, ensure_ascii=False, indent=2)
+    compact = json.dumps([[entry[field] for field in main.CULTURAL_MAP_FIELDS] for entry in entries], ensure_ascii=False)
+    return {
+        "persona": persona,
+        "persona_with_preferences": {**persona, "user_preferences": SAMPLE_INPUT},
+        "content_clean": clean,
+        "content_fenced": f"```json\n{clean}\n```",
+        "content_compact": compact,
+        # Trailing comma forces the repair branch
+        "content_broken": clean[:clean.rfind("]")] + ",]",
+    }
+
+
+def build_cases(languages: list[str]) -> dict:
+    cases = {}
+    for language in languages:
+        p = build_payloads(language)
+        target_language = main.LANGUAGE_MAPPING[language]
+        cases[f"cultural_prompt.{language}"] = lambda l=language, p=p: main.build_cultural_map_prompt(main.SAMPLE_COUNTRIES, language=l, user_persona=p["persona_with_preferences"])
+        cases[f"persona_prompt.{language}"] = lambda t=target_language: main.build_persona_prompt(target_language=t, variation=7, **SAMPLE_INPUT)
+        cases[f"fallback_persona.{language}"] = lambda l=language: main.build_fallback_persona(language=l, variation=7, **SAMPLE_INPUT)
+        cases[f"parse_clean.{language}"] = lambda p=p: main.parse_cultural_map_content(p["content_clean"])
+        cases[f"parse_fenced.{language}"] = lambda p=p: main.parse_cultural_map_content(p["content_fenced"])
+        cases[f"parse_repair.{language}"] = lambda p=p: main.parse_cultural_map_content(p["content_broken"])
+        cases[f"parse_compact.{language}"] = lambda p=p: main.parse_cultural_map_content(p["content_compact"])
+        cases[f"roundtrip.{language}"] = lambda p=p: json.loads(json.dumps(p["persona"]))
+        cases[f"serialize_result.{language}"] = lambda p=p: json.dumps(p["persona"])
+    return cases
+
+
+def measure(fn, repeat: int) -> float:
+    """Best-of-N nanoseconds per call"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def load_previous() -> dict | None:
+    if not os.path.exists(RESULTS_FILE):
+        return None
+    last = None
+    with open(RESULTS_FILE, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                last = json.loads(line)
+    return last
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="only run cases containing this substring")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative slowdown that counts as a regression")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 on regression")
+    parser.add_argument("--no-save", action="store_true", help="do not append this run to the results file")
+    args = parser.parse_args()
+
+    cases = {name: fn for name, fn in build_cases(list(main.LANGUAGE_MAPPING)).items() if args.filter in name}
+    previous = load_previous()
+    previous_results = previous["results"] if previous else {}
+
+    print(f"🚀 Running {len(cases)} CPU benchmark cases...")
+    results = {}
+    regressions = []
+    # Functions under test print debug output; keep it out of the report but inside the timing
+    with open(os.devnull, "w") as devnull:
+        for name, fn in cases.items():
+            with contextlib.redirect_stdout(devnull):
+                ns = measure(fn, args.repeat)
+            results[name] = round(ns, 1)
+
+            line = f"{name:<28} {ns / 1000:>10.2f} µs"
+            if name in previous_results:
+                delta = (ns - previous_results[name]) / previous_results[name]
+                line += f"  ({delta:+.1%})"
+                if delta > args.threshold:
+                    regressions.append(name)
+                    line += "  ⚠️ regression"
+            print(line)
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        record = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        }
+        with open(RESULTS_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"📁 Results appended to {RESULTS_FILE}")
+
+    if previous:
+        print(f"📊 Compared against {previous.get('commit', 'unknown')} ({previous.get('timestamp', '?')})")
+    if regressions:
+        print(f"❌ {len(regressions)} case(s) slower than {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1 if args.check else 0
+    print("✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Cold-start budget check: how long does a fresh interpreter take to import main?
+
+Every uvicorn worker spawn pays this before it can serve. Each run imports
+main in new processes, reports the best/median wall time plus the slowest
+modules from -X importtime, appends the numbers to bench_results/import.jsonl
+and exits 1 when the median exceeds the budget.
+
+Usage:
+    python bench_import.py                 # budget from IMPORT_BUDGET_MS (default 900)
+    python bench_import.py --budget-ms 700 --runs 10
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(APP_DIR, "bench_results")
+RESULTS_FILE = os.path.join(RESULTS_DIR, "import.jsonl")
+
+MEASURE_SNIPPET = "import time; t = time.perf_counter(); import main; print((time.perf_counter() - t) * 1000)"
+
+
+def clean_env() -> dict:
+    # Import must stay cheap even without credentials, so measure without them
+    return {k: v for k, v in os.environ.items() if k not in ("OPENAI_API_KEY", "QLOO_API_KEY")}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def measure_once() -> float:
+    out = subprocess.run([sys.executable, "-c", MEASURE_SNIPPET], cwd=APP_DIR, env=clean_env(), capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_modules(limit: int) -> list[tuple[str, float]]:
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=APP_DIR, env=clean_env(), capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Only top-level imports of main, not their children
+        if name.startswith("   ") and not name.startswith("    "):
+            rows.append((name.strip(), int(cumulative) / 1000))
+    return sorted(rows, key=lambda r: r[1], reverse=True)[:limit]
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "900")))
+    parser.add_argument("--top", type=int, default=8, help="number of slowest top-level imports to show")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    # First run warms the bytecode cache and is discarded
+    measure_once()
+    timings = [measure_once() for _ in range(args.runs)]
+    best, median = min(timings), statistics.median(timings)
+
+    print(f"🚀 import main: best {best:.0f} ms, median {median:.0f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    for name, ms in slowest_modules(args.top):
+        print(f"   {name:<24} {ms:>8.1f} ms")
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        record = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": {"import_best_ms": round(best, 1), "import_median_ms": round(median, 1)},
+            "budget_ms": args.budget_ms,
+        }
+        with open(RESULTS_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    if median > args.budget_ms:
+        print(f"❌ Import time over budget by {median - args.budget_ms:.0f} ms")
+        return 1
+    print("✅ Import time within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,136 @@
+"""
+Input canonicalization for movies / music / brands
+
+"Radiohead", " radiohead ", "RADIOHEAD" and "Radiohead, " should all hit the
+same cache entries at Qloo and at GPT. Each comma list is NFKC-normalized,
+whitespace-collapsed, split, de-duplicated and sorted by its case-folded key.
+Terms the alias table knows (learned from resolved Qloo entities of the
+field's type) are replaced by the entity's canonical name; unknown terms
+keep the spelling they were first seen with, so prompts built from them are
+byte-identical. Aliases are per entity type: a movie search resolving
+"queen" to "The Queen" must not rewrite the band Queen in the music field.
+Keystroke-level callers (/prefetch) pass record=False so half-typed
+prefixes are looked up but never stored as first spellings.
+"""
+import json
+import os
+import re
+import threading
+import unicodedata
+
+LIST_FIELDS = ("movies", "music", "brands")
+# Request field -> Qloo entity type whose aliases apply to it
+FIELD_TYPES = {"movies": "movie", "music": "artist", "brands": "brand"}
+
+_SEPARATORS = re.compile(r"[,;、]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def clean_term(term: str) -> str:
+    """NFKC + collapsed whitespace, original casing kept"""
+    term = unicodedata.normalize("NFKC", term)
+    return _WHITESPACE.sub(" ", term).strip()
+
+
+def term_key(term: str) -> str:
+    """Case-insensitive lookup key for a single term"""
+    return clean_term(term).casefold()
+
+
+def split_terms(value: str) -> list[str]:
+    return [t for t in (clean_term(part) for part in _SEPARATORS.split(unicodedata.normalize("NFKC", value or ""))) if t]
+
+
+class AliasTable:
+    """(entity type, term key) -> canonical display name, learned from Qloo search results"""
+
+    def __init__(self, maxsize: int = 50000):
+        self.maxsize = maxsize
+        self.aliases: dict[tuple[str, str], str] = {}
+        self.entity_names: dict[str, str] = {}
+        # First spelling seen for terms Qloo has not resolved (yet)
+        self._display: dict[tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+
+    def learn(self, query: str, entity_type: str, entity_id: str, name: str):
+        """Record that a single-term query of entity_type resolved to a Qloo entity"""
+        if not entity_id or not name or len(split_terms(query)) != 1:
+            return
+        with self._lock:
+            canonical = self.entity_names.setdefault(entity_id, clean_term(name))
+            if len(self.aliases) < self.maxsize:
+                self.aliases[(entity_type, term_key(query))] = canonical
+                self.aliases.setdefault((entity_type, term_key(canonical)), canonical)
+
+    def display(self, term: str, entity_type: str, record: bool = True) -> str:
+        key = (entity_type, term.casefold())
+        alias = self.aliases.get(key)
+        if alias is not None:
+            return alias
+        display = self._display.get(key)
+        if display is None and not record:
+            return term
+        if display is None:
+            with self._lock:
+                if len(self._display) < self.maxsize:
+                    display = self._display.setdefault(key, term)
+                else:
+                    display = term
+        return display
+
+    def load(self, path: str):
+        if not path or not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        with self._lock:
+            # {"aliases": {"artist": {"queen": "Queen"}}}; older untyped files are skipped
+            for entity_type, aliases in data.get("aliases", {}).items():
+                if isinstance(aliases, dict):
+                    self.aliases.update(((entity_type, key), name) for key, name in aliases.items())
+            self.entity_names.update(data.get("entities", {}))
+
+    def save(self, path: str):
+        with self._lock:
+            aliases: dict[str, dict[str, str]] = {}
+            for (entity_type, key), name in self.aliases.items():
+                aliases.setdefault(entity_type, {})[key] = name
+            data = {"aliases": aliases, "entities": dict(self.entity_names)}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def __len__(self) -> int:
+        return len(self.aliases)
+
+
+def canonical_list(value: str, aliases: AliasTable, entity_type: str, record: bool = True) -> str:
+    terms = {}
+    for term in split_terms(value):
+        display = aliases.display(term, entity_type, record)
+        terms.setdefault(display.casefold(), display)
+    return ", ".join(terms[k] for k in sorted(terms))
+
+
+def canonicalize_request(body: dict, aliases: AliasTable, record: bool = True) -> dict:
+    """Copy of body with movies/music/brands/gender in canonical form"""
+    canonical = dict(body)
+    for field in LIST_FIELDS:
+        if isinstance(body.get(field), str):
+            canonical[field] = canonical_list(body[field], aliases, FIELD_TYPES[field], record)
+    if isinstance(body.get("gender"), str):
+        canonical["gender"] = clean_term(body["gender"]).casefold()
+    return canonical
+
+
+def canonical_key(body: dict, language: str) -> str:
+    """Cache key for an already canonicalized request; the seed changes the persona"""
+    parts = [str(body.get(f, "")).casefold() for f in (*LIST_FIELDS, "gender")]
+    return "\x1f".join(parts + [language, str(body.get("randomSeed", 0)), ",".join(body.get("countries") or [])])
+
+
+def session_key(body: dict, language: str) -> str:
+    """canonical_key without the seed: requests that differ only in randomSeed share it"""
+    parts = [str(body.get(f, "")).casefold() for f in (*LIST_FIELDS, "gender")]
+    return "\x1f".join(parts + [language, ",".join(body.get("countries") or [])])
@@ -0,0 +1,170 @@
+"""
+Record / replay of upstream HTTP traffic (Qloo and OpenAI)
+
+In record mode every request that goes through the Qloo / OpenAI sessions
+(and the OpenAI SDK client used by the cultural map and translation) is
+sent for real, and the response is appended to <dir>/<upstream>.jsonl
+together with its latency. In replay mode nothing leaves the process: the
+same sessions answer from the cassette after sleeping the recorded latency
+times `speed` (1.0 = original timing, 0 = instant). The same traffic can
+then be replayed against every build with deterministic payloads.
+
+Requests are matched on method + URL + a hash of the body. The Qloo date
+window parameters are left out of the key so a cassette stays valid the
+next day. When the same request was recorded several times, replay returns
+the recordings in order and repeats the last one. Request headers (API
+keys) are never written.
+"""
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+MODES = ("off", "record", "replay")
+IGNORED_PARAMS = frozenset({"filter.start_date", "filter.end_date"})
+
+
+class CassetteMiss(Exception):
+    """Replay found no recording for a request"""
+
+
+def request_key(method: str, url: str, body: bytes | str | None) -> str:
+    parts = urlsplit(url)
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in IGNORED_PARAMS))
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    digest = hashlib.sha256(body or b"").hexdigest()[:16]
+    return f"{method.upper()} {urlunsplit((parts.scheme, parts.netloc, parts.path, query, ''))} {digest}"
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str, speed: float = 1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self._entries: dict[str, list[dict]] = {}
+        self._played: dict[str, int] = {}
+        self._lock = threading.Lock()
+        if mode == "replay":
+            self._load()
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            print(f"⚠️ Cassette not found, every request will miss: {self.path}")
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries.setdefault(entry["key"], []).append(entry)
+        print(f"📼 Replaying {sum(map(len, self._entries.values()))} recordings from {self.path}")
+
+    def __len__(self) -> int:
+        return sum(map(len, self._entries.values()))
+
+    def record(self, method: str, url: str, body, status: int, content_type: str, content: bytes, latency: float):
+        entry = {"key": request_key(method, url, body), "method": method, "url": url, "status": status,
+                 "contentType": content_type, "latencySeconds": round(latency, 4)}
+        try:
+            entry["body"] = content.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["bodyBase64"] = base64.b64encode(content).decode("ascii")
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._entries.setdefault(entry["key"], []).append(entry)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def play(self, method: str, url: str, body) -> tuple[int, str, bytes]:
+        """(status, content type, body) after the scaled recorded latency"""
+        key = request_key(method, url, body)
+        with self._lock:
+            recordings = self._entries.get(key)
+            if not recordings:
+                raise CassetteMiss(f"No recording for {method} {url}")
+            index = self._played.get(key, 0)
+            self._played[key] = index + 1
+            entry = recordings[min(index, len(recordings) - 1)]
+        if self.speed > 0:
+            time.sleep(entry["latencySeconds"] * self.speed)
+        content = base64.b64decode(entry["bodyBase64"]) if "bodyBase64" in entry else entry["body"].encode("utf-8")
+        return entry["status"], entry["contentType"], content
+
+    def adapter(self, **kwargs) -> BaseAdapter:
+        """requests adapter for a Session: recording HTTPAdapter or offline replay adapter"""
+        return _RecordingAdapter(self, **kwargs) if self.mode == "record" else _ReplayAdapter(self)
+
+    def httpx_transport(self):
+        """Transport for the OpenAI SDK's httpx client"""
+        import httpx
+
+        cassette = self
+
+        class RecordingTransport(httpx.HTTPTransport):
+            def handle_request(self, request: httpx.Request) -> httpx.Response:
+                body = request.read()
+                started = time.perf_counter()
+                response = super().handle_request(request)
+                content = response.read()
+                cassette.record(request.method, str(request.url), body, response.status_code,
+                                response.headers.get("content-type", ""), content, time.perf_counter() - started)
+                # The stream was consumed above; hand back a response built from the decoded bytes
+                return httpx.Response(response.status_code, headers={"content-type": response.headers.get("content-type", "")},
+                                      content=content, request=request)
+
+        class ReplayTransport(httpx.BaseTransport):
+            def handle_request(self, request: httpx.Request) -> httpx.Response:
+                try:
+                    status, content_type, content = cassette.play(request.method, str(request.url), request.read())
+                except CassetteMiss as e:
+                    raise httpx.ConnectError(str(e), request=request)
+                return httpx.Response(status, headers={"content-type": content_type}, content=content, request=request)
+
+        return RecordingTransport() if self.mode == "record" else ReplayTransport()
+
+
+class _RecordingAdapter(HTTPAdapter):
+    def __init__(self, cassette: Cassette, **kwargs):
+        self.cassette = cassette
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        started = time.perf_counter()
+        response = super().send(request, **kwargs)
+        self.cassette.record(request.method, request.url, request.body, response.status_code,
+                             response.headers.get("content-type", ""), response.content, time.perf_counter() - started)
+        return response
+
+
+class _ReplayAdapter(BaseAdapter):
+    def __init__(self, cassette: Cassette):
+        super().__init__()
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        try:
+            status, content_type, content = self.cassette.play(request.method, request.url, request.body)
+        except CassetteMiss as e:
+            raise requests.ConnectionError(str(e), request=request)
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict({"content-type": content_type})
+        response._content = content
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
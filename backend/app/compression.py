@@ -0,0 +1,218 @@
+"""
+Negotiated response encoding: gzip / brotli compression and optional MessagePack
+
+Pure ASGI middleware, outermost in the stack:
+  - Accept-Encoding picks brotli (if the `brotli` package is installed) or gzip;
+    bodies under `minimum_size` are sent as-is.
+  - Bodies of `offload_size` bytes or more are compressed in a worker thread so
+    multilingual /analyze responses do not stall the event loop.
+  - Streaming responses (/analyze/batch NDJSON) are compressed chunk by chunk
+    with a sync flush, so each line still reaches the client immediately.
+  - Strong ETags on re-encoded bodies get a variant suffix ("abc-gzip",
+    "abc-msgpack-br"); handlers comparing If-None-Match must strip it.
+  - `Accept: application/msgpack` re-encodes JSON responses as MessagePack
+    when the `msgpack` package is installed.
+  - Every response whose representation depends on the request headers (any
+    compressible body, whatever its size, and every 304) carries
+    `Vary: Accept-Encoding` / `Vary: Accept`, so shared caches never hand a
+    gzip or msgpack variant, or a 304 for one, to the wrong client.
+"""
+import asyncio
+import gzip
+import json
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # optional
+    msgpack = None
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/msgpack", "application/javascript")
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+ETAG_VARIANT_SUFFIXES = ("-gzip", "-br", "-msgpack")
+
+
+def strip_etag_variant(etag: str) -> str:
+    """'W/"abc-msgpack-gzip"' -> '"abc"'"""
+    etag = etag.removeprefix("W/")
+    stripped = True
+    while stripped:
+        stripped = False
+        for suffix in ETAG_VARIANT_SUFFIXES:
+            if etag.endswith(suffix + '"'):
+                etag = etag[:-len(suffix) - 1] + '"'
+                stripped = True
+    return etag
+
+
+def parse_quality_list(header: str) -> dict[str, float]:
+    """"gzip, br;q=0.8" -> {"gzip": 1.0, "br": 0.8}"""
+    result = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        result[name.strip().lower()] = q
+    return result
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    accepted = parse_quality_list(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    scored = [(accepted.get(name, wildcard), -i, name) for i, name in enumerate(candidates)]
+    q, _, name = max(scored)
+    return name if q > 0 else None
+
+
+def describe() -> str:
+    """Startup log line naming the optional encoders that are active"""
+    brotli_state = "on" if brotli is not None else "off (pip install brotli)"
+    msgpack_state = "on" if msgpack is not None else "off (pip install msgpack)"
+    return f"gzip on, brotli {brotli_state}, MessagePack {msgpack_state}"
+
+
+def accepts_msgpack(accept: str) -> bool:
+    accepted = parse_quality_list(accept)
+    return any(accepted.get(t, 0) > 0 for t in MSGPACK_TYPES)
+
+
+class _StreamCompressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.finish() if self.encoding == "br" else self._compressor.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024, offload_size: int = 64 * 1024,
+                 gzip_level: int = 6, brotli_quality: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""))
+        to_msgpack = msgpack is not None and accepts_msgpack(request_headers.get("accept", ""))
+        # Even a request that negotiates nothing gets Vary on its response
+        await self.app(scope, receive, _EncodingResponder(self, send, encoding, to_msgpack).send)
+
+    def compress(self, data: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+
+
+class _EncodingResponder:
+    def __init__(self, middleware: CompressionMiddleware, send, encoding: str | None, to_msgpack: bool):
+        self.middleware = middleware
+        self._send = send
+        self.encoding = encoding
+        self.to_msgpack = to_msgpack
+        self.start_message = None
+        self.stream: _StreamCompressor | None = None
+        self.passthrough = False
+
+    @staticmethod
+    def _add_vary(headers: MutableHeaders, status: int, content_type: str):
+        if status == 304 or content_type.startswith(COMPRESSIBLE_TYPES):
+            headers.add_vary_header("Accept-Encoding")
+        if msgpack is not None and (status == 304 or content_type.startswith("application/json")):
+            headers.add_vary_header("Accept")
+
+    @staticmethod
+    def _tag_etag(headers: MutableHeaders, variant: str):
+        # A strong ETag names exact bytes, so each encoded variant gets its own
+        etag = headers.get("etag", "")
+        if etag.startswith('"'):
+            headers["etag"] = f'{etag[:-1]}-{variant}"'
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            content_type = headers.get("content-type", "")
+            compressible = (
+                start["status"] not in (204, 304)
+                and "content-encoding" not in headers
+                and content_type.startswith(COMPRESSIBLE_TYPES)
+            )
+            if "content-encoding" not in headers:
+                self._add_vary(headers, start["status"], content_type)
+
+            if not more_body:
+                # Whole body in one message: convert and compress in one go
+                if self.to_msgpack and content_type.startswith("application/json") and start["status"] < 300:
+                    body = msgpack.packb(json.loads(body), use_bin_type=True)
+                    headers["content-type"] = "application/msgpack"
+                    self._tag_etag(headers, "msgpack")
+                if compressible and self.encoding and len(body) >= self.middleware.minimum_size:
+                    if len(body) >= self.middleware.offload_size:
+                        body = await asyncio.to_thread(self.middleware.compress, body, self.encoding)
+                    else:
+                        body = self.middleware.compress(body, self.encoding)
+                    headers["content-encoding"] = self.encoding
+                    self._tag_etag(headers, self.encoding)
+                if start["status"] not in (204, 304):
+                    headers["content-length"] = str(len(body))
+                await self._send(start)
+                await self._send({"type": "http.response.body", "body": body})
+                return
+
+            # Streaming response: compress incrementally, length is unknown
+            if compressible and self.encoding:
+                self.stream = _StreamCompressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+                headers["content-encoding"] = self.encoding
+                if "content-length" in headers:
+                    del headers["content-length"]
+            else:
+                self.passthrough = True
+            await self._send(start)
+            if self.passthrough:
+                await self._send(message)
+                return
+
+        data = self.stream.chunk(body) if body else b""
+        if not more_body:
+            data += self.stream.finish()
+        await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
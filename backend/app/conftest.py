@@ -0,0 +1,84 @@
+"""
+Shared pytest setup: main.py is imported with every on-disk file pointed at a
+temporary directory and no upstream keys, and the `upstream` fixture replaces
+the Qloo and GPT stages with in-process fakes.
+"""
+import os
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="taste-tests-")
+os.environ.update({
+    "OPENAI_API_KEY": "",
+    "QLOO_API_KEY": "",
+    "UPSTREAM_CASSETTE_MODE": "off",
+    "RATE_LIMIT_ENABLED": "false",
+    "WARMUP_ENTITIES_FILE": os.path.join(_TMP, "warmup_entities.json"),
+    "ENTITY_INDEX_FILE": os.path.join(_TMP, "entity_index.jsonl"),
+    "ALIAS_TABLE_FILE": os.path.join(_TMP, "entity_aliases.json"),
+    "RESULT_STORE_PATH": os.path.join(_TMP, "results.sqlite3"),
+    "RATE_LIMIT_SQLITE_PATH": os.path.join(_TMP, "ratelimit.sqlite3"),
+    "PRECOMPUTED_INDEX_FILE": os.path.join(_TMP, "precomputed.json"),
+    "PROFILE_DIR": os.path.join(_TMP, "profiles"),
+})
+
+import pytest  # noqa: E402
+
+
+class FakeUpstream:
+    """Records calls and returns canned Qloo / GPT output; tests overwrite the fields"""
+
+    def __init__(self):
+        self.persona = {
+            "personaName": "The Dreamer",
+            "traits": ["curious", "calm"],
+            "culturalTwin": "David Bowie",
+            "description": "Likes slow films and loud guitars",
+            "interests": ["cinema"],
+            "culturalDNAScore": {"Europe": "60%", "Asia": "40%"},
+            "archetype": {"name": "Explorer", "description": "Always looking"},
+        }
+        self.insights_fail = False
+        self.calls = {"entities": 0, "trending": 0, "persona": 0, "culturalMap": 0}
+
+    def resolve_entities(self, body):
+        self.calls["entities"] += 1
+        return {"movie": "M1", "artist": "A1", "brand": "B1"}
+
+    def fetch_trending(self, entity_ids):
+        self.calls["trending"] += 1
+        return []
+
+    def generate_persona_from_taste(self, movies, music, brands, gender, language="en", variation=0):
+        self.calls["persona"] += 1
+        return dict(self.persona)
+
+    def generate_cultural_map_insights(self, countries, language="en", user_persona=None):
+        import main
+
+        self.calls["culturalMap"] += 1
+        if self.insights_fail:
+            return main.FallbackResult({c: v for c, v in main.build_fallback_cultural_map(language).items() if c in countries})
+        return {c: {"country": c, "culturalInsight": f"{c} insight for {(user_persona or {}).get('personaName')}"} for c in countries}
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    import main
+    from canonical import AliasTable
+
+    fake = FakeUpstream()
+    for name in ("resolve_entities", "fetch_trending", "generate_persona_from_taste", "generate_cultural_map_insights"):
+        monkeypatch.setattr(main, name, getattr(fake, name))
+    monkeypatch.setattr(main, "entity_aliases", AliasTable())
+    for cache in (main.result_cache, main.completion_cache, main.analysis_sessions, main.persona_store,
+                  main.country_cache, main.entity_cache, main.trending_cache):
+        cache.clear()
+    return fake
+
+
+@pytest.fixture
+def client(upstream):
+    from fastapi.testclient import TestClient
+    import main
+
+    return TestClient(main.app)
@@ -0,0 +1,198 @@
+"""
+Local Qloo entity index for autocomplete
+
+Every entity Qloo /search returns is added here (plus an optional seed file),
+so suggestions are answered from memory and autocomplete_entity can skip the
+network for names it has already seen. Lookups use:
+  - a name-prefix map (what the user is typing),
+  - a word-prefix map ("queen" finds "Dancing Queen"),
+  - a trigram map for typos / partial matches.
+The index is persisted as an append-only JSON-lines log; new entities are
+appended through one open handle as they arrive and the log is compacted on
+load. At most `maxsize` entities are kept; past that the least recently
+added one is dropped from every map (and from the log at the next compaction).
+"""
+import json
+import os
+import threading
+import unicodedata
+from collections import OrderedDict, defaultdict
+from typing import Optional, TextIO
+
+MAX_PREFIX = 16
+
+
+def search_key(text: str) -> str:
+    """Case-, width- and accent-insensitive form ("Beyoncé" -> "beyonce")"""
+    text = unicodedata.normalize("NFKD", unicodedata.normalize("NFKC", text))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.casefold().split())
+
+
+def trigrams(key: str) -> set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def short_type(entity_type: str) -> str:
+    """"urn:entity:artist" -> "artist" """
+    return (entity_type or "").rsplit(":", 1)[-1].lower()
+
+
+def index_keys(key: str) -> tuple[list[str], list[str], set[str]]:
+    """(name prefixes, word prefixes, trigrams) of a search key"""
+    prefixes = [key[:i] for i in range(1, min(len(key), MAX_PREFIX) + 1)]
+    word_prefixes = [word[:i] for word in key.split()[1:] for i in range(1, min(len(word), MAX_PREFIX) + 1)]
+    return prefixes, word_prefixes, trigrams(key)
+
+
+class EntityIndex:
+    def __init__(self, path: Optional[str] = None, maxsize: int = 200000):
+        self.path = path
+        self.maxsize = maxsize
+        self.entities: OrderedDict[str, dict] = OrderedDict()
+        self._by_name: dict[tuple[str, str], str] = {}
+        self._prefixes: dict[str, set[str]] = defaultdict(set)
+        self._word_prefixes: dict[str, set[str]] = defaultdict(set)
+        self._trigrams: dict[str, set[str]] = defaultdict(set)
+        self._log: Optional[TextIO] = None
+        self._lock = threading.Lock()
+
+    def _index(self, entity: dict):
+        entity_id = entity["id"]
+        if entity_id in self.entities:
+            self._unindex(entity_id)
+        key = search_key(entity["name"])
+        self.entities[entity_id] = entity
+        self._by_name.setdefault((key, entity["type"]), entity_id)
+        prefixes, word_prefixes, grams = index_keys(key)
+        for prefix in prefixes:
+            self._prefixes[prefix].add(entity_id)
+        for prefix in word_prefixes:
+            self._word_prefixes[prefix].add(entity_id)
+        for gram in grams:
+            self._trigrams[gram].add(entity_id)
+        while len(self.entities) > self.maxsize:
+            self._unindex(next(iter(self.entities)))
+
+    def _unindex(self, entity_id: str):
+        entity = self.entities.pop(entity_id)
+        key = search_key(entity["name"])
+        if self._by_name.get((key, entity["type"])) == entity_id:
+            del self._by_name[(key, entity["type"])]
+        prefixes, word_prefixes, grams = index_keys(key)
+        for table, keys in ((self._prefixes, prefixes), (self._word_prefixes, word_prefixes), (self._trigrams, grams)):
+            for k in keys:
+                ids = table.get(k)
+                if ids is not None:
+                    ids.discard(entity_id)
+                    if not ids:
+                        del table[k]
+
+    def add(self, entity_id: str, name: str, entity_type: str, persist: bool = True) -> bool:
+        """Returns True if the entity was new"""
+        if not entity_id or not name:
+            return False
+        entity = {"id": entity_id, "name": name, "type": short_type(entity_type)}
+        with self._lock:
+            if self.entities.get(entity_id) == entity:
+                return False
+            self._index(entity)
+            if persist and self.path:
+                try:
+                    if self._log is None:
+                        self._log = open(self.path, "a", encoding="utf-8")
+                    self._log.write(json.dumps(entity, ensure_ascii=False) + "\n")
+                    self._log.flush()
+                except OSError as e:
+                    # The in-memory index still works; the entity is re-learned on the next search
+                    print(f"⚠️ Could not persist entity {entity_id}: {e}")
+        return True
+
+    def add_search_results(self, results: list[dict]) -> int:
+        return sum(self.add(r.get("id", ""), r.get("name", ""), r.get("type", "")) for r in results)
+
+    def lookup(self, query: str, entity_type: str) -> Optional[str]:
+        """Exact (normalized) name match for the given type, as autocomplete_entity would pick it"""
+        return self._by_name.get((search_key(query), short_type(entity_type)))
+
+    def suggest(self, query: str, entity_type: str = "", limit: int = 8) -> list[dict]:
+        key = search_key(query)
+        if not key:
+            return []
+        wanted = short_type(entity_type)
+        prefix = key[:MAX_PREFIX]
+
+        # entity_id -> (rank, -score, name length, name); lower sorts first
+        scored: dict[str, tuple] = {}
+
+        def consider(matches, rank):
+            for entity_id, score in matches:
+                entity = self.entities[entity_id]
+                if wanted and entity["type"] != wanted:
+                    continue
+                candidate = (rank, -score, len(entity["name"]), entity["name"])
+                if entity_id not in scored or candidate < scored[entity_id]:
+                    scored[entity_id] = candidate
+
+        with self._lock:
+            name_matches = self._prefixes.get(prefix, ())
+            if len(key) > MAX_PREFIX:
+                name_matches = [i for i in name_matches if search_key(self.entities[i]["name"]).startswith(key)]
+            consider(((i, 0) for i in name_matches), 0)
+            consider(((i, 0) for i in self._word_prefixes.get(prefix, ())), 1)
+
+            # Not enough prefix hits: fall back to trigram overlap (typos, infixes)
+            if len(scored) < limit and len(key) >= 3:
+                grams = trigrams(key)
+                counts: dict[str, int] = defaultdict(int)
+                for gram in grams:
+                    for entity_id in self._trigrams.get(gram, ()):
+                        counts[entity_id] += 1
+                threshold = max(2, len(grams) // 2)
+                consider(((i, c / len(grams)) for i, c in counts.items() if c >= threshold), 2)
+
+            best = sorted(scored.items(), key=lambda item: item[1])[:limit]
+            return [self.entities[entity_id] for entity_id, _ in best]
+
+    def load(self, seed_path: Optional[str] = None):
+        """Seed file (JSON list) first, then the log; rewrites the log without duplicates"""
+        entries = []
+        if seed_path and os.path.exists(seed_path):
+            with open(seed_path, encoding="utf-8") as f:
+                entries += json.load(f)
+        log_lines = 0
+        if self.path and os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        log_lines += 1
+                        entries.append(json.loads(line))
+
+        with self._lock:
+            for entry in entries:
+                if entry.get("id") and entry.get("name"):
+                    self._index({"id": entry["id"], "name": entry["name"], "type": short_type(entry.get("type", ""))})
+        if self.path and log_lines > len(self.entities):
+            self.compact()
+
+    def compact(self):
+        with self._lock:
+            self._close_log()
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for entity in self.entities.values():
+                    f.write(json.dumps(entity, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.path)
+
+    def _close_log(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def close(self):
+        with self._lock:
+            self._close_log()
+
+    def __len__(self) -> int:
+        return len(self.entities)
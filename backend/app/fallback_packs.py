@@ -0,0 +1,73 @@
+"""
+Per-language fallback resource packs
+
+The canned persona / cultural map used when OpenAI is unavailable lives in
+resources/fallback/<language>.json (names, traits, DNA region labels,
+archetype and the four-country cultural map), with language-independent
+data in common.json. A pack is read the first time its language is needed
+and kept for the life of the worker as a read-only structure
+(MappingProxyType / tuple) shared by every request. Callers build their
+response dicts from it with `thaw`, so nothing downstream can mutate the
+shared copy.
+"""
+import json
+import os
+import threading
+from types import MappingProxyType
+from typing import Any, Mapping
+
+PACK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "fallback")
+DEFAULT_LANGUAGE = "en"
+
+_packs: dict[str, Mapping] = {}
+_lock = threading.Lock()
+
+
+def freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Plain, JSON-serialisable copy of a frozen value"""
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+
+def _load(name: str) -> Mapping | None:
+    pack = _packs.get(name)
+    if pack is not None:
+        return pack
+    with _lock:
+        pack = _packs.get(name)
+        if pack is None:
+            # Language codes come from requests; never let them name a path
+            if not name.isalpha():
+                return None
+            path = os.path.join(PACK_DIR, f"{name}.json")
+            if not os.path.exists(path):
+                return None
+            with open(path, encoding="utf-8") as f:
+                pack = freeze(json.load(f))
+            _packs[name] = pack
+            print(f"📦 Loaded fallback pack: {name}")
+        return pack
+
+
+def language_pack(language: str) -> Mapping:
+    """Pack for `language`, or the English one when there is none"""
+    return _load(language) or _load(DEFAULT_LANGUAGE)
+
+
+def common_pack() -> Mapping:
+    return _load("common")
+
+
+def loaded_languages() -> list[str]:
+    return sorted(_packs)
@@ -0,0 +1,114 @@
+"""
+Bounded in-memory job queue for long-running analyses
+
+Jobs are executed by a fixed pool of asyncio workers; the blocking pipeline
+itself runs in a thread. submit() raises QueueFullError instead of growing
+the queue, and finished jobs are dropped after ttl_seconds.
+"""
+import asyncio
+import time
+import traceback
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+
+class QueueFullError(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    id: str
+    status: str = "queued"  # queued -> running -> done | failed
+    stage: Optional[str] = None
+    partial: dict = field(default_factory=dict)
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def report(self, stage: str, data: dict):
+        """Progress callback passed to the pipeline; called from the worker thread"""
+        self.stage = stage
+        self.partial = {**self.partial, **data}
+
+    def to_dict(self) -> dict:
+        return {
+            "jobId": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "partial": self.partial if self.status != "done" else None,
+            "result": self.result,
+            "error": self.error,
+            "createdAt": self.created_at,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+        }
+
+
+class JobQueue:
+    def __init__(self, workers: int = 2, max_queued: int = 100, ttl_seconds: float = 3600):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.ttl_seconds = ttl_seconds
+        self.jobs: dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        print(f"🧵 Job queue started: {self.workers} workers, {self.max_queued} slots")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, fn: Callable[..., dict], *args) -> Job:
+        """fn(*args, on_stage=job.report) runs in a worker thread"""
+        if self._queue is None:
+            raise RuntimeError("Job queue is not running")
+        self._expire()
+        job = Job(id=uuid.uuid4().hex)
+        try:
+            self._queue.put_nowait((job, fn, args))
+        except asyncio.QueueFull:
+            raise QueueFullError(f"{self.max_queued} jobs already queued")
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._expire()
+        return self.jobs.get(job_id)
+
+    def stats(self) -> dict:
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"queued": self._queue.qsize() if self._queue else 0, "capacity": self.max_queued, "jobs": counts}
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl_seconds
+        expired = [job_id for job_id, job in self.jobs.items() if job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job, fn, args = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.result = await asyncio.to_thread(fn, *args, on_stage=job.report)
+                job.status = "done"
+            except Exception as e:
+                traceback.print_exc()
+                job.error = f"Analysis failed: {str(e)}"
+                job.status = "failed"
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
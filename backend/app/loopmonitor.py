@@ -0,0 +1,87 @@
+"""
+Event-loop lag monitor and blocking-call detector
+
+A background task sleeps for `interval` seconds and measures how late it
+wakes up. That delay is the event-loop lag every other request saw at the
+same moment; a sync `requests.get` or a huge `print` in an `async def`
+shows up here right away instead of as a slow p99 much later.
+
+In debug mode a watchdog thread also watches the task's heartbeat. When the
+loop has not come back for `block_threshold` seconds, the watchdog reads the
+loop thread's stack *while it is still blocked* and prints it, so the report
+names the offending line rather than whatever ran after it.
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.1, block_threshold: float = 0.1, debug: bool = False):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.debug = debug
+        self.last_lag = 0.0
+        self.stalls = 0
+        self.blocked: deque[dict] = deque(maxlen=20)
+        self._max_lag = 0.0
+        self._heartbeat: float | None = None
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task | None = None
+        self._stop = threading.Event()
+        self._watchdog: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        if self.debug:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self._heartbeat = time.monotonic()
+            with self._lock:
+                self.last_lag = lag
+                self._max_lag = max(self._max_lag, lag)
+                if lag >= self.block_threshold:
+                    self.stalls += 1
+
+    def _watch(self):
+        reported = None
+        while not self._stop.wait(self.block_threshold / 2):
+            beat = self._heartbeat
+            # The heartbeat is normally up to `interval` old; anything past that is blocking
+            if beat is None or beat == reported or time.monotonic() - beat < self.interval + self.block_threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            reported = beat
+            stack = "".join(traceback.format_stack(frame))
+            self.blocked.append({"at": time.time(), "stack": stack})
+            print(f"🐢 Event loop blocked for more than {self.block_threshold:g}s, loop thread is at:\n{stack}")
+
+    def take_max_lag(self) -> float:
+        """Worst lag since the previous call (one scrape interval)"""
+        with self._lock:
+            value, self._max_lag = self._max_lag, self.last_lag
+            return value
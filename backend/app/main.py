@@ -1,22 +1,192 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict, field_validator
+from starlette.datastructures import MutableHeaders
 import json
 import os
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
-from openai import OpenAI
 import traceback
+import hashlib
+import hmac
 from datetime import date
 from urllib.parse import quote
-from typing import Optional
+from typing import Any, Callable, Optional
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 import asyncio
+import threading
 import time
 
+from cache import MISSING, TTLCache
+from canonical import AliasTable, canonical_key, canonicalize_request, session_key, term_key
+from cassette import MODES as CASSETTE_MODES, Cassette
+from compression import CompressionMiddleware, describe as describe_compression, strip_etag_variant
+from entity_index import EntityIndex
+from fallback_packs import common_pack, language_pack, thaw
+from jobs import JobQueue, QueueFullError
+from loopmonitor import LoopLagMonitor
+import metrics
+from precompute import DEFAULT_INDEX_FILE, PrecomputedIndex
+from profiler import ProfileSession
+from ratelimit import RateLimitResult, TokenBucketLimiter, build_store
+from results import ResultStore
+from routing import ModelRouter, Route, load_routes
+from scheduler import UpstreamScheduler, current_lane, run_in_lane
+from translation import build_translation_prompt, collect_strings, parse_translation, replace_strings
+
+# Modül seviyesindeki ayarlar os.getenv ile okunduğu için .env import sırasında yüklenir
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-app = FastAPI(debug=True)
+# 📼 Upstream kayıt / tekrar oynatma: UPSTREAM_CASSETTE_MODE=record gerçek Qloo/OpenAI
+# trafiğini gecikmeleriyle cassette dosyalarına yazar, =replay ağa çıkmadan aynı
+# trafiği (UPSTREAM_CASSETTE_SPEED ile ölçeklenmiş sürelerle) geri oynatır
+UPSTREAM_CASSETTE_MODE = os.getenv("UPSTREAM_CASSETTE_MODE", "off").lower()
+UPSTREAM_CASSETTE_DIR = os.getenv("UPSTREAM_CASSETTE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cassettes"))
+UPSTREAM_CASSETTE_SPEED = float(os.getenv("UPSTREAM_CASSETTE_SPEED", "1.0"))
+if UPSTREAM_CASSETTE_MODE not in CASSETTE_MODES:
+    print(f"⚠️ Unknown UPSTREAM_CASSETTE_MODE {UPSTREAM_CASSETTE_MODE!r}, cassettes disabled")
+    UPSTREAM_CASSETTE_MODE = "off"
+if UPSTREAM_CASSETTE_MODE == "replay":
+    # Replay anahtar istemez; fallback'lere düşülmesin diye yer tutucu anahtar
+    os.environ.setdefault("QLOO_API_KEY", "cassette-replay")
+    os.environ.setdefault("OPENAI_API_KEY", "cassette-replay")
+
+def build_cassette(upstream: str) -> Cassette | None:
+    if UPSTREAM_CASSETTE_MODE == "off":
+        return None
+    return Cassette(os.path.join(UPSTREAM_CASSETTE_DIR, f"{upstream}.jsonl"), UPSTREAM_CASSETTE_MODE, UPSTREAM_CASSETTE_SPEED)
+
+qloo_cassette = build_cassette("qloo")
+openai_cassette = build_cassette("openai")
+
+# OpenAI SDK'nın import'u ve client kurulumu pahalı; ilk kullanımda yapılır.
+# API anahtarı yoksa hiç kurulmaz, fallback'ler çalışır.
+_openai_client = None
+_openai_client_lock = threading.Lock()
+
+def has_openai_key() -> bool:
+    api_key = os.getenv("OPENAI_API_KEY")
+    return bool(api_key) and api_key != "your-openai-api-key-here"
+
+def get_openai_client():
+    global _openai_client
+    if _openai_client is None:
+        with _openai_client_lock:
+            if _openai_client is None:
+                from openai import OpenAI
+                if openai_cassette is not None:
+                    import httpx
+                    _openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=httpx.Client(transport=openai_cassette.httpx_transport()))
+                else:
+                    _openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _openai_client
+
+OPENAI_CHAT_URL = "https://api.openai.com/v1/chat/completions"
+
+def build_session(pool_size: int, cassette: Cassette | None = None) -> requests.Session:
+    """Keep-alive bağlantıları yeniden kullanan HTTP session"""
+    session = requests.Session()
+    if cassette is not None:
+        adapter = cassette.adapter(pool_connections=4, pool_maxsize=pool_size)
+    else:
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+# Upstream bağlantı havuzları; warm-up sırasında açılır
+UPSTREAM_POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", "16"))
+qloo_session = build_session(UPSTREAM_POOL_SIZE, qloo_cassette)
+openai_session = build_session(UPSTREAM_POOL_SIZE, openai_cassette)
+# Upstream başına global eşzamanlılık limiti ve öncelik şeritleri (interactive > batch > prefetch)
+upstream_scheduler = UpstreamScheduler(
+    {"openai": int(os.getenv("UPSTREAM_LIMIT_OPENAI", "8")), "qloo": int(os.getenv("UPSTREAM_LIMIT_QLOO", "12"))},
+    wait_timeout=float(os.getenv("SCHEDULER_WAIT_TIMEOUT_SECONDS", "30")),
+)
+
+def scheduler_samples(field: str) -> list:
+    stats = upstream_scheduler.stats()
+    if field == "active":
+        return [({"upstream": name}, s["active"]) for name, s in stats.items()]
+    return [({"upstream": name, "lane": lane_name}, v) for name, s in stats.items() for lane_name, v in s[field].items()]
+
+metrics.Gauge("scheduler_active_slots", "Upstream calls in flight", callback=lambda: scheduler_samples("active"))
+metrics.Gauge("scheduler_queued", "Calls waiting for an upstream slot", callback=lambda: scheduler_samples("queued"))
+metrics.Counter("scheduler_granted_total", "Upstream slots granted", callback=lambda: scheduler_samples("granted"))
+metrics.Counter("scheduler_wait_seconds_total", "Time spent waiting for upstream slots", callback=lambda: scheduler_samples("waitSeconds"))
+
+# 🧭 Aşama / dil başına model seçimi; birincil model bütçesini aşarsa hızlı modele düşülür
+MODEL_ROUTING_FILE = os.getenv("MODEL_ROUTING_FILE", "")
+model_routes, language_model_routes = load_routes({
+    "persona": Route(
+        os.getenv("PERSONA_MODEL", "gpt-4"),
+        os.getenv("PERSONA_FALLBACK_MODEL", "gpt-4o-mini"),
+        float(os.getenv("PERSONA_LATENCY_BUDGET_SECONDS", "20")),
+    ),
+    # Cultural map büyük ölçüde şablon içerik, en yavaş modele ihtiyaç yok
+    "cultural_map": Route(
+        os.getenv("CULTURAL_MAP_MODEL", "gpt-4o-mini"),
+        os.getenv("CULTURAL_MAP_FALLBACK_MODEL", "gpt-3.5-turbo"),
+        float(os.getenv("CULTURAL_MAP_LATENCY_BUDGET_SECONDS", "10")),
+    ),
+    # Dil değişiminde mevcut analizin çevirisi
+    "translation": Route(
+        os.getenv("TRANSLATION_MODEL", "gpt-4o-mini"),
+        os.getenv("TRANSLATION_FALLBACK_MODEL", "gpt-3.5-turbo"),
+        float(os.getenv("TRANSLATION_LATENCY_BUDGET_SECONDS", "8")),
+    ),
+}, MODEL_ROUTING_FILE)
+
+model_route_decisions = metrics.Counter("model_route_decisions_total", "GPT model routing decisions by stage, model and reason")
+
+def record_route_decision(stage: str, language: str, decision):
+    model_route_decisions.inc(stage=stage, language=language, model=decision.model, reason=decision.reason)
+    if decision.reason != "primary":
+        print(f"🧭 {stage} [{language}] → {decision.model} ({decision.reason})")
+
+model_router = ModelRouter(
+    model_routes, language_model_routes,
+    probe_interval=float(os.getenv("MODEL_PROBE_INTERVAL_SECONDS", "60")),
+    on_decision=record_route_decision,
+)
+metrics.Gauge("model_latency_ewma_seconds", "Smoothed GPT latency per stage and model",
+              callback=lambda: [({"stage": stage, "model": model}, round(v, 3)) for (stage, model), v in model_router.latencies().items()])
+
+# Bir analizin Qloo trending istekleri bu havuzdan aynı anda gönderilir (thread'ler ilk kullanımda açılır)
+qloo_fanout = ThreadPoolExecutor(max_workers=UPSTREAM_POOL_SIZE, thread_name_prefix="qloo-fanout")
+
+# Qloo cache'leri: (query, type) -> entity ID, (entity ID, type, gün) -> trending isimleri
+entity_cache = TTLCache(maxsize=20000, ttl=float(os.getenv("ENTITY_CACHE_TTL_SECONDS", "86400")))
+trending_cache = TTLCache(maxsize=20000, ttl=float(os.getenv("TRENDING_CACHE_TTL_SECONDS", "3600")))
+
+# Kanonik istek -> analiz sonucu, ve GPT prompt'u -> completion içeriği
+result_cache = TTLCache(maxsize=5000, ttl=float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600")))
+completion_cache = TTLCache(maxsize=5000, ttl=float(os.getenv("COMPLETION_CACHE_TTL_SECONDS", "86400")))
+
+# Qloo'nun çözdüğü entity isimlerinden öğrenilen alias tablosu ("matrix" -> "The Matrix")
+ALIAS_TABLE_FILE = os.getenv("ALIAS_TABLE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "entity_aliases.json"))
+entity_aliases = AliasTable()
+
+# Qloo /search sonuçlarından biriken yerel entity index'i (autocomplete + /entities/suggest)
+ENTITY_INDEX_FILE = os.getenv("ENTITY_INDEX_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "entity_index.jsonl"))
+ENTITY_SEED_FILE = os.getenv("ENTITY_SEED_FILE", "")
+# Üst sınır: aşılınca en eski eklenen entity tüm map'lerden düşer
+ENTITY_INDEX_MAX_ENTITIES = int(os.getenv("ENTITY_INDEX_MAX_ENTITIES", "200000"))
+entity_index = EntityIndex(ENTITY_INDEX_FILE, maxsize=ENTITY_INDEX_MAX_ENTITIES)
+
+def completion_cache_key(request_data: dict) -> str:
+    return hashlib.sha256(json.dumps(request_data, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await on_startup()
+    yield
+    await on_shutdown()
+
+app = FastAPI(debug=os.getenv("DEBUG", "false").lower() in ("1", "true", "yes"), lifespan=lifespan)
 
 # Dil eşleştirme sözlüğü
 LANGUAGE_MAPPING = {
@@ -30,11 +200,102 @@ LANGUAGE_MAPPING = {
     "it": "Italian"
 }
 
+# 🚦 İstemci başına token bucket: her analiz 2 GPT + 6 Qloo çağrısı tetikliyor
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "20"))
+# memory (tek worker) veya sqlite (worker'lar arası paylaşılan limit)
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory")
+RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ratelimit.sqlite3"))
+# Sadece bilinen anahtarlar kendi bucket'ını alır; diğer herkes IP'ye göre sınırlanır
+RATE_LIMIT_CLIENT_KEYS = {k.strip() for k in os.getenv("RATE_LIMIT_CLIENT_KEYS", "").split(",") if k.strip()}
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() in ("1", "true", "yes")
+RATE_LIMITED_PATHS = {"/analyze", "/v2/analyze", "/analyze/batch", "/jobs/analyze"}
+# Path parametreli ve GPT çağırabilen endpoint'ler önekle eşleşir
+RATE_LIMITED_PREFIXES = ("/countries/",)
+
+def is_rate_limited_path(path: str) -> bool:
+    return path in RATE_LIMITED_PATHS or path.startswith(RATE_LIMITED_PREFIXES)
+
+rate_limiter = TokenBucketLimiter(RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST, build_store(RATE_LIMIT_STORE, RATE_LIMIT_SQLITE_PATH))
+rate_limit_requests = metrics.Counter("ratelimit_requests_total", "Rate-limited endpoint requests by outcome")
+metrics.Gauge("ratelimit_clients", "Client buckets currently tracked", callback=lambda: len(rate_limiter.store))
+RATE_LIMIT_PRUNE_INTERVAL_SECONDS = float(os.getenv("RATE_LIMIT_PRUNE_INTERVAL_SECONDS", "600"))
+ratelimit_prune_task: asyncio.Task | None = None
+
+async def prune_rate_limit_buckets():
+    """Dolmaya yetecek kadar boşta kalan bucket'lar yenisiyle aynıdır; periyodik olarak silinir"""
+    while True:
+        await asyncio.sleep(RATE_LIMIT_PRUNE_INTERVAL_SECONDS)
+        max_idle = max(limiter.burst / limiter.rate for limiter in (rate_limiter, prefetch_limiter, batch_limiter))
+        try:
+            removed = await asyncio.to_thread(rate_limiter.store.prune, max_idle)
+            if removed:
+                print(f"🚦 Pruned {removed} idle rate-limit buckets")
+        except Exception as e:
+            print(f"⚠️ Could not prune rate-limit buckets: {e}")
+
+def rate_limit_client(request: Request) -> str:
+    client_key = request.headers.get("x-client-key")
+    if client_key in RATE_LIMIT_CLIENT_KEYS:
+        return f"key:{client_key}"
+    forwarded = request.headers.get("x-forwarded-for") if RATE_LIMIT_TRUST_PROXY else None
+    if forwarded:
+        return f"ip:{forwarded.split(',')[0].strip()}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+async def take_rate_limit(client: str, cost: int = 1, limiter: TokenBucketLimiter = rate_limiter) -> RateLimitResult:
+    if limiter.store.blocking:
+        result = await asyncio.to_thread(limiter.hit, client, cost)
+    else:
+        result = limiter.hit(client, cost)
+    rate_limit_requests.inc(outcome="allowed" if result.allowed else "limited")
+    if not result.allowed:
+        print(f"🚦 Rate limited {client} (retry in {result.retry_after:.1f}s)")
+    return result
+
+def rate_limited_response(result: RateLimitResult) -> JSONResponse:
+    return JSONResponse(status_code=429, content={"detail": "Rate limit exceeded"}, headers=result.headers())
+
+# Saf ASGI: @app.middleware("http") her cevabı stream'e çevirip sıkıştırmanın
+# tam gövdeyi görmesini engelliyordu. CORS'tan önce eklenir ki 429'lar da CORS header'ı alsın
+class RateLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED or scope["method"] not in ("GET", "POST") or not is_rate_limited_path(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        client = rate_limit_client(Request(scope))
+        result = await take_rate_limit(client)
+        if not result.allowed:
+            await rate_limited_response(result)(scope, receive, send)
+            return
+        scope.setdefault("state", {})["rate_limit_client"] = client
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).update(result.headers())
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+app.add_middleware(RateLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset", "Retry-After"],
+)
+
+# 📦 En dışta: gzip/brotli sıkıştırma ve Accept ile isteğe bağlı MessagePack
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_BYTES", "1024")),
+    offload_size=int(os.getenv("COMPRESSION_OFFLOAD_BYTES", "65536")),
 )
 
 class FormData(BaseModel):
@@ -45,20 +306,133 @@ class FormData(BaseModel):
     language: Optional[str] = "en"  # Varsayılan İngilizce
     variation: Optional[int] = 0
 
-# ✅ CulturalMap için AI fonksiyonu
-def generate_cultural_map_insights(countries: list[str], language: str = "en", user_persona: dict | None = None) -> dict:
-    print(f"=== GENERATE CULTURAL MAP INSIGHTS ===")
-    print(f"Countries: {countries}")
-    print(f"Language: {language}")
-    print(f"User persona: {user_persona}")
-    
-    if not countries:
-        print("No countries provided, returning empty dict")
+# Batch gövdesi; profiller tek tek doğrulanır ki hatalı olan yalnızca kendi satırında hata versin
+class BatchAnalyzeRequest(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    profiles: list[Any]
+    language: Optional[str] = None
+
+# v2 response modelleri; GPT ekstra alan döndürürse korunur. v1 GPT çıktısını olduğu gibi
+# geçirdiği için v2 de aynı çıktıyı reddetmez: şekil bozuk alanlar validator'larda düzeltilir
+def coerce_text(value: Any) -> str:
+    """GPT'nin obje/liste döndürdüğü metin alanını tek string'e indir"""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        if isinstance(value.get("name"), str):
+            return value["name"]
+        return ", ".join(coerce_text(v) for v in value.values() if v not in (None, ""))
+    if isinstance(value, (list, tuple)):
+        return ", ".join(coerce_text(v) for v in value if v not in (None, ""))
+    return str(value)
+
+def coerce_text_list(value: Any) -> list[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(",") if part.strip()]
+    if isinstance(value, (list, tuple)):
+        return [coerce_text(v) for v in value if v not in (None, "")]
+    return [coerce_text(value)]
+
+def flatten_scores(value: Any, prefix: str = "") -> dict[str, str | int | float]:
+    """{"Europe": {"West": "30%"}} -> {"Europe / West": "30%"}"""
+    if not isinstance(value, dict):
         return {}
+    scores = {}
+    for key, score in value.items():
+        name = f"{prefix} / {key}" if prefix else str(key)
+        if isinstance(score, dict):
+            scores.update(flatten_scores(score, name))
+        elif isinstance(score, (str, int, float)) and not isinstance(score, bool):
+            scores[name] = score
+        elif score is not None:
+            scores[name] = coerce_text(score)
+    return scores
 
-    target_language = LANGUAGE_MAPPING.get(language, "English")
-    print(f"Target language: {target_language}")
-    
+class Archetype(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    name: str = ""
+    description: str = ""
+
+    @field_validator("name", "description", mode="before")
+    @classmethod
+    def _text(cls, value):
+        return coerce_text(value)
+
+class Persona(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    personaName: str = ""
+    traits: list[str] = []
+    culturalTwin: str = "Unknown"
+    description: str = ""
+    interests: list[str] = []
+    culturalDNAScore: dict[str, str | int | float] = {}
+    archetype: Archetype = Archetype()
+
+    @field_validator("personaName", "culturalTwin", "description", mode="before")
+    @classmethod
+    def _text(cls, value):
+        return coerce_text(value)
+
+    @field_validator("traits", "interests", mode="before")
+    @classmethod
+    def _text_list(cls, value):
+        return coerce_text_list(value)
+
+    @field_validator("culturalDNAScore", mode="before")
+    @classmethod
+    def _scores(cls, value):
+        return flatten_scores(value)
+
+    @field_validator("archetype", mode="before")
+    @classmethod
+    def _archetype(cls, value):
+        if isinstance(value, (dict, Archetype)):
+            return value
+        return {"name": coerce_text(value)}
+
+class CountryInsight(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    country: str
+    culturalInsight: str = ""
+    recommendation: str = ""
+    music: str | list[str] = ""
+    movies: str | list[str] = ""
+    personalizedReason: str = ""
+
+class AnalyzeResponseV2(BaseModel):
+    persona: Persona
+    culturalTwin: str
+    countryInsights: dict[str, CountryInsight]
+    personaFingerprint: str | None = None
+    resultId: str | None = None
+
+    @field_validator("culturalTwin", mode="before")
+    @classmethod
+    def _text(cls, value):
+        return coerce_text(value)
+
+# CulturalMap prompt hazırlama
+# Kompakt çıktı şeması: GPT her ülke için anahtar isimleri yazmak yerine sabit sıralı
+# bir dizi döndürür, sunucu bunu countryInsights şekline açar (daha az output token)
+CULTURAL_MAP_FIELDS = ("country", "culturalInsight", "recommendation", "music", "movies", "personalizedReason")
+CULTURAL_MAP_FORMAT_INSTRUCTION = """
+        OUTPUT FORMAT (replaces the JSON object shape above; all content rules still apply):
+        Return a JSON list with one array per country, values only, in exactly this order:
+        [country, culturalInsight, recommendation, music, movies, personalizedReason]
+        Example: [["USA", "...", "...", "...", "...", "..."], ["Japan", "...", "...", "...", "...", "..."]]
+        Do not write field names.
+        """
+
+def build_cultural_map_prompt(countries: list[str], language: str = "en", user_persona: dict | None = None) -> str:
+    """Cultural map prompt'ını kullanıcı persona'sına göre hazırla"""
     # Kullanıcı kişilik bilgilerini hazırla
     user_info = ""
     if user_persona:
@@ -334,344 +708,127 @@ def generate_cultural_map_insights(countries: list[str], language: str = "en", u
         - Provide 3-4 music and 3-4 movie recommendations for each country
         - Only respond with valid JSON list
         """
+
+    return prompt + CULTURAL_MAP_FORMAT_INSTRUCTION
+
+def expand_cultural_map(parsed) -> dict:
+    """Kompakt [[country, insight, ...], ...] cevabını ülke -> insight dict'ine aç.
+
+    Eski {"country": ..., "culturalInsight": ...} formatı ve ülke anahtarlı
+    obje de kabul edilir (cache'lenmiş completion'lar, modelin formatı kaçırması).
+    """
+    if isinstance(parsed, dict):
+        parsed = [[country, *value] if isinstance(value, list) else {"country": country, **value}
+                  for country, value in parsed.items() if isinstance(value, (list, dict))]
+    insights = {}
+    for item in parsed:
+        if isinstance(item, list) and item:
+            values = [*item[:len(CULTURAL_MAP_FIELDS)], *[""] * (len(CULTURAL_MAP_FIELDS) - len(item))]
+            item = dict(zip(CULTURAL_MAP_FIELDS, values))
+        if isinstance(item, dict) and item.get("country"):
+            insights[item["country"]] = item
+    return insights
+
+def parse_cultural_map_content(content: str) -> dict:
+    """GPT cevabındaki ```json bloklarını temizle, gerekirse JSON'u onar"""
+    try:
+        # Try to fix common JSON issues
+        content = content.strip()
+        if content.startswith('```json'):
+            content = content[7:]
+        if content.endswith('```'):
+            content = content[:-3]
+        content = content.strip()
+        
+        return expand_cultural_map(json.loads(content))
+    except Exception as e:
+        print("❌ Failed to parse cultural map response:", e)
+        print("Raw content:", content)
+        # Try to fix the JSON manually
+        try:
+            # Remove any trailing commas and fix quotes
+            content = content.replace(',]', ']').replace(',}', '}')
+            # Fix common quote issues
+            content = content.replace('",]', '"]').replace(',"', ',"')
+            return expand_cultural_map(json.loads(content))
+        except:
+            print("❌ Could not fix JSON, using fallback")
+            return {}
+
+class FallbackResult(dict):
+    """Upstream başarısız olduğunda üretilen sabit içerik. Normal dict gibi serialize
+    edilir; run_analysis bunu görünce analizi işaretler ve sonuç cache'lenmez / saklanmaz."""
+
+def is_fallback(value) -> bool:
+    return isinstance(value, FallbackResult)
+
+def build_fallback_cultural_map(language: str = "en") -> dict:
+    """GPT erişilemediğinde kullanılan sabit cultural map (dil paketinden)"""
+    return FallbackResult(thaw(language_pack(language)["culturalMap"]))
+
+# ✅ CulturalMap için AI fonksiyonu
+def generate_cultural_map_insights(countries: list[str], language: str = "en", user_persona: dict | None = None) -> dict:
+    print(f"=== GENERATE CULTURAL MAP INSIGHTS ===")
+    print(f"Countries: {countries}")
+    print(f"Language: {language}")
+    print(f"User persona: {user_persona}")
+    
+    if not countries:
+        print("No countries provided, returning empty dict")
+        return {}
+
+    target_language = LANGUAGE_MAPPING.get(language, "English")
+    print(f"Target language: {target_language}")
     
+    if not has_openai_key():
+        print("⚠️ OpenAI API key not found, using fallback cultural map")
+        return FallbackResult({country: insight for country, insight in build_fallback_cultural_map(language).items() if country in countries})
+
+    prompt = build_cultural_map_prompt(countries, language=language, user_persona=user_persona)
     print(f"Prompt: {prompt}")
 
     try:
         # Add system message to enforce language response
         system_message = f"Respond only in {LANGUAGE_MAPPING.get(language, 'English')}."
         
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
+        model = model_router.choose("cultural_map", language).model
+        request_data = {
+            "model": model,
+            "messages": [
                 {"role": "system", "content": system_message},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.7,
-            max_tokens=800
-        )
+            "temperature": 0.7,
+            "max_tokens": 800
+        }
 
-        content = response.choices[0].message.content
+        cache_key = completion_cache_key(request_data)
+        content = completion_cache.get(cache_key)
+        if content is MISSING:
+            with upstream_scheduler.slot("openai"):
+                started = time.perf_counter()
+                try:
+                    response = get_openai_client().chat.completions.create(**request_data)
+                finally:
+                    model_router.observe("cultural_map", model, time.perf_counter() - started)
+            content = response.choices[0].message.content
+            if content:
+                completion_cache.set(cache_key, content)
+        else:
+            print("🟢 Cultural map completion cache hit")
         print(f"GPT response content: {content}")
 
         if not content:
             print("⚠️ GPT returned empty cultural map content")
             return {}
 
-        try:
-            # Try to fix common JSON issues
-            content = content.strip()
-            if content.startswith('```json'):
-                content = content[7:]
-            if content.endswith('```'):
-                content = content[:-3]
-            content = content.strip()
-            
-            parsed = json.loads(content)
-            print(f"Parsed JSON: {parsed}")
-            result = {item["country"]: item for item in parsed if "country" in item}
-            print(f"Final result: {result}")
-            return result
-        except Exception as e:
-            print("❌ Failed to parse cultural map response:", e)
-            print("Raw content:", content)
-            # Try to fix the JSON manually
-            try:
-                # Remove any trailing commas and fix quotes
-                content = content.replace(',]', ']').replace(',}', '}')
-                # Fix common quote issues
-                content = content.replace('",]', '"]').replace(',"', ',"')
-                parsed = json.loads(content)
-                result = {item["country"]: item for item in parsed if "country" in item}
-                print(f"Fixed JSON result: {result}")
-                return result
-            except:
-                print("❌ Could not fix JSON, using fallback")
-                return {}
+        result = parse_cultural_map_content(content)
+        print(f"Final result: {result}")
+        return result
     except Exception as e:
         print(f"❌ GPT API Error for cultural map: {e}")
-        # Fallback cultural map based on language
-        if language == "tr":
-            return {
-                "USA": {
-                    "country": "USA",
-                    "culturalInsight": "Amerikan kültürü çeşitlilik ve yenilikçilikle karakterize edilir. Hollywood film endüstrisi, Broadway müzikalleri ve çeşitli müzik türleriyle dünya kültürüne büyük katkı sağlar.",
-                    "recommendation": "Hollywood filmleri ve rock müziği",
-                    "music": "Bruce Springsteen - Born to Run, Queen - Bohemian Rhapsody, Michael Jackson - Thriller",
-                    "movies": "Inception, The Matrix, Interstellar, Avengers: Endgame, The Godfather",
-                    "personalizedReason": "Yaratıcı ve açık fikirli kişiliğiniz için ideal"
-                },
-                "South Korea": {
-                    "country": "South Korea",
-                    "culturalInsight": "Güney Kore kültürü teknoloji ve geleneksel değerlerin mükemmel harmanıdır. K-Pop müziği, K-drama dizileri ve geleneksel hanbok kıyafetleri modern ve geleneksel değerleri birleştirir.",
-                    "recommendation": "K-Pop müziği ve K-drama dizileri",
-                    "music": "BTS - Dynamite, BlackPink - How You Like That, IU - Blueming, Red Velvet - Psycho",
-                    "movies": "Parasite, Squid Game, Train to Busan, Oldboy, My Sassy Girl",
-                    "personalizedReason": "Teknoloji ve geleneksel değerleri seven kişiliğinize uygun"
-                },
-                "UK": {
-                    "country": "UK",
-                    "culturalInsight": "İngiliz kültürü gelenek ve modernliğin mükemmel dengesidir. British rock müziği, Shakespeare tiyatrosu ve çay kültürü ile zengin bir kültürel mirasa sahiptir.",
-                    "recommendation": "British rock müziği ve tiyatro",
-                    "music": "The Beatles - Hey Jude, Queen - Bohemian Rhapsody, Adele - Rolling in the Deep, Ed Sheeran - Shape of You",
-                    "movies": "Harry Potter serisi, Sherlock Holmes, James Bond, The King's Speech",
-                    "personalizedReason": "Gelenek ve modernliği dengeleyen kişiliğiniz için mükemmel"
-                },
-                "Japan": {
-                    "country": "Japan",
-                    "culturalInsight": "Japon kültürü geleneksel değerler ve teknolojik ilerlemenin sentezidir. Anime, manga, geleneksel çay seremonisi ve modern teknoloji ile benzersiz bir kültür oluşturur.",
-                    "recommendation": "Anime ve manga",
-                    "music": "BABYMETAL - Gimme Chocolate, ONE OK ROCK - The Beginning, Perfume - Polyrhythm",
-                    "movies": "Spirited Away, Attack on Titan, Death Note, Your Name, Akira",
-                    "personalizedReason": "Teknoloji ve sanatı birleştiren kişiliğinize uygun"
-                }
-            }
-        elif language == "es":
-            return {
-                "USA": {
-                    "country": "USA",
-                    "culturalInsight": "La cultura estadounidense se caracteriza por la diversidad y la innovación. La industria cinematográfica de Hollywood, los musicales de Broadway y varios géneros musicales contribuyen enormemente a la cultura mundial.",
-                    "recommendation": "Películas de Hollywood y música rock",
-                    "music": "Bruce Springsteen - Born to Run, Queen - Bohemian Rhapsody, Michael Jackson - Thriller",
-                    "movies": "Inception, The Matrix, Interstellar, Avengers: Endgame, The Godfather",
-                    "personalizedReason": "Ideal para tu personalidad creativa y de mente abierta"
-                },
-                "South Korea": {
-                    "country": "South Korea",
-                    "culturalInsight": "La cultura surcoreana es una mezcla perfecta de tecnología y valores tradicionales. La música K-Pop, las series K-drama y la ropa tradicional hanbok combinan valores modernos y tradicionales.",
-                    "recommendation": "Música K-Pop y series K-drama",
-                    "music": "BTS - Dynamite, BlackPink - How You Like That, IU - Blueming, Red Velvet - Psycho",
-                    "movies": "Parasite, Squid Game, Train to Busan, Oldboy, My Sassy Girl",
-                    "personalizedReason": "Adecuado para tu personalidad que ama la tecnología y los valores tradicionales"
-                },
-                "UK": {
-                    "country": "UK",
-                    "culturalInsight": "La cultura británica es el equilibrio perfecto entre tradición y modernidad. Tiene un rico patrimonio cultural con música rock británica, teatro de Shakespeare y cultura del té.",
-                    "recommendation": "Música rock británica y teatro",
-                    "music": "The Beatles - Hey Jude, Queen - Bohemian Rhapsody, Adele - Rolling in the Deep, Ed Sheeran - Shape of You",
-                    "movies": "Serie de Harry Potter, Sherlock Holmes, James Bond, The King's Speech",
-                    "personalizedReason": "Perfecto para tu personalidad que equilibra tradición y modernidad"
-                },
-                "Japan": {
-                    "country": "Japan",
-                    "culturalInsight": "La cultura japonesa es una síntesis de valores tradicionales y progreso tecnológico. Crea una cultura única con anime, manga, ceremonia tradicional del té y tecnología moderna.",
-                    "recommendation": "Anime y manga",
-                    "music": "BABYMETAL - Gimme Chocolate, ONE OK ROCK - The Beginning, Perfume - Polyrhythm",
-                    "movies": "Spirited Away, Attack on Titan, Death Note, Your Name, Akira",
-                    "personalizedReason": "Adecuado para tu personalidad que combina tecnología y arte"
-                }
-            }
-        elif language == "fr":
-            return {
-                "USA": {
-                    "country": "USA",
-                    "culturalInsight": "La culture américaine se caractérise par la diversité et l'innovation. L'industrie cinématographique d'Hollywood, les comédies musicales de Broadway et divers genres musicaux contribuent grandement à la culture mondiale.",
-                    "recommendation": "Films d'Hollywood et musique rock",
-                    "music": "Bruce Springsteen - Born to Run, Queen - Bohemian Rhapsody, Michael Jackson - Thriller",
-                    "movies": "Inception, The Matrix, Interstellar, Avengers: Endgame, The Godfather",
-                    "personalizedReason": "Idéal pour votre personnalité créative et ouverte d'esprit"
-                },
-                "South Korea": {
-                    "country": "South Korea",
-                    "culturalInsight": "La culture sud-coréenne est un mélange parfait de technologie et de valeurs traditionnelles. La musique K-Pop, les séries K-drama et les vêtements traditionnels hanbok combinent valeurs modernes et traditionnelles.",
-                    "recommendation": "Musique K-Pop et séries K-drama",
-                    "music": "BTS - Dynamite, BlackPink - How You Like That, IU - Blueming, Red Velvet - Psycho",
-                    "movies": "Parasite, Squid Game, Train to Busan, Oldboy, My Sassy Girl",
-                    "personalizedReason": "Convenable pour votre personnalité qui aime la technologie et les valeurs traditionnelles"
-                },
-                "UK": {
-                    "country": "UK",
-                    "culturalInsight": "La culture britannique est l'équilibre parfait entre tradition et modernité. Elle a un riche patrimoine culturel avec la musique rock britannique, le théâtre de Shakespeare et la culture du thé.",
-                    "recommendation": "Musique rock britannique et théâtre",
-                    "music": "The Beatles - Hey Jude, Queen - Bohemian Rhapsody, Adele - Rolling in the Deep, Ed Sheeran - Shape of You",
-                    "movies": "Série Harry Potter, Sherlock Holmes, James Bond, The King's Speech",
-                    "personalizedReason": "Parfait pour votre personnalité qui équilibre tradition et modernité"
-                },
-                "Japan": {
-                    "country": "Japan",
-                    "culturalInsight": "La culture japonaise est une synthèse de valeurs traditionnelles et de progrès technologique. Elle crée une culture unique avec l'anime, le manga, la cérémonie traditionnelle du thé et la technologie moderne.",
-                    "recommendation": "Anime et manga",
-                    "music": "BABYMETAL - Gimme Chocolate, ONE OK ROCK - The Beginning, Perfume - Polyrhythm",
-                    "movies": "Spirited Away, Attack on Titan, Death Note, Your Name, Akira",
-                    "personalizedReason": "Convenable pour votre personnalité qui combine technologie et art"
-                }
-            }
-        elif language == "de":
-            return {
-                "USA": {
-                    "country": "USA",
-                    "culturalInsight": "Die amerikanische Kultur ist geprägt von Vielfalt und Innovation. Die Hollywood-Filmindustrie, Broadway-Musicals und verschiedene Musikgenres tragen wesentlich zur Weltkultur bei.",
-                    "recommendation": "Hollywood-Filme und Rockmusik",
-                    "music": "Bruce Springsteen - Born to Run, Queen - Bohemian Rhapsody, Michael Jackson - Thriller",
-                    "movies": "Inception, The Matrix, Interstellar, Avengers: Endgame, The Godfather",
-                    "personalizedReason": "Ideal für deine kreative und weltoffene Persönlichkeit"
-                },
-                "South Korea": {
-                    "country": "South Korea",
-                    "culturalInsight": "Die südkoreanische Kultur ist eine perfekte Mischung aus Technologie und traditionellen Werten. K-Pop-Musik, K-Drama-Serien und traditionelle Hanbok-Kleidung verbinden moderne und traditionelle Werte.",
-                    "recommendation": "K-Pop-Musik und K-Drama-Serien",
-                    "music": "BTS - Dynamite, BlackPink - How You Like That, IU - Blueming, Red Velvet - Psycho",
-                    "movies": "Parasite, Squid Game, Train to Busan, Oldboy, My Sassy Girl",
-                    "personalizedReason": "Geeignet für deine Persönlichkeit, die Technologie und traditionelle Werte liebt"
-                },
-                "UK": {
-                    "country": "UK",
-                    "culturalInsight": "Die britische Kultur ist die perfekte Balance zwischen Tradition und Moderne. Sie hat ein reiches kulturelles Erbe mit britischem Rock, Shakespeare-Theater und Teekultur.",
-                    "recommendation": "Britischer Rock und Theater",
-                    "music": "The Beatles - Hey Jude, Queen - Bohemian Rhapsody, Adele - Rolling in the Deep, Ed Sheeran - Shape of You",
-                    "movies": "Harry Potter-Serie, Sherlock Holmes, James Bond, The King's Speech",
-                    "personalizedReason": "Perfekt für deine Persönlichkeit, die Tradition und Moderne ausbalanciert"
-                },
-                "Japan": {
-                    "country": "Japan",
-                    "culturalInsight": "Die japanische Kultur ist eine Synthese aus traditionellen Werten und technologischem Fortschritt. Sie schafft eine einzigartige Kultur mit Anime, Manga, traditioneller Teezeremonie und moderner Technologie.",
-                    "recommendation": "Anime und Manga",
-                    "music": "BABYMETAL - Gimme Chocolate, ONE OK ROCK - The Beginning, Perfume - Polyrhythm",
-                    "movies": "Spirited Away, Attack on Titan, Death Note, Your Name, Akira",
-                    "personalizedReason": "Geeignet für deine Persönlichkeit, die Technologie und Kunst verbindet"
-                }
-            }
-        elif language == "it":
-            return {
-                "USA": {
-                    "country": "USA",
-                    "culturalInsight": "La cultura americana è caratterizzata da diversità e innovazione. L'industria cinematografica di Hollywood, i musical di Broadway e vari generi musicali contribuiscono enormemente alla cultura mondiale.",
-                    "recommendation": "Film di Hollywood e musica rock",
-                    "music": "Bruce Springsteen - Born to Run, Queen - Bohemian Rhapsody, Michael Jackson - Thriller",
-                    "movies": "Inception, The Matrix, Interstellar, Avengers: Endgame, The Godfather",
-                    "personalizedReason": "Ideale per la tua personalità creativa e di mente aperta"
-                },
-                "South Korea": {
-                    "country": "South Korea",
-                    "culturalInsight": "La cultura sudcoreana è una perfetta miscela di tecnologia e valori tradizionali. La musica K-Pop, le serie K-drama e l'abbigliamento tradizionale hanbok combinano valori moderni e tradizionali.",
-                    "recommendation": "Musica K-Pop e serie K-drama",
-                    "music": "BTS - Dynamite, BlackPink - How You Like That, IU - Blueming, Red Velvet - Psycho",
-                    "movies": "Parasite, Squid Game, Train to Busan, Oldboy, My Sassy Girl",
-                    "personalizedReason": "Adatto alla tua personalità che ama la tecnologia e i valori tradizionali"
-                },
-                "UK": {
-                    "country": "UK",
-                    "culturalInsight": "La cultura britannica è il perfetto equilibrio tra tradizione e modernità. Ha un ricco patrimonio culturale con la musica rock britannica, il teatro di Shakespeare e la cultura del tè.",
-                    "recommendation": "Musica rock britannica e teatro",
-                    "music": "The Beatles - Hey Jude, Queen - Bohemian Rhapsody, Adele - Rolling in the Deep, Ed Sheeran - Shape of You",
-                    "movies": "Serie di Harry Potter, Sherlock Holmes, James Bond, The King's Speech",
-                    "personalizedReason": "Perfetto per la tua personalità che bilancia tradizione e modernità"
-                },
-                "Japan": {
-                    "country": "Japan",
-                    "culturalInsight": "La cultura giapponese è una sintesi di valori tradizionali e progresso tecnologico. Crea una cultura unica con anime, manga, cerimonia tradizionale del tè e tecnologia moderna.",
-                    "recommendation": "Anime e manga",
-                    "music": "BABYMETAL - Gimme Chocolate, ONE OK ROCK - The Beginning, Perfume - Polyrhythm",
-                    "movies": "Spirited Away, Attack on Titan, Death Note, Your Name, Akira",
-                    "personalizedReason": "Adatto alla tua personalità che combina tecnologia e arte"
-                }
-            }
-        elif language == "hi":
-            return {
-                "USA": {
-                    "country": "USA",
-                    "culturalInsight": "अमेरिकी संस्कृति विविधता और नवाचार की विशेषता है। हॉलीवुड फिल्म उद्योग, ब्रॉडवे म्यूजिकल और विभिन्न संगीत शैलियां विश्व संस्कृति में बहुत योगदान करती हैं।",
-                    "recommendation": "हॉलीवुड फिल्में और रॉक संगीत",
-                    "music": "Bruce Springsteen - Born to Run, Queen - Bohemian Rhapsody, Michael Jackson - Thriller",
-                    "movies": "Inception, The Matrix, Interstellar, Avengers: Endgame, The Godfather",
-                    "personalizedReason": "आपकी रचनात्मक और खुले दिमाग वाली व्यक्तित्व के लिए आदर्श"
-                },
-                "South Korea": {
-                    "country": "South Korea",
-                    "culturalInsight": "दक्षिण कोरियाई संस्कृति प्रौद्योगिकी और पारंपरिक मूल्यों का एक सही मिश्रण है। K-Pop संगीत, K-drama श्रृंखलाएं और पारंपरिक hanbok कपड़े आधुनिक और पारंपरिक मूल्यों को जोड़ते हैं।",
-                    "recommendation": "K-Pop संगीत और K-drama श्रृंखलाएं",
-                    "music": "BTS - Dynamite, BlackPink - How You Like That, IU - Blueming, Red Velvet - Psycho",
-                    "movies": "Parasite, Squid Game, Train to Busan, Oldboy, My Sassy Girl",
-                    "personalizedReason": "आपकी व्यक्तित्व के लिए उपयुक्त जो प्रौद्योगिकी और पारंपरिक मूल्यों से प्यार करती है"
-                },
-                "UK": {
-                    "country": "UK",
-                    "culturalInsight": "ब्रिटिश संस्कृति परंपरा और आधुनिकता का सही संतुलन है। इसमें ब्रिटिश रॉक संगीत, शेक्सपियर थिएटर और चाय संस्कृति के साथ समृद्ध सांस्कृतिक विरासत है।",
-                    "recommendation": "ब्रिटिश रॉक संगीत और थिएटर",
-                    "music": "The Beatles - Hey Jude, Queen - Bohemian Rhapsody, Adele - Rolling in the Deep, Ed Sheeran - Shape of You",
-                    "movies": "Harry Potter श्रृंखला, Sherlock Holmes, James Bond, The King's Speech",
-                    "personalizedReason": "आपकी व्यक्तित्व के लिए परफेक्ट जो परंपरा और आधुनिकता को संतुलित करती है"
-                },
-                "Japan": {
-                    "country": "Japan",
-                    "culturalInsight": "जापानी संस्कृति पारंपरिक मूल्यों और तकनीकी प्रगति का संश्लेषण है। यह एनीमे, मंगा, पारंपरिक चाय समारोह और आधुनिक प्रौद्योगिकी के साथ एक अनूठी संस्कृति बनाती है।",
-                    "recommendation": "एनीमे और मंगा",
-                    "music": "BABYMETAL - Gimme Chocolate, ONE OK ROCK - The Beginning, Perfume - Polyrhythm",
-                    "movies": "Spirited Away, Attack on Titan, Death Note, Your Name, Akira",
-                    "personalizedReason": "आपकी व्यक्तित्व के लिए उपयुक्त जो प्रौद्योगिकी और कला को जोड़ती है"
-                }
-            }
-        elif language == "zh":
-            return {
-                "USA": {
-                    "country": "USA",
-                    "culturalInsight": "美国文化以多样性和创新为特征。好莱坞电影工业、百老汇音乐剧和各种音乐流派对世界文化做出了巨大贡献。",
-                    "recommendation": "好莱坞电影和摇滚音乐",
-                    "music": "Bruce Springsteen - Born to Run, Queen - Bohemian Rhapsody, Michael Jackson - Thriller",
-                    "movies": "Inception, The Matrix, Interstellar, Avengers: Endgame, The Godfather",
-                    "personalizedReason": "适合您富有创造力和开放思维的性格"
-                },
-                "South Korea": {
-                    "country": "South Korea",
-                    "culturalInsight": "韩国文化是技术与传统价值观的完美融合。K-Pop音乐、K-drama系列和传统韩服结合了现代和传统价值观。",
-                    "recommendation": "K-Pop音乐和K-drama系列",
-                    "music": "BTS - Dynamite, BlackPink - How You Like That, IU - Blueming, Red Velvet - Psycho",
-                    "movies": "Parasite, Squid Game, Train to Busan, Oldboy, My Sassy Girl",
-                    "personalizedReason": "适合热爱技术和传统价值观的您"
-                },
-                "UK": {
-                    "country": "UK",
-                    "culturalInsight": "英国文化是传统与现代的完美平衡。它拥有丰富的文化遗产，包括英国摇滚音乐、莎士比亚戏剧和茶文化。",
-                    "recommendation": "英国摇滚音乐和戏剧",
-                    "music": "The Beatles - Hey Jude, Queen - Bohemian Rhapsody, Adele - Rolling in the Deep, Ed Sheeran - Shape of You",
-                    "movies": "哈利波特系列, Sherlock Holmes, James Bond, The King's Speech",
-                    "personalizedReason": "完美适合平衡传统与现代的您"
-                },
-                "Japan": {
-                    "country": "Japan",
-                    "culturalInsight": "日本文化是传统价值观和技术进步的综合体。它通过动漫、漫画、传统茶道和现代技术创造了独特的文化。",
-                    "recommendation": "动漫和漫画",
-                    "music": "BABYMETAL - Gimme Chocolate, ONE OK ROCK - The Beginning, Perfume - Polyrhythm",
-                    "movies": "Spirited Away, Attack on Titan, Death Note, Your Name, Akira",
-                    "personalizedReason": "适合结合技术与艺术的您"
-                }
-            }
-        else:
-            # English fallback
-            return {
-                "USA": {
-                    "country": "USA",
-                    "culturalInsight": "American culture is characterized by diversity and innovation. The Hollywood film industry, Broadway musicals, and various music genres contribute greatly to world culture.",
-                    "recommendation": "Hollywood movies and rock music",
-                    "music": "Bruce Springsteen - Born to Run, Queen - Bohemian Rhapsody, Michael Jackson - Thriller",
-                    "movies": "Inception, The Matrix, Interstellar, Avengers: Endgame, The Godfather",
-                    "personalizedReason": "Perfect for your creative and open-minded personality"
-                },
-                "South Korea": {
-                    "country": "South Korea",
-                    "culturalInsight": "South Korean culture is a perfect blend of technology and traditional values. K-Pop music, K-drama series, and traditional hanbok clothing combine modern and traditional values.",
-                    "recommendation": "K-Pop music and K-drama series",
-                    "music": "BTS - Dynamite, BlackPink - How You Like That, IU - Blueming, Red Velvet - Psycho",
-                    "movies": "Parasite, Squid Game, Train to Busan, Oldboy, My Sassy Girl",
-                    "personalizedReason": "Suitable for your personality that loves technology and traditional values"
-                },
-                "UK": {
-                    "country": "UK",
-                    "culturalInsight": "British culture is the perfect balance of tradition and modernity. British rock music, Shakespeare theater, and tea culture have a rich cultural heritage.",
-                    "recommendation": "British rock music and theater",
-                    "music": "The Beatles - Hey Jude, Queen - Bohemian Rhapsody, Adele - Rolling in the Deep, Ed Sheeran - Shape of You",
-                    "movies": "Harry Potter series, Sherlock Holmes, James Bond, The King's Speech",
-                    "personalizedReason": "Perfect for your personality that balances tradition and modernity"
-                },
-                "Japan": {
-                    "country": "Japan",
-                    "culturalInsight": "Japanese culture is a synthesis of traditional values and technological progress. Anime, manga, traditional tea ceremony, and modern technology create a unique culture.",
-                    "recommendation": "Anime and manga",
-                    "music": "BABYMETAL - Gimme Chocolate, ONE OK ROCK - The Beginning, Perfume - Polyrhythm",
-                    "movies": "Spirited Away, Attack on Titan, Death Note, Your Name, Akira",
-                    "personalizedReason": "Suitable for your personality that combines technology and art"
-                }
-            }
+        # Fallback cultural map based on language, limited to the requested countries
+        return FallbackResult({country: insight for country, insight in build_fallback_cultural_map(language).items() if country in countries})
 
 # Qloo autocomplete
 def autocomplete_entity(query: str, entity_type: str = "artist") -> Optional[str]:
@@ -684,19 +841,42 @@ def autocomplete_entity(query: str, entity_type: str = "artist") -> Optional[str
         print(f"⚠️ Qloo API key not configured, using fallback for: {query}")
         return None
         
+    cache_key = (term_key(query), entity_type)
+    cached = entity_cache.get(cache_key)
+    if cached is not MISSING:
+        print(f"🟢 Autocomplete cache hit [{query}]")
+        return cached
+
+    # Daha önce Qloo'dan görülen isimler için ağa gitme
+    indexed = entity_index.lookup(query, entity_type)
+    if indexed:
+        print(f"🟢 Autocomplete index hit [{query}]")
+        entity_cache.set(cache_key, indexed)
+        entity = entity_index.entities.get(indexed)
+        if entity is not None:
+            entity_aliases.learn(query, entity_type, indexed, entity["name"])
+        return indexed
+
     safe_query = quote(query)
     url = f"{base_url}/search?query={safe_query}"
     headers = {"x-api-key": key}
 
     try:
-        response = requests.get(url, headers=headers, timeout=5)
+        with upstream_scheduler.slot("qloo"):
+            response = qloo_session.get(url, headers=headers, timeout=5)
         print(f"🔵 Autocomplete [{query}] → {response.status_code}")
 
         if response.status_code == 200:
             results = response.json().get("results", [])
-            for r in results:
-                if entity_type in r.get("type", "").lower():
-                    return r.get("id", "")
+            entity_index.add_search_results(results)
+            match = next((r for r in results if entity_type in r.get("type", "").lower()), None)
+            entity_id = match.get("id", "") if match else None
+            # "Bulunamadı" sonucu da cache'lenir, aynı sorgu tekrar Qloo'ya gitmez
+            entity_cache.set(cache_key, entity_id)
+            if match:
+                entity_aliases.learn(query, entity_type, entity_id, match.get("name", ""))
+            if entity_id is not None:
+                return entity_id
     except Exception as e:
         print(f"⚠️ Qloo API error for {query}: {e}")
     
@@ -721,6 +901,12 @@ def get_qloo_trending(entity_id: Optional[str], entity_type: str = "artist") ->
     start_date = f"{today.year}-01-01"
     end_date = today.isoformat()
 
+    cache_key = (entity_id, entity_type, end_date)
+    cached = trending_cache.get(cache_key)
+    if cached is not MISSING:
+        print(f"🟢 Trending cache hit [{entity_type}:{entity_id}]")
+        return list(cached)
+
     url = (
         f"{base_url}/v2/insights?"
         f"filter.start_date={start_date}&"
@@ -732,217 +918,57 @@ def get_qloo_trending(entity_id: Optional[str], entity_type: str = "artist") ->
     headers = {"x-api-key": key}
     
     try:
-        response = requests.get(url, headers=headers, timeout=5)
+        with upstream_scheduler.slot("qloo"):
+            response = qloo_session.get(url, headers=headers, timeout=5)
         print("🟣 Trending response:", response.status_code)
 
         if response.status_code == 200:
             data = response.json()
             items = data.get("results", [])
-            return [i.get("name", "Unknown") for i in items if "name" in i]
+            names = [i.get("name", "Unknown") for i in items if "name" in i]
+            trending_cache.set(cache_key, tuple(names))
+            return names
     except Exception as e:
         print(f"⚠️ Qloo API error for trending: {e}")
     
     return []
 
-def generate_persona_from_taste(movies: str, music: str, brands: str, gender: str, language: str = "en", variation: int = 0) -> dict:
-    """OpenAI GPT-4 ile kullanıcı persona'sı oluştur"""
-    
-    # Tüm diller için doğru target language'ı belirle
-    language_mapping = {
-        "en": "English",
-        "tr": "Turkish", 
-        "es": "Spanish",
-        "fr": "French",
-        "de": "German",
-        "hi": "Hindi",
-        "zh": "Chinese",
-        "it": "Italian"
-    }
-    
-    target_language = language_mapping.get(language, "English")
-    
-    # API key kontrolü
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key or api_key == "your-openai-api-key-here":
-        print("⚠️ OpenAI API key not found, using fallback response")
-        # Fallback response based on language with variation
-        fallback_names = {
-            "tr": ["Kültürel Keşifçi", "Dünya Vatandaşı", "Kültür Elçisi", "Sınırlar Ötesi", "Kültürel Yolcu", "Kültür Avcısı", "Dünya Gezgini", "Kültür Meraklısı", "Sınır Tanımayan", "Kültür Aşığı", "Kültür Kaşifi", "Dünya Seyyahı", "Kültür Ustası", "Sınır Gezgini", "Kültür Sanatçısı"],
-            "en": ["Cultural Explorer", "Global Citizen", "Cultural Ambassador", "Border Crosser", "Cultural Traveler", "Culture Hunter", "World Wanderer", "Culture Enthusiast", "Boundary Breaker", "Culture Lover", "Cultural Pioneer", "World Nomad", "Culture Master", "Border Walker", "Cultural Artist"],
-            "es": ["Explorador Cultural", "Ciudadano Global", "Embajador Cultural", "Cruzador de Fronteras", "Viajero Cultural", "Cazador de Cultura", "Nómada Mundial", "Entusiasta Cultural", "Rompedor de Límites", "Amante de la Cultura", "Pionero Cultural", "Nómada Mundial", "Maestro Cultural", "Caminante de Fronteras", "Artista Cultural"],
-            "fr": ["Explorateur Culturel", "Citoyen du Monde", "Ambassadeur Culturel", "Traverseur de Frontières", "Voyageur Culturel", "Chasseur de Culture", "Nomade Mondial", "Passionné Culturel", "Briseur de Limites", "Amoureux de la Cultura", "Pionnier Culturel", "Nomade Mondial", "Maître Culturel", "Marcheur de Frontières", "Artiste Culturel"],
-            "de": ["Kultureller Entdecker", "Weltbürger", "Kultur-Botschafter", "Grenzüberschreiter", "Kultureller Reisender", "Kultur-Jäger", "Welt-Nomade", "Kultur-Enthusiast", "Grenzen-Brecher", "Kultur-Liebhaber", "Kultureller Pionier", "Welt-Nomade", "Kultur-Meister", "Grenzen-Wanderer", "Kultur-Künstler"],
-            "hi": ["सांस्कृतिक खोजकर्ता", "विश्व नागरिक", "सांस्कृतिक राजदूत", "सीमा पार करने वाला", "सांस्कृतिक यात्री", "संस्कृति शिकारी", "विश्व खानाबदोश", "सांस्कृतिक उत्साही", "सीमा तोड़ने वाला", "संस्कृति प्रेमी", "सांस्कृतिक अग्रदूत", "विश्व खानाबदोश", "सांस्कृतिक मास्टर", "सीमा चलने वाला", "सांस्कृतिक कलाकार"],
-            "zh": ["文化探索者", "世界公民", "文化大使", "边界跨越者", "文化旅行者", "文化猎人", "世界游牧者", "文化爱好者", "界限打破者", "文化爱好者", "文化先驱", "世界游牧者", "文化大师", "边界行者", "文化艺术家"],
-            "it": ["Esploratore Culturale", "Cittadino del Mondo", "Ambassadeur Culturale", "Attraversatore di Confini", "Viaggiatore Culturale", "Cacciatore di Cultura", "Nomade Mondiale", "Entusiasta Culturale", "Spezzatore di Limiti", "Amante della Cultura", "Pioniere Culturale", "Nomade Mondiale", "Maestro Culturale", "Camminatore di Confini", "Artista Culturale"]
-        }
-        fallback_twins = ["Tom Hanks", "Beyoncé", "Leonardo DiCaprio", "Taylor Swift", "BTS", "BlackPink", "Lady Gaga", "Brad Pitt", "Adele", "Johnny Depp", "Dua Lipa", "Ed Sheeran", "Ariana Grande", "Justin Bieber", "Drake", "Post Malone", "Billie Eilish", "The Weeknd", "Doja Cat", "Olivia Rodrigo", "Harry Styles", "Lana Del Rey", "Bad Bunny", "Kendrick Lamar", "The Weeknd", "Travis Scott", "Cardi B", "Megan Thee Stallion", "Lil Nas X", "Roddy Ricch"]
-        
-        name_index = variation % len(fallback_names.get(language, fallback_names["en"]))
-        twin_index = variation % len(fallback_twins)
-        
-        # Generate celebrity based on user preferences
-        user_preferences = f"Movies: {movies}, Music: {music}, Brands: {brands}, Gender: {gender}"
-        if "iron man" in movies.lower() or "marvel" in movies.lower():
-            selected_celebrity = "Robert Downey Jr."
-        elif "rock" in music.lower() or "acdc" in music.lower():
-            selected_celebrity = "Angus Young"
-        elif "nike" in brands.lower():
-            selected_celebrity = "Michael Jordan"
-        else:
-            celebrity_options = ["Tom Hanks", "Beyoncé", "Leonardo DiCaprio", "Taylor Swift", "Brad Pitt", "Adele", "Johnny Depp", "Ed Sheeran", "Ariana Grande", "Drake"]
-            selected_celebrity = celebrity_options[variation % len(celebrity_options)]
-        
-        # Her dil için fallback response oluştur
-        if language == "tr":
-            fallback_response = {
-                "personaName": fallback_names["tr"][name_index],
-                "traits": ["Yaratıcı", "Meraklı", "Sosyal", "Dinamik", "Açık Fikirli"],
-                "culturalTwin": selected_celebrity,
-                "description": "Kültürel çeşitliliğe değer veren, yeni deneyimlere açık bir kişilik. Farklı kültürleri keşfetmeyi seven, sosyal ve yaratıcı bir yapıya sahip.",
-                "interests": ["Film", "Müzik", "Seyahat", "Teknoloji"],
-                "culturalDNAScore": {
-                    "Kuzey Amerika": f"{30 + (variation % 20)}%",
-                    "Avrupa": f"{20 + (variation % 15)}%",
-                    "Asya": f"{25 + (variation % 15)}%",
-                    "Türkiye": f"{15 + (variation % 10)}%"
-                },
-                "archetype": {
-                    "name": "Kültürel Keşifçi",
-                    "description": "Farklı kültürleri keşfetmeyi seven, açık fikirli kişilik."
-                }
-            }
-        elif language == "es":
-            fallback_response = {
-                "personaName": fallback_names["es"][name_index],
-                "traits": ["Creativo", "Curioso", "Social", "Dinámico", "Mente Abierta"],
-                "culturalTwin": selected_celebrity,
-                "description": "Una personalidad que valora la diversidad cultural y está abierta a nuevas experiencias. Ama explorar diferentes culturas, social y creativo por naturaleza.",
-                "interests": ["Películas", "Música", "Viajes", "Tecnología"],
-                "culturalDNAScore": {
-                    "América del Norte": f"{30 + (variation % 20)}%",
-                    "Europa": f"{20 + (variation % 15)}%",
-                    "Asia": f"{25 + (variation % 15)}%",
-                    "España": f"{15 + (variation % 10)}%"
-                },
-                "archetype": {
-                    "name": "Explorador Cultural",
-                    "description": "Personalidad de mente abierta que ama explorar diferentes culturas."
-                }
-            }
-        elif language == "fr":
-            fallback_response = {
-                "personaName": fallback_names["fr"][name_index],
-                "traits": ["Créatif", "Curieux", "Social", "Dynamique", "Ouvert d'esprit"],
-                "culturalTwin": selected_celebrity,
-                "description": "Une personnalité qui valorise la diversité culturelle et est ouverte aux nouvelles expériences. Aime explorer différentes cultures, social et créatif par nature.",
-                "interests": ["Cinéma", "Musique", "Voyage", "Technologie"],
-                "culturalDNAScore": {
-                    "Amérique du Nord": f"{30 + (variation % 20)}%",
-                    "Europe": f"{20 + (variation % 15)}%",
-                    "Asie": f"{25 + (variation % 15)}%",
-                    "France": f"{15 + (variation % 10)}%"
-                },
-                "archetype": {
-                    "name": "Explorateur Culturel",
-                    "description": "Personnalité ouverte d'esprit qui aime explorer différentes cultures."
-                }
-            }
-        elif language == "de":
-            fallback_response = {
-                "personaName": fallback_names["de"][name_index],
-                "traits": ["Kreativ", "Neugierig", "Sozial", "Dynamisch", "Aufgeschlossen"],
-                "culturalTwin": selected_celebrity,
-                "description": "Eine Persönlichkeit, die kulturelle Vielfalt schätzt und offen für neue Erfahrungen ist. Liebt es, verschiedene Kulturen zu erkunden, sozial und kreativ von Natur aus.",
-                "interests": ["Film", "Musik", "Reisen", "Technologie"],
-                "culturalDNAScore": {
-                    "Nordamerika": f"{30 + (variation % 20)}%",
-                    "Europa": f"{20 + (variation % 15)}%",
-                    "Asien": f"{25 + (variation % 15)}%",
-                    "Deutschland": f"{15 + (variation % 10)}%"
-                },
-                "archetype": {
-                    "name": "Kultureller Entdecker",
-                    "description": "Aufgeschlossene Persönlichkeit, die es liebt, verschiedene Kulturen zu erkunden."
-                }
-            }
-        elif language == "hi":
-            fallback_response = {
-                "personaName": fallback_names["hi"][name_index],
-                "traits": ["रचनात्मक", "जिज्ञासु", "सामाजिक", "गतिशील", "खुले विचारों वाला"],
-                "culturalTwin": selected_celebrity,
-                "description": "एक व्यक्तित्व जो सांस्कृतिक विविधता को महत्व देता है और नए अनुभवों के लिए खुला है। विभिन्न संस्कृतियों की खोज करना पसंद करता है, स्वभाव से सामाजिक और रचनात्मक।",
-                "interests": ["फिल्म", "संगीत", "यात्रा", "प्रौद्योगिकी"],
-                "culturalDNAScore": {
-                    "उत्तरी अमेरिका": f"{30 + (variation % 20)}%",
-                    "यूरोप": f"{20 + (variation % 15)}%",
-                    "एशिया": f"{25 + (variation % 15)}%",
-                    "भारत": f"{15 + (variation % 10)}%"
-                },
-                "archetype": {
-                    "name": "सांस्कृतिक खोजकर्ता",
-                    "description": "खुले विचारों वाला व्यक्तित्व जो विभिन्न संस्कृतियों की खोज करना पसंद करता है।"
-                }
-            }
-        elif language == "zh":
-            fallback_response = {
-                "personaName": fallback_names["zh"][name_index],
-                "traits": ["创造性", "好奇", "社交", "动态", "开放思想"],
-                "culturalTwin": selected_celebrity,
-                "description": "一个重视文化多样性并对新体验开放的人格。喜欢探索不同文化，天生具有社交性和创造性。",
-                "interests": ["电影", "音乐", "旅行", "技术"],
-                "culturalDNAScore": {
-                    "北美": f"{30 + (variation % 20)}%",
-                    "欧洲": f"{20 + (variation % 15)}%",
-                    "亚洲": f"{25 + (variation % 15)}%",
-                    "中国": f"{15 + (variation % 10)}%"
-                },
-                "archetype": {
-                    "name": "文化探索者",
-                    "description": "思想开放的人格，喜欢探索不同文化。"
-                }
-            }
-        elif language == "it":
-            fallback_response = {
-                "personaName": fallback_names["it"][name_index],
-                "traits": ["Creativo", "Curioso", "Sociale", "Dinamico", "Mente Aperta"],
-                "culturalTwin": selected_celebrity,
-                "description": "Una personalità che valorizza la diversità culturale ed è aperta a nuove esperienze. Ama esplorare diverse culture, sociale e creativo per natura.",
-                "interests": ["Cinema", "Musica", "Viaggio", "Tecnologia"],
-                "culturalDNAScore": {
-                    "Nord America": f"{30 + (variation % 20)}%",
-                    "Europa": f"{20 + (variation % 15)}%",
-                    "Asia": f"{25 + (variation % 15)}%",
-                    "Italia": f"{15 + (variation % 10)}%"
-                },
-                "archetype": {
-                    "name": "Esploratore Culturale",
-                    "description": "Personalità di mente aperta che ama esplorare diverse culture."
-                }
-            }
-        else:
-            fallback_response = {
-                "personaName": fallback_names["en"][name_index],
-                "traits": ["Creative", "Curious", "Social", "Dynamic", "Open-minded"],
-                "culturalTwin": selected_celebrity,
-                "description": "A personality that values cultural diversity and is open to new experiences. Loves exploring different cultures, social and creative in nature.",
-                "interests": ["Film", "Music", "Travel", "Technology"],
-                "culturalDNAScore": {
-                    "North America": f"{30 + (variation % 20)}%",
-                    "Europe": f"{20 + (variation % 15)}%",
-                    "Asia": f"{25 + (variation % 15)}%",
-                    "Turkey": f"{15 + (variation % 10)}%"
-                },
-                "archetype": {
-                    "name": "Cultural Explorer",
-                    "description": "Open-minded personality who loves exploring different cultures."
-                }
-            }
-        return fallback_response
-    
-    print(f"🔍 DEBUG: generate_persona_from_taste called with variation: {variation}")
-    print(f"🔍 DEBUG: Input data - movies: {movies}, music: {music}, brands: {brands}, gender: {gender}")
-    
+def fallback_persona_from_pack(language: str, persona_name: str, celebrity: str, dna_scores: tuple) -> dict:
+    """Dil paketindeki sabit persona metinlerinden response oluştur"""
+    pack = language_pack(language)
+    persona = pack["persona"]
+    return FallbackResult({
+        "personaName": persona_name,
+        "traits": list(persona["traits"]),
+        "culturalTwin": celebrity,
+        "description": persona["description"],
+        "interests": list(persona["interests"]),
+        "culturalDNAScore": {region: f"{score}%" for region, score in zip(persona["dnaRegions"], dna_scores)},
+        "archetype": dict(persona["archetype"]),
+    })
+
+def build_fallback_persona(movies: str, music: str, brands: str, gender: str, language: str = "en", variation: int = 0) -> dict:
+    """API anahtarı yokken dile ve variation'a göre fallback persona üret"""
+    persona_names = language_pack(language)["personaNames"]
+
+    # Generate celebrity based on user preferences
+    if "iron man" in movies.lower() or "marvel" in movies.lower():
+        selected_celebrity = "Robert Downey Jr."
+    elif "rock" in music.lower() or "acdc" in music.lower():
+        selected_celebrity = "Angus Young"
+    elif "nike" in brands.lower():
+        selected_celebrity = "Michael Jordan"
+    else:
+        celebrity_options = common_pack()["celebrityOptions"]
+        selected_celebrity = celebrity_options[variation % len(celebrity_options)]
+
+    dna_scores = (30 + (variation % 20), 20 + (variation % 15), 25 + (variation % 15), 15 + (variation % 10))
+    return fallback_persona_from_pack(
+        language, persona_names[variation % len(persona_names)], selected_celebrity, dna_scores
+    )
+
+def build_persona_prompt(movies: str, music: str, brands: str, gender: str, target_language: str = "English", variation: int = 0) -> str:
+    """Variation seed'ine göre persona prompt'ını hazırla"""
     # Add more randomness to the prompt
     import random
     
@@ -1081,6 +1107,36 @@ def generate_persona_from_taste(movies: str, music: str, brands: str, gender: st
     - CRITICAL: If target_language is "English", write ALL text in English
     """
 
+    return prompt
+
+def generate_persona_from_taste(movies: str, music: str, brands: str, gender: str, language: str = "en", variation: int = 0) -> dict:
+    """OpenAI GPT-4 ile kullanıcı persona'sı oluştur"""
+    
+    # Tüm diller için doğru target language'ı belirle
+    language_mapping = {
+        "en": "English",
+        "tr": "Turkish", 
+        "es": "Spanish",
+        "fr": "French",
+        "de": "German",
+        "hi": "Hindi",
+        "zh": "Chinese",
+        "it": "Italian"
+    }
+    
+    target_language = language_mapping.get(language, "English")
+    
+    # API key kontrolü
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not has_openai_key():
+        print("⚠️ OpenAI API key not found, using fallback response")
+        return build_fallback_persona(movies, music, brands, gender, language=language, variation=variation)
+    
+    print(f"🔍 DEBUG: generate_persona_from_taste called with variation: {variation}")
+    print(f"🔍 DEBUG: Input data - movies: {movies}, music: {music}, brands: {brands}, gender: {gender}")
+    
+    prompt = build_persona_prompt(movies, music, brands, gender, target_language=target_language, variation=variation)
+
     try:
         headers = {
             "Authorization": f"Bearer {api_key}",
@@ -1091,7 +1147,7 @@ def generate_persona_from_taste(movies: str, music: str, brands: str, gender: st
         system_message = f"Respond only in {target_language}."
         
         data = {
-            "model": "gpt-4",
+            "model": model_router.choose("persona", language).model,
             "messages": [
                 {"role": "system", "content": system_message},
                 {"role": "user", "content": prompt}
@@ -1100,19 +1156,32 @@ def generate_persona_from_taste(movies: str, music: str, brands: str, gender: st
             "temperature": 1.0,  # Maximum temperature for maximum variety
             "top_p": 0.9,  # Add top_p for more randomness
         }
+
+        cache_key = completion_cache_key(data)
+        cached = completion_cache.get(cache_key)
+        if cached is not MISSING:
+            print("🟢 Persona completion cache hit")
+            return json.loads(cached)
         
-        response = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers=headers,
-            json=data,
-            timeout=60  # 60 saniye timeout
-        )
+        with upstream_scheduler.slot("openai"):
+            started = time.perf_counter()
+            try:
+                response = openai_session.post(
+                    OPENAI_CHAT_URL,
+                    headers=headers,
+                    json=data,
+                    timeout=60  # 60 saniye timeout
+                )
+            finally:
+                model_router.observe("persona", data["model"], time.perf_counter() - started)
         
         if response.status_code == 200:
             result = response.json()
             content = result["choices"][0]["message"]["content"]
             print(f"🔍 DEBUG: GPT response content: {content[:200]}...")  # Show first 200 chars
-            return json.loads(content)
+            parsed = json.loads(content)
+            completion_cache.set(cache_key, content)
+            return parsed
         else:
             print(f"❌ OpenAI API error: {response.status_code}")
             raise Exception(f"OpenAI API error: {response.status_code}")
@@ -1120,141 +1189,935 @@ def generate_persona_from_taste(movies: str, music: str, brands: str, gender: st
     except Exception as e:
         print(f"❌ Error in generate_persona_from_taste: {e}")
         
-        # Fallback response based on language
-        if language == "tr":
-            fallback_response = {
-                "personaName": "Kültürel Keşifçi",
-                "traits": ["Yaratıcı", "Meraklı", "Sosyal", "Dinamik", "Açık Fikirli"],
-                "culturalTwin": "Tom Hanks",
-                "description": "Kültürel çeşitliliğe değer veren, yeni deneyimlere açık bir kişilik. Farklı kültürleri keşfetmeyi seven, sosyal ve yaratıcı bir yapıya sahip.",
-                "interests": ["Film", "Müzik", "Seyahat", "Teknoloji"],
-                "culturalDNAScore": {
-                    "Kuzey Amerika": "35%",
-                    "Avrupa": "25%",
-                    "Asya": "25%",
-                    "Türkiye": "15%"
-                },
-                "archetype": {
-                    "name": "Kültürel Keşifçi",
-                    "description": "Farklı kültürleri keşfetmeyi seven, açık fikirli kişilik."
-                }
-            }
+        # Fallback response based on language (yalnızca tr/en)
+        pack_language = "tr" if language == "tr" else "en"
+        persona_name = language_pack(pack_language)["persona"]["archetype"]["name"]
+        return fallback_persona_from_pack(pack_language, persona_name, "Tom Hanks", (35, 25, 25, 15))
+
+def resolve_language(body: dict, request: Request) -> str:
+    # Get language from request body first, then fallback to Accept-Language header.
+    # An explicit language (also "en") is used verbatim: GET /analyze URLs are cached
+    # publicly without Vary: Accept-Language when the query names the language.
+    language = body.get("language") or "en"
+    
+    # If no language in body, try to get from Accept-Language header
+    if not body.get("language"):
+        accept_language = request.headers.get("accept-language", "")
+        if accept_language:
+            # Parse Accept-Language header (e.g., "tr-TR,tr;q=0.9,en;q=0.8")
+            # Extract the first language code
+            first_lang = accept_language.split(',')[0].split('-')[0].strip()
+            if first_lang in LANGUAGE_MAPPING:
+                language = first_lang
+                print(f"🔍 DEBUG: Using Accept-Language header: {first_lang}")
+
+    print(f"🔍 DEBUG: Final language selected: {language}")
+    return language
+
+# Analizde kullanılan ülkeler
+SAMPLE_COUNTRIES = ["USA", "South Korea", "UK", "Japan", "Germany", "France", "Italy", "Spain", "Canada", "Australia", "Brazil", "India", "China", "Russia"]
+# /analyze varsayılan olarak küçük bir alt küme üretir; diğer ülkeler kullanıcı
+# haritada tıkladığında /countries/{country} ile tek tek gelir
+DEFAULT_COUNTRIES = [c.strip() for c in os.getenv("DEFAULT_COUNTRIES", "USA,South Korea,UK,Japan").split(",") if c.strip()]
+
+def resolve_countries(value) -> list[str]:
+    """İstekteki countries alt kümesini doğrula, SAMPLE_COUNTRIES sırasına koy"""
+    if value is None:
+        return list(DEFAULT_COUNTRIES)
+    if not isinstance(value, list) or not all(isinstance(c, str) for c in value):
+        raise ValueError("countries must be a list of country names")
+    by_key = {c.casefold(): c for c in SAMPLE_COUNTRIES}
+    unknown = [c for c in value if c.strip().casefold() not in by_key]
+    if unknown:
+        raise ValueError(f"Unsupported countries: {', '.join(unknown)}")
+    wanted = {by_key[c.strip().casefold()] for c in value}
+    return [c for c in SAMPLE_COUNTRIES if c in wanted]
+
+# Qloo entity tipi -> request body alanı
+ENTITY_FIELDS = {"artist": "music", "movie": "movies", "brand": "brands"}
+
+def resolve_entities(body: dict) -> dict:
+    """Qloo autocomplete ile music/movies/brands için entity ID'lerini bul"""
+    return {
+        entity_type: autocomplete_entity(body[field], entity_type=entity_type)
+        for entity_type, field in ENTITY_FIELDS.items()
+    }
+
+def fetch_trending(entity_ids: dict) -> list:
+    """Çözümlenen entity'ler için Qloo trending listelerini birleştir.
+
+    /v2/insights istek başına tek filter.type kabul ediyor, bu yüzden tipler tek
+    sorguda birleştirilemiyor; istekler keep-alive havuzu üzerinden aynı anda
+    gönderilir ve sonuçlar tip sırasıyla birleştirilir (3 tur yerine 1 tur gecikme).
+    """
+    resolved = [(entity_type, entity_id) for entity_type, entity_id in entity_ids.items() if entity_id]
+    if len(resolved) <= 1:
+        return [name for entity_type, entity_id in resolved for name in get_qloo_trending(entity_id, entity_type=entity_type)]
+    # Executor context'i kopyalamaz; çağıranın şeridi elle taşınır
+    lane_name = current_lane.get()
+    futures = [qloo_fanout.submit(run_in_lane, lane_name, get_qloo_trending, entity_id, entity_type=entity_type) for entity_type, entity_id in resolved]
+    suggestions = []
+    for future in futures:
+        suggestions += future.result()
+    return suggestions
+
+def with_user_preferences(parsed: dict, body: dict) -> dict:
+    # Kullanıcı tercihlerini persona'ya ekle
+    user_preferences = {
+        "movies": body["movies"],
+        "music": body["music"], 
+        "brands": body["brands"],
+        "gender": body["gender"]
+    }
+    return {**parsed, "user_preferences": user_preferences}
+
+def log_persona_language(parsed: dict, language: str):
+    # Debug: Log the language being used
+    print(f"=== LANGUAGE DEBUG ===")
+    print(f"Requested language: {language}")
+    print(f"Target language: {LANGUAGE_MAPPING.get(language, 'English')}")
+    print(f"Parsed persona language check: {parsed.get('personaName', 'Unknown')}")
+    print(f"Parsed description language check: {parsed.get('description', 'Unknown')}")
+    print(f"Parsed traits language check: {parsed.get('traits', [])}")
+    print(f"Cultural Twin: {parsed.get('culturalTwin', 'Unknown')}")
+    print(f"Cultural Twin type: {type(parsed.get('culturalTwin', 'Unknown'))}")
+    print(f"=== END LANGUAGE DEBUG ===")
+
+# ♻️ "Yeniden üret": aynı girdiler yeni randomSeed ile gelir. Seed'den bağımsız aşamaların
+# (entity çözümleme, trending, isteğe bağlı country insights) sonucu kısa ömürlü bir
+# oturum bağlamında tutulur; regenerate yalnızca variation'a bağlı persona aşamasını çalıştırır.
+# Country insights önceki personaya göre yazıldığı için yeniden kullanımı varsayılan olarak kapalı
+ANALYSIS_SESSION_TTL_SECONDS = float(os.getenv("ANALYSIS_SESSION_TTL_SECONDS", "900"))
+REGENERATE_REUSE_COUNTRY_INSIGHTS = os.getenv("REGENERATE_REUSE_COUNTRY_INSIGHTS", "false").lower() in ("1", "true", "yes")
+analysis_sessions = TTLCache(maxsize=10000, ttl=ANALYSIS_SESSION_TTL_SECONDS)
+analysis_session_lookups = metrics.Counter("analysis_session_lookups_total", "Pipeline runs by whether a seed-independent session context was reused")
+
+def settled_request(body: dict) -> dict:
+    """body'nin bu çalışmada öğrenilen alias'larla kanonik hali. İlk istek "matrix" ile gelir,
+    Qloo onu "The Matrix"e çözer ve sonraki istekler ikinci biçimle kanonikleşir; sonuç her iki
+    anahtar altında saklanır ki ilk tekrar da cache'e isabet etsin"""
+    return canonicalize_request(body, entity_aliases, record=False)
+
+def run_analysis(body: dict, language: str, on_stage: Callable[[str, dict], None] | None = None) -> dict:
+    """Qloo + GPT pipeline'ını çalıştır; persona ve country insights döndür.
+
+    on_stage verilirse her aşama bittiğinde (aşama adı, kısmi sonuç) ile çağrılır.
+    """
+    context_key = session_key(body, language)
+    session = analysis_sessions.get(context_key)
+    analysis_session_lookups.inc(outcome="miss" if session is MISSING else "reused")
+
+    # Autocomplete + Qloo trending
+    if session is MISSING:
+        entity_ids = resolve_entities(body)
+        qloo_suggestions = fetch_trending(entity_ids)
+    else:
+        print("♻️ Regenerate: reusing entities and trending from the session context")
+        entity_ids, qloo_suggestions = session["entities"], session["qlooSuggestions"]
+    if on_stage:
+        on_stage("qloo", {"entities": entity_ids, "qlooSuggestions": qloo_suggestions})
+
+    # Get randomSeed for variation
+    random_seed = body.get("randomSeed", 0)
+    print(f"🔍 DEBUG: Using randomSeed as variation: {random_seed}")
+    
+    # GPT persona
+    parsed = generate_persona_from_taste(
+        movies=body["movies"],
+        music=body["music"],
+        brands=body["brands"],
+        gender=body["gender"],
+        language=language,
+        variation=random_seed  # Use randomSeed as variation
+    )
+    log_persona_language(parsed, language)
+    if on_stage:
+        on_stage("persona", {"persona": parsed, "culturalTwin": parsed.get("culturalTwin", "Unknown")})
+
+    # GPT country insights
+    parsed_with_preferences = with_user_preferences(parsed, body)
+    countries = body["countries"] if "countries" in body else DEFAULT_COUNTRIES
+    insights_reused = session is not MISSING and REGENERATE_REUSE_COUNTRY_INSIGHTS and bool(session["countryInsights"])
+    if insights_reused:
+        print("♻️ Regenerate: reusing country insights from the session context")
+        country_insights = session["countryInsights"]
+    else:
+        country_insights = generate_cultural_map_insights(countries, language=language, user_persona=parsed_with_preferences)
+    # Sabit fallback (ya da boş harita) içeren sonuç upstream kesintisinin ürünüdür;
+    # işaretlenir ki cache'e, result store'a ve oturum bağlamına girmesin
+    fallback = is_fallback(parsed) or is_fallback(country_insights) or (bool(countries) and not country_insights)
+    if not fallback:
+        context = {"entities": entity_ids, "qlooSuggestions": qloo_suggestions, "countryInsights": country_insights}
+        for key in {context_key, session_key(settled_request(body), language)}:
+            analysis_sessions.set(key, context)
+    
+    # Debug: Log the country insights
+    print("=== COUNTRY INSIGHTS DEBUG ===")
+    print("Sample countries:", countries)
+    print("Generated insights:", country_insights)
+    print("Insights type:", type(country_insights))
+    print("Insights keys:", list(country_insights.keys()) if country_insights else "None")
+    print("=== END COUNTRY INSIGHTS DEBUG ===")
+    if on_stage:
+        on_stage("countryInsights", {"countryInsights": country_insights})
+
+    analysis = {
+        "persona": parsed,
+        "countryInsights": country_insights
+    }
+    if fallback:
+        print("⚠️ Analysis contains fallback content, it will not be cached")
+        analysis["fallback"] = True
+    if insights_reused:
+        # Önceki personaya ait; yeni parmak izi altında country_cache'e yazılmaz
+        analysis["countryInsightsReused"] = True
+    return analysis
+
+def analysis_to_v1(analysis: dict) -> dict:
+    parsed = analysis["persona"]
+    # v1 contract: persona is a JSON string inside the JSON body
+    return {
+        "result": json.dumps(parsed),
+        "culturalTwin": parsed.get("culturalTwin", "Unknown"),
+        "countryInsights": analysis["countryInsights"],
+        "personaFingerprint": analysis.get("personaFingerprint"),
+        "resultId": analysis.get("resultId")
+    }
+
+def analysis_to_v2(analysis: dict) -> dict:
+    parsed = analysis["persona"]
+    return {
+        "persona": parsed,
+        "culturalTwin": parsed.get("culturalTwin", "Unknown"),
+        "countryInsights": analysis["countryInsights"],
+        "personaFingerprint": analysis.get("personaFingerprint"),
+        "resultId": analysis.get("resultId")
+    }
+
+# 🗺️ Persona parmak izi -> persona; /countries/{country} sonradan istenen ülkeyi
+# aynı persona için üretebilsin diye saklanır
+persona_store = TTLCache(maxsize=20000, ttl=float(os.getenv("PERSONA_STORE_TTL_SECONDS", "86400")))
+country_cache = TTLCache(maxsize=50000, ttl=float(os.getenv("COUNTRY_CACHE_TTL_SECONDS", "86400")))
+
+def persona_fingerprint(persona: dict) -> str:
+    return hashlib.sha256(json.dumps(persona, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:32]
+
+def remember_persona(analysis: dict, body: dict, language: str) -> dict:
+    """Persona'yı ve üretilen ülkeleri sakla; analize personaFingerprint ekle"""
+    if analysis.get("fallback"):
+        # Fallback persona için ülke üretimi anlamsız; /countries tekrar analiz ister
+        return {**analysis, "personaFingerprint": None}
+    persona = with_user_preferences(analysis["persona"], body)
+    fingerprint = persona_fingerprint(persona)
+    persona_store.set(fingerprint, persona)
+    if not analysis.get("countryInsightsReused"):
+        for country, insight in analysis["countryInsights"].items():
+            country_cache.set((fingerprint, language, country), insight)
+    return {**analysis, "personaFingerprint": fingerprint}
+
+# 🔗 Paylaşılabilir sonuçlar: her tamamlanan analiz içerikten türetilen ID ile
+# SQLite'a yazılır; GET /results/{id} upstream'e gitmeden depodan servis eder
+RESULT_STORE_PATH = os.getenv("RESULT_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.sqlite3"))
+RESULT_STORE_RETENTION_DAYS = float(os.getenv("RESULT_STORE_RETENTION_DAYS", "90"))
+# SQLite dosyası import sırasında değil ilk kullanımda açılır (cold start)
+_result_store: ResultStore | None = None
+_result_store_lock = threading.Lock()
+
+def get_result_store() -> ResultStore:
+    global _result_store
+    if _result_store is None:
+        with _result_store_lock:
+            if _result_store is None:
+                _result_store = ResultStore(RESULT_STORE_PATH)
+    return _result_store
+
+def store_result(analysis: dict) -> dict:
+    """Analizi v2 şeklinde sakla; analize resultId ekle (hata olursa ya da fallback ise analiz aynen döner)"""
+    if analysis.get("fallback"):
+        return analysis
+    payload = analysis_to_v2(analysis)
+    del payload["resultId"]
+    try:
+        return {**analysis, "resultId": get_result_store().put(payload)}
+    except Exception as e:
+        print(f"⚠️ Could not store result: {e}")
+        return analysis
+
+def persist_analysis(analysis: dict, body: dict, language: str) -> dict:
+    """Yeni hesaplanan analizi bir kez sakla (persona, ülkeler, result store). Dönen analiz
+    personaFingerprint ve resultId taşır; cache'e bu haliyle girer ki hit'ler tekrar yazmasın"""
+    return store_result(remember_persona(analysis, body, language))
+
+def prune_result_store():
+    try:
+        store = get_result_store()
+        removed = store.prune(RESULT_STORE_RETENTION_DAYS * 86400)
+        print(f"🔗 Result store: {len(store)} results ({removed} expired removed)")
+    except Exception as e:
+        print(f"⚠️ Could not prune result store: {e}")
+
+async def read_analysis_request(request: Request) -> tuple[dict, str]:
+    return prepare_analysis_body(await request.json(), request)
+
+def prepare_analysis_body(raw: dict, request: Request) -> tuple[dict, str]:
+    body = canonicalize_request(raw, entity_aliases)
+    try:
+        body["countries"] = resolve_countries(body.get("countries"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    print("📨 Received body (canonical):", body)
+    print("🔍 DEBUG: randomSeed from request:", body.get("randomSeed", "NOT FOUND"))
+    print("🔍 DEBUG: variation from request:", body.get("variation", "NOT FOUND"))
+    return body, resolve_language(body, request)
+
+# ⚡ Offline üretilmiş popüler kombinasyonlar (precompute.py); startup'ta yüklenir
+PRECOMPUTED_INDEX_FILE = os.getenv("PRECOMPUTED_INDEX_FILE", DEFAULT_INDEX_FILE)
+precomputed_index = PrecomputedIndex()
+
+def load_precomputed_index():
+    global precomputed_index
+    try:
+        precomputed_index = PrecomputedIndex.load(PRECOMPUTED_INDEX_FILE)
+        print(f"⚡ Precomputed index: {len(precomputed_index)} entries from {PRECOMPUTED_INDEX_FILE}")
+    except Exception as e:
+        print(f"⚠️ Could not load precomputed index {PRECOMPUTED_INDEX_FILE}: {e}")
+
+def cached_analysis(body: dict, language: str) -> dict | None:
+    """Result cache (saklanmış, resultId'li analiz); body kanonik olmalı"""
+    cached = result_cache.get(canonical_key(body, language))
+    if cached is not MISSING:
+        print("🟢 Result cache hit")
+        return cached
+    return None
+
+def precomputed_analysis(body: dict, language: str) -> dict | None:
+    """Precomputed index kaydı; ilk kullanımda saklanıp result cache'e alınır (worker thread)"""
+    precomputed = precomputed_index.get(body, language)
+    if precomputed is None:
+        return None
+    print("⚡ Served from precomputed index")
+    analysis = persist_analysis(precomputed, body, language)
+    result_cache.set(canonical_key(body, language), analysis)
+    return analysis
+
+# 🌐 Dil değişimi: aynı kanonik istek başka bir dilde hazırsa pipeline'ı
+# baştan çalıştırmak yerine tek bir çeviri çağrısıyla yeniden kullan
+analysis_translations = metrics.Counter("analysis_translations_total", "Language switches answered by translating an existing analysis")
+
+def find_translation_source(body: dict, language: str) -> tuple[str, dict] | None:
+    for source_language in LANGUAGE_MAPPING:
+        if source_language == language:
+            continue
+        key = canonical_key(body, source_language)
+        analysis = precomputed_index.get(body, source_language)
+        if analysis is None and key in result_cache:
+            analysis = result_cache.get(key, None)
+        if analysis is not None:
+            return source_language, analysis
+    return None
+
+def translate_analysis(analysis: dict, source_language: str, language: str) -> dict | None:
+    """Analizin metinlerini hedef dile çevir; başarısızsa None"""
+    if not has_openai_key():
+        return None
+    strings = collect_strings(analysis)
+    if not strings:
+        return analysis
+    model = model_router.choose("translation", language).model
+    request_data = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": f"You are a translator. Respond only in {LANGUAGE_MAPPING.get(language, 'English')}."},
+            {"role": "user", "content": build_translation_prompt(strings, LANGUAGE_MAPPING.get(source_language, "English"), LANGUAGE_MAPPING.get(language, "English"))}
+        ],
+        "temperature": 0.2
+    }
+    try:
+        cache_key = completion_cache_key(request_data)
+        content = completion_cache.get(cache_key)
+        if content is MISSING:
+            with upstream_scheduler.slot("openai"):
+                started = time.perf_counter()
+                try:
+                    response = get_openai_client().chat.completions.create(**request_data)
+                finally:
+                    model_router.observe("translation", model, time.perf_counter() - started)
+            content = response.choices[0].message.content or ""
+        translated = parse_translation(content, len(strings))
+        if translated is None:
+            print(f"⚠️ Translation {source_language} → {language} returned an unusable result")
+            return None
+        completion_cache.set(cache_key, content)
+        return replace_strings(analysis, iter(translated))
+    except Exception as e:
+        print(f"⚠️ Translation {source_language} → {language} failed: {e}")
+        return None
+
+def translate_or_run_analysis(body: dict, language: str, on_stage: Callable[[str, dict], None] | None = None) -> dict:
+    precomputed = precomputed_analysis(body, language)
+    if precomputed is not None:
+        return precomputed
+    source = find_translation_source(body, language)
+    if source is not None:
+        source_language, source_analysis = source
+        translated = translate_analysis(source_analysis, source_language, language)
+        analysis_translations.inc(outcome="translated" if translated is not None else "failed")
+        if translated is not None:
+            print(f"🌐 Translated cached analysis {source_language} → {language}")
+            translated = persist_analysis(translated, body, language)
+            result_cache.set(canonical_key(body, language), translated)
+            return translated
+    return run_and_cache_analysis(body, language, on_stage=on_stage)
+
+def run_and_cache_analysis(body: dict, language: str, on_stage: Callable[[str, dict], None] | None = None) -> dict:
+    analysis = persist_analysis(run_analysis(body, language, on_stage=on_stage), body, language)
+    if not analysis.get("fallback"):
+        for key in {canonical_key(body, language), canonical_key(settled_request(body), language)}:
+            result_cache.set(key, analysis)
+    return analysis
+
+# 🔬 Tek bir yavaş isteği incelemek için: X-Profile: 1 (ya da ?profile=1) ve
+# X-Profile-Token başlığı gönderilirse o /analyze çalışması örnekleyen profiler
+# altında koşar. PROFILE_TOKEN tanımlı değilse özellik kapalıdır; bayraksız
+# isteklerde hiçbir ek iş yapılmaz.
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", "0.005"))
+
+def requested_profile(request: Request, body: dict, language: str) -> ProfileSession | None:
+    if request.headers.get("x-profile") != "1" and request.query_params.get("profile") != "1":
+        return None
+    token = request.headers.get("x-profile-token", "")
+    if not PROFILE_TOKEN or not hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Profiling is not allowed")
+    return ProfileSession(PROFILE_DIR, interval=PROFILE_INTERVAL_SECONDS, label=f"{request.url.path} [{language}] {body['movies']} / {body['music']} / {body['brands']} seed={body.get('randomSeed', 0)}")
+
+async def analyze(body: dict, language: str, profile: ProfileSession | None = None) -> dict:
+    """Cache'te varsa oradan, yoksa pipeline'ı çalıştırarak analiz döndür"""
+    analysis = cached_analysis(body, language)
+    if analysis is None:
+        if profile is None:
+            analysis = await asyncio.to_thread(translate_or_run_analysis, body, language)
         else:
-            fallback_response = {
-                "personaName": "Cultural Explorer",
-                "traits": ["Creative", "Curious", "Social", "Dynamic", "Open-minded"],
-                "culturalTwin": "Tom Hanks",
-                "description": "A personality that values cultural diversity and is open to new experiences. Loves exploring different cultures, social and creative in nature.",
-                "interests": ["Film", "Music", "Travel", "Technology"],
-                "culturalDNAScore": {
-                    "North America": "35%",
-                    "Europe": "25%",
-                    "Asia": "25%",
-                    "Turkey": "15%"
-                },
-                "archetype": {
-                    "name": "Cultural Explorer",
-                    "description": "Open-minded personality who loves exploring different cultures."
-                }
-            }
-        
-        return fallback_response
+            analysis = await asyncio.to_thread(profile.run, translate_or_run_analysis, body, language)
+    elif profile is not None:
+        await asyncio.to_thread(profile.write, "cached")
+    return analysis
 
 # 🔍 Ana analiz endpoint'i
 @app.post("/analyze")
-async def analyze_profile(request: Request):
+async def analyze_profile(request: Request, response: Response):
     try:
-        body = await request.json()
-        print("📨 Received body:", body)
-        print("🔍 DEBUG: randomSeed from request:", body.get("randomSeed", "NOT FOUND"))
-        print("🔍 DEBUG: variation from request:", body.get("variation", "NOT FOUND"))
+        body, language = await read_analysis_request(request)
+        profile = requested_profile(request, body, language)
+        analysis = await analyze(body, language, profile)
+        if profile is not None:
+            response.headers["X-Profile-Id"] = profile.id
+        return analysis_to_v1(analysis)
 
-        variation = body.get("variation", 0)
-        
-        # Get language from request body first, then fallback to Accept-Language header
-        language = body.get("language", "en")
-        
-        # If no language in body, try to get from Accept-Language header
-        if language == "en":
-            accept_language = request.headers.get("accept-language", "")
-            if accept_language:
-                # Parse Accept-Language header (e.g., "tr-TR,tr;q=0.9,en;q=0.8")
-                # Extract the first language code
-                first_lang = accept_language.split(',')[0].split('-')[0].strip()
-                if first_lang in LANGUAGE_MAPPING:
-                    language = first_lang
-                    print(f"🔍 DEBUG: Using Accept-Language header: {first_lang}")
-
-        print(f"🔍 DEBUG: Final language selected: {language}")
-
-        # Autocomplete
-        music_id = autocomplete_entity(body["music"], entity_type="artist")
-        movie_id = autocomplete_entity(body["movies"], entity_type="movie")
-        brand_id = autocomplete_entity(body["brands"], entity_type="brand")
-
-        # Qloo trending
-        music_trends = get_qloo_trending(music_id, entity_type="artist")
-        movie_trends = get_qloo_trending(movie_id, entity_type="movie")
-        brand_trends = get_qloo_trending(brand_id, entity_type="brand")
-
-        qloo_suggestions = music_trends + movie_trends + brand_trends
-
-        # Get randomSeed for variation
-        random_seed = body.get("randomSeed", 0)
-        print(f"🔍 DEBUG: Using randomSeed as variation: {random_seed}")
-        
-        # GPT persona
-        ai_result = generate_persona_from_taste(
-            movies=body["movies"],
-            music=body["music"],
-            brands=body["brands"],
-            gender=body["gender"],
-            language=language,
-            variation=random_seed  # Use randomSeed as variation
-        )
-        parsed = json.loads(json.dumps(ai_result)) # Ensure it's a dict
-        
-        # Debug: Log the language being used
-        print(f"=== LANGUAGE DEBUG ===")
-        print(f"Requested language: {language}")
-        print(f"Target language: {LANGUAGE_MAPPING.get(language, 'English')}")
-        print(f"Parsed persona language check: {parsed.get('personaName', 'Unknown')}")
-        print(f"Parsed description language check: {parsed.get('description', 'Unknown')}")
-        print(f"Parsed traits language check: {parsed.get('traits', [])}")
-        print(f"Cultural Twin: {parsed.get('culturalTwin', 'Unknown')}")
-        print(f"Cultural Twin type: {type(parsed.get('culturalTwin', 'Unknown'))}")
-        print(f"=== END LANGUAGE DEBUG ===")
-
-        # GPT country insights
-        sample_countries = ["USA", "South Korea", "UK", "Japan", "Germany", "France", "Italy", "Spain", "Canada", "Australia", "Brazil", "India", "China", "Russia"]
-        
-        # Kullanıcı tercihlerini persona'ya ekle
-        user_preferences = {
-            "movies": body["movies"],
-            "music": body["music"], 
-            "brands": body["brands"],
-            "gender": body["gender"]
-        }
-        
-        # Parsed persona'ya kullanıcı tercihlerini ekle
-        parsed_with_preferences = {**parsed, "user_preferences": user_preferences}
-        
-        country_insights = generate_cultural_map_insights(sample_countries, language=language, user_persona=parsed_with_preferences)
-        
-        # Debug: Log the country insights
-        print("=== COUNTRY INSIGHTS DEBUG ===")
-        print("Sample countries:", sample_countries)
-        print("Generated insights:", country_insights)
-        print("Insights type:", type(country_insights))
-        print("Insights keys:", list(country_insights.keys()) if country_insights else "None")
-        print("=== END COUNTRY INSIGHTS DEBUG ===")
-
-        return {
-            "result": json.dumps(parsed),
-            "culturalTwin": parsed.get("culturalTwin", "Unknown"),
-            "countryInsights": country_insights
-        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+# 🔍 v2: persona nested object olarak döner; response_model sayesinde
+# FastAPI cevabı Pydantic ile doğrudan JSON byte'larına tek seferde serialize eder
+@app.post("/v2/analyze", response_model=AnalyzeResponseV2)
+async def analyze_profile_v2(request: Request, response: Response):
+    try:
+        body, language = await read_analysis_request(request)
+        profile = requested_profile(request, body, language)
+        analysis = await analyze(body, language, profile)
+        if profile is not None:
+            response.headers["X-Profile-Id"] = profile.id
+        return analysis_to_v2(analysis)
+
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+# 🔗 Cache'lenebilir GET formu: kanonik girdiler query string'de, sonuç güçlü ETag
+# ve Cache-Control ile döner; tarayıcı / CDN / reverse proxy tekrarları kendisi karşılar
+ANALYZE_HTTP_MAX_AGE_SECONDS = int(os.getenv("ANALYZE_HTTP_MAX_AGE_SECONDS", "3600"))
+# Bilinmeyen parametre sessizce yok sayılmaz: yazım hatası farklı bir URL'de aynı sonucu
+# cache'letir ya da istenen şeyi (ör. profile) yapmadan döner
+ANALYZE_QUERY_PARAMS = frozenset({"movies", "music", "brands", "gender", "language", "randomSeed", "countries", "profile"})
+
+def read_analysis_query(request: Request) -> tuple[dict, str]:
+    params = request.query_params
+    unknown = sorted(set(params) - ANALYZE_QUERY_PARAMS)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown query parameters: {', '.join(unknown)}")
+    if "language" in params and params["language"] not in LANGUAGE_MAPPING:
+        raise HTTPException(status_code=422, detail=f"Unsupported language: {params['language']}")
+    raw = {f: params.get(f, "") for f in ("movies", "music", "brands", "gender")}
+    missing = [f for f, v in raw.items() if not v]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing fields: {', '.join(missing)}")
+    if "language" in params:
+        raw["language"] = params["language"]
+    try:
+        raw["randomSeed"] = int(params.get("randomSeed", "0"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="randomSeed must be an integer")
+    if "countries" in params:
+        raw["countries"] = [c for c in params["countries"].split(",") if c.strip()]
+    return prepare_analysis_body(raw, request)
+
+def matching_etag(if_none_match: str, etag: str) -> str | None:
+    """If-None-Match içinde etag'e denk gelen değeri döndür (encoding son ekleri ve W/ yok sayılır)"""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return etag
+        if strip_etag_variant(candidate) == etag:
+            return candidate
+    return None
+
+async def cacheable_analysis(request: Request, render: Callable[[dict], bytes]) -> Response:
+    body, language = read_analysis_query(request)
+    profile = requested_profile(request, body, language)
+    analysis = await analyze(body, language, profile)
+    content = render(analysis)
+    # ETag cevabın baytlarından türer; çıktıyı etkileyen her parametre onu da değiştirir
+    etag = f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={ANALYZE_HTTP_MAX_AGE_SECONDS}"}
+    if analysis.get("fallback"):
+        # Upstream kesintisinin geçici sonucu CDN'de kalmasın
+        headers["Cache-Control"] = "no-store"
+    if profile is not None:
+        # Profil isteği admin'e özel; CDN'e girmez
+        headers["Cache-Control"] = "no-store"
+        headers["X-Profile-Id"] = profile.id
+    if "language" not in request.query_params:
+        headers["Vary"] = "Accept-Language"
+
+    matched = matching_etag(request.headers.get("if-none-match", ""), etag)
+    if matched:
+        # 304, istemcinin elindeki temsilin ETag'ini aynen geri verir
+        return Response(status_code=304, headers={**headers, "ETag": matched})
+    return Response(content, media_type="application/json", headers=headers)
+
+@app.get("/analyze")
+async def analyze_profile_get(request: Request):
+    return await cacheable_analysis(request, lambda analysis: json.dumps(analysis_to_v1(analysis)).encode("utf-8"))
+
+@app.get("/v2/analyze")
+async def analyze_profile_v2_get(request: Request):
+    return await cacheable_analysis(
+        request, lambda analysis: AnalyzeResponseV2.model_validate(analysis_to_v2(analysis)).model_dump_json().encode("utf-8")
+    )
+
+# 📦 Toplu analiz: aynı dil + archetype + ülkelere sahip profiller cultural map'i paylaşır,
+# LLM aşamaları sınırlı paralellikle çalışır. Persona ve cultural map Qloo verisi kullanmadığı
+# için batch entity çözümleme / trending çağrısı yapmaz
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_PROFILES = int(os.getenv("BATCH_MAX_PROFILES", "5000"))
+# Batch'lerin kendi kotası vardır (profil başına bir token): etkileşimli /analyze bucket'ı
+# büyük bir batch'i hiç karşılayamaz. Varsayılan burst en büyük batch'i tek seferde alır
+BATCH_RATE_LIMIT_PER_MINUTE = float(os.getenv("BATCH_RATE_LIMIT_PER_MINUTE", "100"))
+BATCH_RATE_LIMIT_BURST = int(os.getenv("BATCH_RATE_LIMIT_BURST", str(BATCH_MAX_PROFILES)))
+batch_limiter = TokenBucketLimiter(BATCH_RATE_LIMIT_PER_MINUTE, BATCH_RATE_LIMIT_BURST, rate_limiter.store)
+
+@app.post("/analyze/batch")
+async def analyze_batch(batch: BatchAnalyzeRequest, request: Request):
+    body = batch.model_dump()
+    profiles = batch.profiles
+    if not profiles:
+        raise HTTPException(status_code=400, detail="profiles must be a non-empty list")
+    # Batch bucket'ı burst'ten fazlasını hiç karşılayamaz; daha büyük batch bölünmeli
+    max_profiles = min(BATCH_MAX_PROFILES, batch_limiter.burst) if RATE_LIMIT_ENABLED else BATCH_MAX_PROFILES
+    if len(profiles) > max_profiles:
+        raise HTTPException(status_code=400, detail=f"At most {max_profiles} profiles per batch")
+    # Middleware isteği /analyze bucket'ından bir kez saydı; profiller batch kotasından düşer
+    if RATE_LIMIT_ENABLED:
+        result = await take_rate_limit(f"batch:{request.state.rate_limit_client}", len(profiles), limiter=batch_limiter)
+        if not result.allowed:
+            return rate_limited_response(result)
+
+    default_language = resolve_language(body, request)
+    print(f"📦 Batch received: {len(profiles)} profiles, concurrency {BATCH_CONCURRENCY}")
+
+    async def stream():
+        semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+        async def limited(fn, *args, **kwargs):
+            async with semaphore:
+                return await asyncio.to_thread(run_in_lane, "batch", fn, *args, **kwargs)
+
+        valid = {}
+        for index, profile in enumerate(profiles):
+            if not isinstance(profile, dict) or any(not profile.get(f) for f in ("movies", "music", "brands", "gender")):
+                profile_id = profile.get("id") if isinstance(profile, dict) else None
+                yield json.dumps({"index": index, "id": profile_id, "error": "movies, music, brands and gender are required"}) + "\n"
+                continue
+            try:
+                valid[index] = {**canonicalize_request(profile, entity_aliases), "countries": resolve_countries(profile.get("countries"))}
+            except ValueError as e:
+                yield json.dumps({"index": index, "id": profile.get("id"), "error": str(e)}) + "\n"
+
+        # (language, archetype, ülkeler) başına tek cultural map; grubun ilk profilinin
+        # kişiselleştirmesiyle üretilir, o yüzden yalnızca onun parmak izi altında saklanır
+        country_groups: dict[tuple, tuple[int, asyncio.Future]] = {}
+
+        def country_insights_for(index: int, language: str, persona: dict, profile: dict) -> tuple[int, asyncio.Future]:
+            archetype = persona.get("archetype")
+            key = (language, archetype.get("name", "") if isinstance(archetype, dict) else str(archetype or ""), tuple(profile["countries"]))
+            if key not in country_groups:
+                country_groups[key] = (index, asyncio.ensure_future(limited(
+                    generate_cultural_map_insights, profile["countries"],
+                    language=language, user_persona=with_user_preferences(persona, profile)
+                )))
+            return country_groups[key]
+
+        async def run_one(index: int, profile: dict) -> dict:
+            try:
+                language = profile.get("language") or default_language
+                persona = await limited(
+                    generate_persona_from_taste,
+                    movies=profile["movies"],
+                    music=profile["music"],
+                    brands=profile["brands"],
+                    gender=profile["gender"],
+                    language=language,
+                    variation=profile.get("randomSeed", 0)
+                )
+                owner, group = country_insights_for(index, language, persona, profile)
+                country_insights = await group
+                analysis = {"persona": persona, "countryInsights": country_insights}
+                if is_fallback(persona) or is_fallback(country_insights) or not country_insights:
+                    analysis["fallback"] = True
+                if owner != index:
+                    # Başka bir profilin personasına göre yazıldı; bu parmak izi altında cache'lenmez
+                    analysis["countryInsightsReused"] = True
+                analysis = await asyncio.to_thread(persist_analysis, analysis, profile, language)
+                return {
+                    "index": index,
+                    "id": profile.get("id"),
+                    "persona": persona,
+                    "culturalTwin": persona.get("culturalTwin", "Unknown"),
+                    "countryInsights": country_insights,
+                    "personaFingerprint": analysis.get("personaFingerprint"),
+                    "resultId": analysis.get("resultId")
+                }
+            except Exception as e:
+                traceback.print_exc()
+                return {"index": index, "id": profile.get("id"), "error": f"Analysis failed: {str(e)}"}
+
+        # Sonuçlar tamamlandıkça NDJSON satırı olarak gönderilir. İstemci bağlantıyı keserse
+        # bekleyen profiller iptal edilir ki upstream kotası boşa harcanmasın
+        tasks = [asyncio.ensure_future(run_one(i, p)) for i, p in valid.items()]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished, ensure_ascii=False) + "\n"
+            print(f"📦 Batch done: {len(country_groups)} cultural map group(s) for {len(valid)} profiles")
+        finally:
+            pending = [t for t in tasks + [group for _, group in country_groups.values()] if not t.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                print(f"📦 Batch cancelled, {len(pending)} pending task(s) dropped")
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+# ⏳ Asenkron job modu: uzun analizler için hemen job ID döner,
+# sonuç GET /jobs/{id} ile sorgulanır. Kuyruk doluysa 429.
+job_queue = JobQueue(
+    workers=int(os.getenv("JOB_WORKERS", "2")),
+    max_queued=int(os.getenv("JOB_QUEUE_SIZE", "100")),
+    ttl_seconds=float(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+)
+
+def run_analysis_job(body: dict, language: str, on_stage: Callable[[str, dict], None] | None = None) -> dict:
+    return analysis_to_v2(cached_analysis(body, language) or translate_or_run_analysis(body, language, on_stage=on_stage))
+
+@app.post("/jobs/analyze", status_code=202)
+async def submit_analysis_job(request: Request):
+    body, language = await read_analysis_request(request)
+    missing = [f for f in ("movies", "music", "brands", "gender") if not body.get(f)]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing fields: {', '.join(missing)}")
+
+    try:
+        job = job_queue.submit(run_analysis_job, body, language)
+    except QueueFullError:
+        raise HTTPException(status_code=429, detail="Analysis queue is full, retry later", headers={"Retry-After": "10"})
+
+    print(f"⏳ Job queued: {job.id}")
+    return {"jobId": job.id, "status": job.status, "statusUrl": f"/jobs/{job.id}"}
+
+@app.get("/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job.to_dict()
+
+@app.get("/countries/{country}", response_model=CountryInsight)
+async def country_details(country: str, fingerprint: str, language: str = "en"):
+    """Haritada tıklanan tek ülkeyi /analyze'ın döndürdüğü persona için üret (ya da cache'ten ver)"""
+    try:
+        country = resolve_countries([country])[0]
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    cache_key = (fingerprint, language, country)
+    cached = country_cache.get(cache_key)
+    if cached is not MISSING:
+        print(f"🟢 Country cache hit [{country}]")
+        return cached
+
+    persona = persona_store.get(fingerprint)
+    if persona is MISSING:
+        raise HTTPException(status_code=404, detail="Unknown or expired persona fingerprint, run the analysis again")
+
+    insights = await asyncio.to_thread(generate_cultural_map_insights, [country], language=language, user_persona=persona)
+    if is_fallback(insights):
+        # Sabit yer tutucu bu personaya ait değil; cache'lenmez, istemci tekrar dener
+        raise HTTPException(status_code=503, detail=f"Insight for {country} is temporarily unavailable", headers={"Retry-After": "30"})
+    insight = insights.get(country)
+    if insight is None and len(insights) == 1:
+        # Model ülke adını farklı yazdıysa (ör. "United States") tek sonucu kabul et
+        insight = {**next(iter(insights.values())), "country": country}
+    if not insight:
+        raise HTTPException(status_code=404, detail=f"No insight available for {country}")
+    country_cache.set(cache_key, insight)
+    return insight
+
+# Cache ömrü saklama süresinin yarısını geçmez: cache'ten düşen link origin'e
+# geldiğinde satır hâlâ durur ve okuma onun süresini yeniler
+RESULT_HTTP_MAX_AGE_SECONDS = min(
+    int(os.getenv("RESULT_HTTP_MAX_AGE_SECONDS", str(365 * 86400))),
+    int(RESULT_STORE_RETENTION_DAYS * 86400 / 2),
+)
+
+@app.get("/results/{result_id}")
+async def get_result(result_id: str, request: Request):
+    """Paylaşılan sonuç: içerik ID'ye bağlı olduğu için değişmez, uzun süre cache'lenebilir"""
+    etag = f'"{result_id}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={RESULT_HTTP_MAX_AGE_SECONDS}, immutable"}
+    matched = matching_etag(request.headers.get("if-none-match", ""), etag)
+    if matched:
+        return Response(status_code=304, headers={**headers, "ETag": matched})
+    content = await asyncio.to_thread(get_result_store().get, result_id)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Unknown result id")
+    return Response(content, media_type="application/json", headers=headers)
+
+# 🏃 Form doldurulurken ön ısıtma: frontend girdileri (debounce ile) gönderir, entity
+# çözümleme + trending arka planda prefetch şeridinde çalışır; ardından gelen /analyze
+# bu aşamaları cache'ten alır. Kendi (daha cömert) rate limit'i vardır, cevap beklemez.
+PREFETCH_RATE_LIMIT_PER_MINUTE = float(os.getenv("PREFETCH_RATE_LIMIT_PER_MINUTE", "120"))
+PREFETCH_RATE_LIMIT_BURST = int(os.getenv("PREFETCH_RATE_LIMIT_BURST", "30"))
+PREFETCH_MAX_INFLIGHT = int(os.getenv("PREFETCH_MAX_INFLIGHT", "32"))
+# Aynı bucket store'u paylaşır; anahtarlar "prefetch:" önekiyle ayrılır
+prefetch_limiter = TokenBucketLimiter(PREFETCH_RATE_LIMIT_PER_MINUTE, PREFETCH_RATE_LIMIT_BURST, rate_limiter.store)
+prefetch_inflight: set[tuple[str, str]] = set()
+prefetch_tasks: set[asyncio.Task] = set()
+prefetch_requests = metrics.Counter("prefetch_entities_total", "Entities sent to /prefetch by outcome")
+
+async def prefetch_entity(key: tuple[str, str], query: str, entity_type: str):
+    try:
+        await asyncio.to_thread(run_in_lane, "prefetch", warm_entity, query, entity_type)
+    except Exception as e:
+        print(f"⚠️ Prefetch failed for {query}: {e}")
+    finally:
+        prefetch_inflight.discard(key)
+
+@app.post("/prefetch", status_code=202)
+async def prefetch_entities(request: Request):
+    if RATE_LIMIT_ENABLED:
+        result = await take_rate_limit(f"prefetch:{rate_limit_client(request)}", limiter=prefetch_limiter)
+        if not result.allowed:
+            return rate_limited_response(result)
+    body = await request.json()
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="Expected a JSON object")
+
+    # Kısmi girdi: yalnızca dolu alanlar, /analyze ile aynı kanonik biçimde; yarım yazılmış
+    # terimler alias tablosuna ilk yazım olarak kaydedilmez
+    partial = {field: body[field] for field in ENTITY_FIELDS.values() if isinstance(body.get(field), str) and body[field].strip()}
+    canonical = canonicalize_request(partial, entity_aliases, record=False)
+    queued = 0
+    for entity_type, field in ENTITY_FIELDS.items():
+        query = canonical.get(field)
+        if not query:
+            continue
+        key = (term_key(query), entity_type)
+        if key in prefetch_inflight:
+            prefetch_requests.inc(outcome="duplicate")
+            continue
+        if len(prefetch_inflight) >= PREFETCH_MAX_INFLIGHT:
+            prefetch_requests.inc(outcome="dropped")
+            continue
+        prefetch_inflight.add(key)
+        task = asyncio.create_task(prefetch_entity(key, query, entity_type))
+        prefetch_tasks.add(task)
+        task.add_done_callback(prefetch_tasks.discard)
+        prefetch_requests.inc(outcome="queued")
+        queued += 1
+    return {"queued": queued}
+
+@app.get("/entities/suggest")
+async def suggest_entities(q: str = "", type: str = "", limit: int = 8):
+    # Sadece bellekten cevaplanır, Qloo'ya gidilmez
+    limit = max(1, min(limit, 50))
+    return {"query": q, "results": entity_index.suggest(q, type, limit)}
+
+# 🔥 Startup warm-up: popüler entity'leri çöz, trending'lerini cache'e al
+# ve upstream bağlantı havuzlarını aç; bitene kadar /ready 503 döner.
+# Cassette açıkken atlanır: kayıt yalnızca gerçek trafiği içerir (HEAD / models.list
+# girmez) ve replay, kayıttaki cache durumunu birebir yeniden üretir
+WARMUP_ENTITIES_FILE = os.getenv("WARMUP_ENTITIES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "warmup_entities.json"))
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "60"))
+
+warmup_state = {"ready": False, "entities": 0, "resolved": 0, "durationSeconds": None, "error": None, "skipped": None}
+warmup_task: asyncio.Task | None = None
+
+def load_warmup_entities(path: str) -> list[tuple[str, str]]:
+    """[{"query": "Radiohead", "type": "artist"}, ...] veya [["Radiohead", "artist"], ...]"""
+    if not path or not os.path.exists(path):
+        print(f"⚠️ Warm-up list not found: {path}")
+        return []
+
+    with open(path, encoding="utf-8") as f:
+        items = json.load(f)
+
+    pairs = []
+    for item in items:
+        if isinstance(item, dict):
+            query, entity_type = item.get("query"), item.get("type", "artist")
+        else:
+            query, entity_type = item
+        if query and entity_type in ENTITY_FIELDS:
+            pairs.append((query, entity_type))
+    return list(dict.fromkeys(pairs))
+
+def open_upstream_connections():
+    """İlk kullanıcı isteği TLS handshake maliyetini ödemesin"""
+    qloo_key = os.getenv("QLOO_API_KEY")
+    if qloo_key:
+        try:
+            qloo_session.head(os.getenv("QLOO_API_URL", "https://hackathon.api.qloo.com"), headers={"x-api-key": qloo_key}, timeout=5)
+            print("🔥 Qloo connection pool warmed")
+        except Exception as e:
+            print(f"⚠️ Qloo warm-up connection failed: {e}")
+
+    if has_openai_key():
+        try:
+            # Persona requests.Session ile, cultural map SDK ile gider; ikisini de ısıt.
+            # SDK client'ı da burada, ilk kullanıcı isteğinden önce kurulur.
+            openai_session.get("https://api.openai.com/v1/models", headers={"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}"}, timeout=5)
+            get_openai_client().models.list()
+            print("🔥 OpenAI connection pools warmed")
+        except Exception as e:
+            print(f"⚠️ OpenAI warm-up connection failed: {e}")
+
+def warm_entity(query: str, entity_type: str) -> bool:
+    entity_id = autocomplete_entity(query, entity_type=entity_type)
+    if not entity_id:
+        return False
+    get_qloo_trending(entity_id, entity_type=entity_type)
+    return True
+
+async def run_warmup():
+    started = time.perf_counter()
+    try:
+        if UPSTREAM_CASSETTE_MODE != "off":
+            warmup_state["skipped"] = f"upstream cassette in {UPSTREAM_CASSETTE_MODE} mode"
+            print(f"📼 Warm-up skipped: {warmup_state['skipped']}")
+            return
+        await asyncio.to_thread(open_upstream_connections)
+
+        pairs = load_warmup_entities(WARMUP_ENTITIES_FILE)
+        warmup_state["entities"] = len(pairs)
+        semaphore = asyncio.Semaphore(WARMUP_CONCURRENCY)
+
+        async def warm(query: str, entity_type: str):
+            async with semaphore:
+                if await asyncio.to_thread(run_in_lane, "prefetch", warm_entity, query, entity_type):
+                    warmup_state["resolved"] += 1
+
+        tasks = [asyncio.create_task(warm(q, t)) for q, t in pairs]
+        try:
+            pending = (await asyncio.wait(tasks, timeout=WARMUP_TIMEOUT_SECONDS))[1] if tasks else set()
+        finally:
+            for task in tasks:
+                task.cancel()
+        if pending:
+            warmup_state["error"] = f"timed out after {WARMUP_TIMEOUT_SECONDS}s"
+            print(f"⚠️ Warm-up {warmup_state['error']}, serving with a partially warm cache")
+    except Exception as e:
+        warmup_state["error"] = str(e)
+        print(f"⚠️ Warm-up failed: {e}")
+    finally:
+        warmup_state["durationSeconds"] = round(time.perf_counter() - started, 3)
+        warmup_state["ready"] = True
+        print(f"🔥 Warm-up done: {warmup_state['resolved']}/{warmup_state['entities']} entities in {warmup_state['durationSeconds']}s")
+
+# 🐢 Event loop gecikmesi: async endpoint'lerde kalan senkron I/O'yu hemen görünür kılar.
+# Debug modunda loop eşik süresinden uzun bloklanırsa o anki stack basılır.
+loop_monitor = LoopLagMonitor(
+    interval=float(os.getenv("LOOP_MONITOR_INTERVAL_SECONDS", "0.1")),
+    block_threshold=float(os.getenv("LOOP_BLOCK_THRESHOLD_SECONDS", "0.1")),
+    debug=os.getenv("LOOP_MONITOR_DEBUG", os.getenv("DEBUG", "false")).lower() in ("1", "true", "yes"),
+)
+metrics.Gauge("event_loop_lag_seconds", "Event-loop lag at the latest monitor tick", callback=lambda: round(loop_monitor.last_lag, 4))
+metrics.Gauge("event_loop_lag_max_seconds", "Worst event-loop lag since the previous scrape", callback=lambda: round(loop_monitor.take_max_lag(), 4))
+metrics.Counter("event_loop_stalls_total", "Monitor ticks delayed by more than the block threshold", callback=lambda: loop_monitor.stalls)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+async def readiness():
+    if not warmup_state["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming", **warmup_state})
+    return {"status": "ready", **warmup_state}
+
+def save_entity_aliases():
+    try:
+        entity_aliases.save(ALIAS_TABLE_FILE)
+        print(f"💾 Saved {len(entity_aliases)} entity aliases to {ALIAS_TABLE_FILE}")
+    except Exception as e:
+        print(f"⚠️ Could not save entity aliases: {e}")
+
+def load_entity_index():
+    try:
+        entity_index.load(ENTITY_SEED_FILE or None)
+        print(f"📦 Entity index: {len(entity_index)} entities")
+    except Exception as e:
+        print(f"⚠️ Could not load entity index: {e}")
+
+async def on_startup():
+    global warmup_task, ratelimit_prune_task
+    loop_monitor.start()
+    print(f"🗜️ Response encoding: {describe_compression()}")
+    # Alias'lar index key'lerini etkiler, önce yüklenmeli
+    await asyncio.to_thread(entity_aliases.load, ALIAS_TABLE_FILE)
+    await asyncio.to_thread(load_entity_index)
+    await asyncio.to_thread(load_precomputed_index)
+    await asyncio.to_thread(prune_result_store)
+    await job_queue.start()
+    warmup_task = asyncio.create_task(run_warmup())
+    if RATE_LIMIT_ENABLED:
+        ratelimit_prune_task = asyncio.create_task(prune_rate_limit_buckets())
+
+async def on_shutdown():
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+        await asyncio.gather(warmup_task, return_exceptions=True)
+    if ratelimit_prune_task:
+        ratelimit_prune_task.cancel()
+        await asyncio.gather(ratelimit_prune_task, return_exceptions=True)
+    await job_queue.stop()
+    await loop_monitor.stop()
+    qloo_fanout.shutdown(wait=False, cancel_futures=True)
+    await asyncio.to_thread(save_entity_aliases)
+    entity_index.close()
@@ -0,0 +1,71 @@
+"""
+Minimal Prometheus-style metrics registry
+
+Counters and gauges with labels, rendered in the text exposition format by
+GET /metrics. A metric can also read its value from a callback at scrape
+time (cache sizes, queue depth, totals another component already keeps)
+instead of being updated on every change.
+"""
+import threading
+from typing import Callable
+
+_registry: list["Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, callback: Callable[[], float | list[tuple[dict, float]]] | None = None):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def samples(self) -> list[tuple[tuple, float]]:
+        if self.callback is not None:
+            value = self.callback()
+            if isinstance(value, list):
+                # Labelled callback: [({"cache": "entity"}, 42), ...]
+                return [(tuple(sorted(labels.items())), v) for labels, v in value]
+            return [((), value)]
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self.samples():
+            lines.append(f"{self.name}{_format_labels(labels)} {value:g}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in _registry) + "\n"
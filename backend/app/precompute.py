@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Offline precomputation of analyses for popular taste combinations
+
+Generates persona + country insights for the top-N (movies, music, brands)
+combinations × languages × randomSeed variants and writes them to a compact,
+gzip-compressed JSON index. main.py loads the index at startup and answers
+/analyze from memory when a request matches an entry.
+
+Usage:
+    python precompute.py popular_combinations.json --top 300 --seeds 0,1,2
+    python precompute.py popular_combinations.json --languages en,tr --out precomputed_index.json.gz
+
+The input file is a JSON list ordered by popularity:
+    [{"movies": "Inception", "music": "Radiohead", "brands": "Apple", "gender": "male"}, ...]
+An optional "countries" list per entry overrides the default country subset.
+"""
+import argparse
+import contextlib
+import gzip
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import MappingProxyType
+from typing import Optional
+
+from canonical import canonical_key, canonicalize_request
+from scheduler import run_in_lane
+
+INDEX_VERSION = 3
+DEFAULT_INDEX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "precomputed_index.json.gz")
+
+
+class PrecomputedIndex:
+    """Read-only in-memory view over a precomputed index file"""
+
+    def __init__(self, entries: Optional[dict] = None, meta: Optional[dict] = None):
+        self._entries = MappingProxyType(entries or {})
+        self.meta = meta or {}
+        self.hits = 0
+
+    @classmethod
+    def load(cls, path: str) -> "PrecomputedIndex":
+        if not path or not os.path.exists(path):
+            return cls()
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION:
+            print(f"⚠️ Ignoring precomputed index {path}: version {data.get('version')} != {INDEX_VERSION}")
+            return cls()
+        return cls(data["entries"], {k: v for k, v in data.items() if k != "entries"})
+
+    def get(self, body: dict, language: str) -> Optional[dict]:
+        """body must already be canonicalized"""
+        entry = self._entries.get(canonical_key(body, language))
+        if entry is not None:
+            self.hits += 1
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("combinations", help="JSON list of popular combinations, most popular first")
+    parser.add_argument("--top", type=int, default=300)
+    parser.add_argument("--languages", default="", help="comma-separated codes (default: all supported)")
+    parser.add_argument("--seeds", default="0,1,2", help="comma-separated randomSeed variants")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--out", default=DEFAULT_INDEX_FILE)
+    args = parser.parse_args()
+
+    import main
+
+    # Without a key every pipeline returns the canned fallback, which must never ship in the index
+    if not main.has_openai_key():
+        print("❌ OPENAI_API_KEY is not set, refusing to precompute fallback analyses", file=sys.stderr)
+        return 2
+
+    # Index keys depend on the alias table, so start from (and update) the server's copy
+    main.entity_aliases.load(main.ALIAS_TABLE_FILE)
+
+    with open(args.combinations, encoding="utf-8") as f:
+        combinations = json.load(f)[:args.top]
+    languages = [l for l in args.languages.split(",") if l] or list(main.LANGUAGE_MAPPING)
+    seeds = [int(s) for s in args.seeds.split(",") if s]
+
+    jobs = []
+    for combo in combinations:
+        for language in languages:
+            for seed in seeds:
+                body = {"movies": combo["movies"], "music": combo["music"], "brands": combo["brands"],
+                        "gender": combo.get("gender", ""), "language": language, "randomSeed": seed,
+                        "countries": main.resolve_countries(combo.get("countries"))}
+                jobs.append((canonicalize_request(body, main.entity_aliases), language))
+
+    print(f"🚀 Precomputing {len(jobs)} analyses ({len(combinations)} combinations × {len(languages)} languages × {len(seeds)} seeds)", file=sys.stderr)
+    results = []
+    failed = 0
+    started = time.perf_counter()
+    # Pipeline debug output would drown the progress report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            futures = {pool.submit(run_in_lane, "batch", main.run_analysis, body, language): (body, language) for body, language in jobs}
+            for done, future in enumerate(as_completed(futures), 1):
+                body, language = futures[future]
+                try:
+                    analysis = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"❌ {body['movies']} / {body['music']} / {body['brands']} [{language}]: {e}", file=sys.stderr)
+                else:
+                    if analysis.get("fallback"):
+                        # GPT/Qloo failed inside the pipeline; the canned result is not a real analysis
+                        failed += 1
+                        print(f"❌ {body['movies']} / {body['music']} / {body['brands']} [{language}]: fallback result skipped", file=sys.stderr)
+                    else:
+                        results.append((body, language, analysis))
+                if done % 50 == 0:
+                    print(f"   {done}/{len(jobs)} done", file=sys.stderr)
+
+    # Aliases learned while resolving entities may have changed the canonical form
+    entries = {}
+    for body, language, analysis in results:
+        entries[canonical_key(canonicalize_request(body, main.entity_aliases), language)] = analysis
+    main.save_entity_aliases()
+
+    index = {
+        "version": INDEX_VERSION,
+        "generatedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "languages": languages,
+        "seeds": seeds,
+        "entries": entries,
+    }
+    with gzip.open(args.out, "wt", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+
+    print(f"✅ Wrote {len(entries)} entries ({failed} failed) to {args.out} "
+          f"[{os.path.getsize(args.out) / 1024:.0f} KiB] in {time.perf_counter() - started:.0f}s", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,110 @@
+"""
+Opt-in sampling profiler for a single /analyze request
+
+A ProfileSession is created only for requests carrying the admin profiling
+flag, so normal traffic never starts a sampler. While the analysis runs in
+its worker thread, a daemon thread reads that thread's stack every
+`interval` seconds through sys._current_frames() and counts identical
+stacks. The result is written to `directory` as:
+
+    <id>.folded   "frame;frame;frame count" lines (flamegraph.pl, speedscope, inferno)
+    <id>.json     wall/CPU time per pipeline stage, sample count, outcome
+
+Samples are wall-clock: time spent waiting on Qloo/OpenAI (including the
+concurrent trending fan-out, which the worker waits on in fetch_trending)
+shows up under the frame that is blocked. Stage CPU time comes from
+time.thread_time() of the worker thread.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Callable
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def fold_stack(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class ProfileSession:
+    def __init__(self, directory: str, interval: float = 0.005, label: str = ""):
+        self.id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.directory = directory
+        self.interval = interval
+        self.label = label
+        self.samples: Counter[str] = Counter()
+        self.stages: list[dict] = []
+        self._stop = threading.Event()
+        self._target: int | None = None
+        self._started_wall = 0.0
+        self._started_cpu = 0.0
+        self._mark_wall = 0.0
+        self._mark_cpu = 0.0
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is not None:
+                self.samples[fold_stack(frame)] += 1
+
+    def mark_stage(self, name: str, _partial: dict | None = None):
+        """on_stage callback: closes the stage that just finished"""
+        wall, cpu = time.perf_counter(), time.thread_time()
+        self.stages.append({
+            "name": name,
+            "wallSeconds": round(wall - self._mark_wall, 4),
+            "cpuSeconds": round(cpu - self._mark_cpu, 4),
+        })
+        self._mark_wall, self._mark_cpu = wall, cpu
+
+    def run(self, fn: Callable, *args, **kwargs):
+        """Call fn(*args, on_stage=..., **kwargs) in this thread under the sampler"""
+        self._target = threading.get_ident()
+        self._started_wall = self._mark_wall = time.perf_counter()
+        self._started_cpu = self._mark_cpu = time.thread_time()
+        sampler = threading.Thread(target=self._sample, name=f"profiler-{self.id}", daemon=True)
+        sampler.start()
+        outcome = "ok"
+        try:
+            return fn(*args, on_stage=self.mark_stage, **kwargs)
+        except BaseException as e:
+            outcome = f"error: {e}"
+            raise
+        finally:
+            self._stop.set()
+            sampler.join()
+            self.write(outcome, wall=time.perf_counter() - self._started_wall, cpu=time.thread_time() - self._started_cpu)
+
+    def write(self, outcome: str, wall: float = 0.0, cpu: float = 0.0) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, self.id)
+        with open(base + ".folded", "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        summary = {
+            "id": self.id,
+            "label": self.label,
+            "outcome": outcome,
+            "wallSeconds": round(wall, 4),
+            "cpuSeconds": round(cpu, 4),
+            "intervalSeconds": self.interval,
+            "samples": sum(self.samples.values()),
+            "stages": self.stages,
+        }
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"🔬 Profile {self.id} written to {base}.folded ({summary['samples']} samples, {wall:.2f}s)")
+        return base
@@ -0,0 +1,148 @@
+"""
+Per-client token-bucket rate limiting
+
+Each client key (X-Client-Key header, else the remote IP) gets a bucket that
+refills at `rate` tokens per second up to `burst`. Buckets live in memory by
+default; SQLiteBucketStore keeps them in a shared database file so several
+uvicorn workers enforce one limit together.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    # Seconds until the bucket is full again / until `cost` tokens are available
+    reset_after: float
+    retry_after: float
+
+    def headers(self) -> dict:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+def refill(tokens: float, updated: float, now: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+
+class MemoryBucketStore:
+    """Single-process store; least recently seen clients are dropped past maxsize"""
+
+    blocking = False
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float, rate: float, burst: float) -> tuple[bool, float]:
+        """Returns (allowed, tokens left)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = refill(tokens, updated, now, rate, burst)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed, tokens
+
+    def prune(self, max_idle_seconds: float = 3600) -> int:
+        """Drop buckets that have been idle long enough to be full again"""
+        cutoff = time.monotonic() - max_idle_seconds
+        with self._lock:
+            idle = [key for key, (_, updated) in self._buckets.items() if updated < cutoff]
+            for key in idle:
+                del self._buckets[key]
+        return len(idle)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SQLiteBucketStore:
+    """Buckets shared between worker processes through one SQLite file"""
+
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, cost: float, rate: float, burst: float) -> tuple[bool, float]:
+        # Wall clock, since the monotonic clock is not shared between processes
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = refill(*row, now, rate, burst) if row else burst
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, tokens
+
+    def prune(self, max_idle_seconds: float = 3600) -> int:
+        """Drop buckets that have been idle long enough to be full again"""
+        cursor = self._connect().execute("DELETE FROM buckets WHERE updated < ?", (time.time() - max_idle_seconds,))
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+
+
+class TokenBucketLimiter:
+    def __init__(self, per_minute: float, burst: int, store=None):
+        self.rate = per_minute / 60
+        self.burst = burst
+        # Stores define __len__, so an empty one is falsy
+        self.store = store if store is not None else MemoryBucketStore()
+
+    def hit(self, key: str, cost: int = 1) -> RateLimitResult:
+        allowed, tokens = self.store.take(key, cost, self.rate, self.burst)
+        return RateLimitResult(
+            allowed=allowed,
+            limit=self.burst,
+            remaining=int(tokens),
+            reset_after=(self.burst - tokens) / self.rate,
+            retry_after=0 if allowed else (cost - tokens) / self.rate,
+        )
+
+
+def build_store(kind: str, sqlite_path: str):
+    if kind == "sqlite":
+        os.makedirs(os.path.dirname(os.path.abspath(sqlite_path)), exist_ok=True)
+        return SQLiteBucketStore(sqlite_path)
+    return MemoryBucketStore()
@@ -0,0 +1,74 @@
+"""
+Persisted, shareable analysis results
+
+Every finished analysis is stored once under an ID derived from its content
+(sha256 of the canonical JSON, base32, 26 chars), so the same result always
+gets the same ID and a shared link never changes meaning. Bodies are kept
+zlib-compressed in one SQLite table; GET /results/{id} serves them straight
+from here without touching Qloo or OpenAI, which lets the response be cached
+as immutable. Storing or reading a result refreshes its timestamp (reads at
+most once per `touch_after` seconds), so retention pruning only drops
+results nobody has used for the whole retention period.
+"""
+import base64
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+ID_LENGTH = 26
+
+
+def result_id(content: bytes) -> str:
+    return base64.b32encode(hashlib.sha256(content).digest()).decode("ascii")[:ID_LENGTH].lower()
+
+
+def encode_result(payload: dict) -> bytes:
+    return json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class ResultStore:
+    def __init__(self, path: str, touch_after: float = 86400):
+        self.path = path
+        self.touch_after = touch_after
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS results (id TEXT PRIMARY KEY, body BLOB NOT NULL, created REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def put(self, payload: dict) -> str:
+        """Store payload (or refresh its timestamp) and return its content ID"""
+        content = encode_result(payload)
+        rid = result_id(content)
+        self._connect().execute(
+            "INSERT INTO results (id, body, created) VALUES (?, ?, ?) ON CONFLICT(id) DO UPDATE SET created = excluded.created",
+            (rid, zlib.compress(content, 6), time.time()),
+        )
+        return rid
+
+    def get(self, rid: str) -> bytes | None:
+        """Stored JSON bytes, or None"""
+        conn = self._connect()
+        row = conn.execute("SELECT body, created FROM results WHERE id = ?", (rid,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] < now - self.touch_after:
+            conn.execute("UPDATE results SET created = ? WHERE id = ?", (now, rid))
+        return zlib.decompress(row[0])
+
+    def prune(self, max_age_seconds: float) -> int:
+        cursor = self._connect().execute("DELETE FROM results WHERE created < ?", (time.time() - max_age_seconds,))
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
@@ -0,0 +1,107 @@
+"""
+Per-stage / per-language GPT model routing with latency budgets
+
+Each stage ("persona", "cultural_map") has a primary model, a faster
+fallback and a latency budget; a language can override any of the three.
+The router keeps an EWMA of each model's observed latency per stage. While
+the primary's EWMA is over budget, requests go to the fallback, and every
+`probe_interval` seconds one request is sent to the primary again so the
+router notices when it has recovered.
+
+Routes come from environment variables, optionally overridden by a JSON file:
+    {"persona": {"model": "gpt-4", "fallback": "gpt-4o-mini", "budgetSeconds": 20,
+                 "languages": {"hi": {"budgetSeconds": 30}}}}
+"""
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Callable, Optional
+
+
+@dataclass(frozen=True)
+class Route:
+    model: str
+    fallback: str
+    budget_seconds: float
+
+
+@dataclass(frozen=True)
+class Decision:
+    model: str
+    # "primary", "over_budget" (fallback chosen) or "probe" (primary re-checked)
+    reason: str
+
+
+class ModelRouter:
+    def __init__(self, routes: dict[str, Route], language_routes: Optional[dict[tuple[str, str], Route]] = None,
+                 alpha: float = 0.3, probe_interval: float = 60,
+                 on_decision: Optional[Callable[[str, str, Decision], None]] = None):
+        self.routes = routes
+        self.language_routes = language_routes or {}
+        self.alpha = alpha
+        self.probe_interval = probe_interval
+        self.on_decision = on_decision
+        self._latency: dict[tuple[str, str], float] = {}
+        self._last_probe: dict[tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def route(self, stage: str, language: str) -> Route:
+        return self.language_routes.get((stage, language)) or self.routes[stage]
+
+    def choose(self, stage: str, language: str) -> Decision:
+        route = self.route(stage, language)
+        with self._lock:
+            key = (stage, route.model)
+            latency = self._latency.get(key)
+            if latency is None or latency <= route.budget_seconds or route.fallback == route.model:
+                self._last_probe.pop(key, None)
+                decision = Decision(route.model, "primary")
+            else:
+                now = time.monotonic()
+                # The probe clock starts when the primary first goes over budget
+                if now - self._last_probe.setdefault(key, now) >= self.probe_interval:
+                    self._last_probe[key] = now
+                    decision = Decision(route.model, "probe")
+                else:
+                    decision = Decision(route.fallback, "over_budget")
+        if self.on_decision:
+            self.on_decision(stage, language, decision)
+        return decision
+
+    def observe(self, stage: str, model: str, seconds: float):
+        with self._lock:
+            previous = self._latency.get((stage, model))
+            self._latency[(stage, model)] = seconds if previous is None else (1 - self.alpha) * previous + self.alpha * seconds
+
+    def latencies(self) -> dict[tuple[str, str], float]:
+        with self._lock:
+            return dict(self._latency)
+
+
+def load_routes(defaults: dict[str, Route], path: str = "") -> tuple[dict[str, Route], dict[tuple[str, str], Route]]:
+    """Apply the optional JSON routing file on top of the env-var defaults"""
+    routes = dict(defaults)
+    language_routes = {}
+    if not path or not os.path.exists(path):
+        return routes, language_routes
+
+    def apply(route: Route, spec: dict) -> Route:
+        return replace(
+            route,
+            model=spec.get("model", route.model),
+            fallback=spec.get("fallback", route.fallback),
+            budget_seconds=float(spec.get("budgetSeconds", route.budget_seconds)),
+        )
+
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    for stage, spec in config.items():
+        if stage not in routes:
+            print(f"⚠️ Ignoring routes for unknown stage: {stage}")
+            continue
+        routes[stage] = apply(routes[stage], spec)
+        for language, language_spec in spec.get("languages", {}).items():
+            language_routes[(stage, language)] = apply(routes[stage], language_spec)
+    return routes, language_routes
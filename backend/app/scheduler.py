@@ -0,0 +1,146 @@
+"""
+Upstream-aware scheduler for OpenAI / Qloo calls
+
+Stage functions run in worker threads and wrap each upstream call in
+`scheduler.slot(upstream)`. Every upstream has a global concurrency cap;
+when it is full, callers queue in one of three priority lanes:
+
+    interactive (user waiting on /analyze) > batch (/analyze/batch, precompute) > prefetch (warm-up)
+
+The lane comes from a context variable, so endpoints set it once with
+`lane(...)` and asyncio.to_thread carries it into the stage functions.
+Free slots are handed out by stride scheduling over the lanes that have
+waiters: each grant advances the lane's pass by 1/weight and the lane with
+the lowest pass goes next. Interactive work gets most slots, while batch and
+prefetch still make progress under sustained load instead of starving.
+"""
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+LANES = ("interactive", "batch", "prefetch")
+DEFAULT_WEIGHTS = {"interactive": 8, "batch": 3, "prefetch": 1}
+
+current_lane: contextvars.ContextVar[str] = contextvars.ContextVar("scheduler_lane", default="interactive")
+
+
+class SchedulerTimeout(Exception):
+    """No upstream slot became free within the wait timeout"""
+
+
+@contextmanager
+def lane(name: str) -> Iterator[None]:
+    if name not in LANES:
+        raise ValueError(f"Unknown lane: {name}")
+    token = current_lane.set(name)
+    try:
+        yield
+    finally:
+        current_lane.reset(token)
+
+
+def run_in_lane(name: str, fn: Callable, *args, **kwargs):
+    """For thread pools, which do not copy the caller's context"""
+    with lane(name):
+        return fn(*args, **kwargs)
+
+
+class _Waiter:
+    """One queued acquire; compared by identity so a timeout removes only itself"""
+    __slots__ = ("granted",)
+
+    def __init__(self):
+        self.granted = False
+
+
+class _Upstream:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.queues: dict[str, deque] = {name: deque() for name in LANES}
+        self.passes = {name: 0.0 for name in LANES}
+        self.vtime = 0.0
+        self.granted = {name: 0 for name in LANES}
+        self.wait_seconds = {name: 0.0 for name in LANES}
+        self.timeouts = 0
+        self.cond = threading.Condition()
+
+
+class UpstreamScheduler:
+    def __init__(self, limits: dict[str, int], weights: dict[str, int] | None = None, wait_timeout: float = 30):
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.wait_timeout = wait_timeout
+        self._upstreams = {name: _Upstream(max(1, limit)) for name, limit in limits.items()}
+
+    def _account(self, state: _Upstream, lane_name: str):
+        state.active += 1
+        state.granted[lane_name] += 1
+        state.vtime = max(state.vtime, state.passes[lane_name])
+        state.passes[lane_name] += 1 / self.weights[lane_name]
+
+    def _dispatch(self, state: _Upstream):
+        while state.active < state.limit:
+            waiting = [name for name in LANES if state.queues[name]]
+            if not waiting:
+                return
+            # LANES order breaks ties in favour of the higher-priority lane
+            lane_name = min(waiting, key=lambda name: state.passes[name])
+            waiter = state.queues[lane_name].popleft()
+            waiter.granted = True
+            self._account(state, lane_name)
+
+    def acquire(self, upstream: str, lane_name: str | None = None, timeout: float | None = None):
+        state = self._upstreams[upstream]
+        lane_name = lane_name or current_lane.get()
+        timeout = self.wait_timeout if timeout is None else timeout
+        with state.cond:
+            # An idle lane does not bank credit while it had nothing queued
+            if not state.queues[lane_name]:
+                state.passes[lane_name] = max(state.passes[lane_name], state.vtime)
+            if state.active < state.limit and not any(state.queues.values()):
+                self._account(state, lane_name)
+                return
+            waiter = _Waiter()
+            state.queues[lane_name].append(waiter)
+            started = time.monotonic()
+            deadline = started + timeout
+            while not waiter.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    state.queues[lane_name].remove(waiter)
+                    state.timeouts += 1
+                    raise SchedulerTimeout(f"No {upstream} slot free after {timeout:g}s ({lane_name} lane)")
+                state.cond.wait(remaining)
+            state.wait_seconds[lane_name] += time.monotonic() - started
+
+    def release(self, upstream: str):
+        state = self._upstreams[upstream]
+        with state.cond:
+            state.active -= 1
+            self._dispatch(state)
+            state.cond.notify_all()
+
+    @contextmanager
+    def slot(self, upstream: str, lane_name: str | None = None) -> Iterator[None]:
+        self.acquire(upstream, lane_name)
+        try:
+            yield
+        finally:
+            self.release(upstream)
+
+    def stats(self) -> dict:
+        result = {}
+        for name, state in self._upstreams.items():
+            with state.cond:
+                result[name] = {
+                    "limit": state.limit,
+                    "active": state.active,
+                    "queued": {lane_name: len(queue) for lane_name, queue in state.queues.items()},
+                    "granted": dict(state.granted),
+                    "waitSeconds": {lane_name: round(s, 3) for lane_name, s in state.wait_seconds.items()},
+                    "timeouts": state.timeouts,
+                }
+        return result
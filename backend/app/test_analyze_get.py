@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Cacheable GET /analyze: query validation, ETags, 304s and Vary
+"""
+import main
+
+PARAMS = {"movies": "Inception", "music": "Radiohead", "brands": "Apple", "gender": "male", "language": "en"}
+
+
+def test_unknown_and_invalid_parameters_are_rejected(client, upstream):
+    assert client.get("/analyze", params={**PARAMS, "seed": "1"}).status_code == 422
+    assert client.get("/analyze", params={**PARAMS, "language": "xx"}).status_code == 422
+    assert client.get("/analyze", params={**PARAMS, "randomSeed": "abc"}).status_code == 400
+    assert client.get("/analyze", params={"movies": "Inception"}).status_code == 400
+    assert upstream.calls["persona"] == 0
+
+
+def test_etag_follows_output_and_revalidates(client, upstream):
+    first = client.get("/analyze", params=PARAMS)
+    assert first.status_code == 200
+    assert first.headers["cache-control"].startswith("public")
+    assert "accept-language" not in first.headers.get("vary", "").lower()
+
+    again = client.get("/analyze", params=PARAMS, headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+    assert again.headers["etag"] == first.headers["etag"]
+
+    upstream.persona["personaName"] = "The Wanderer"
+    other_seed = client.get("/analyze", params={**PARAMS, "randomSeed": "7"})
+    assert other_seed.headers["etag"] != first.headers["etag"]
+
+
+def test_language_from_header_varies(client, upstream):
+    params = {k: v for k, v in PARAMS.items() if k != "language"}
+    response = client.get("/analyze", params=params, headers={"Accept-Language": "tr-TR,tr;q=0.9"})
+    assert response.status_code == 200
+    assert "accept-language" in response.headers["vary"].lower()
+
+
+def test_profile_parameter_needs_token(client, upstream, monkeypatch):
+    assert client.get("/analyze", params={**PARAMS, "profile": "1"}).status_code == 403
+
+    monkeypatch.setattr(main, "PROFILE_TOKEN", "secret")
+    response = client.get("/v2/analyze", params={**PARAMS, "profile": "1"}, headers={"X-Profile-Token": "secret"})
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "no-store"
+    assert response.headers["x-profile-id"]
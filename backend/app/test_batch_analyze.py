@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+/analyze/batch streams one NDJSON line per profile and shares cultural maps
+between profiles with the same language, archetype and countries
+"""
+import asyncio
+import json
+import time
+
+import pytest
+from starlette.requests import Request
+
+import main
+from cache import MISSING
+
+PROFILES = [
+    {"id": "a", "movies": "Inception", "music": "Radiohead", "brands": "Apple", "gender": "male", "language": "en", "randomSeed": 1},
+    {"id": "b", "movies": "Inception", "music": "Radiohead", "brands": "Apple", "gender": "female", "language": "en", "randomSeed": 2},
+    {"id": "c", "movies": "The Matrix", "music": "Queen", "brands": "Nike", "gender": "female", "language": "tr", "randomSeed": 3},
+]
+
+
+def run_batch(client, profiles) -> dict:
+    response = client.post("/analyze/batch", json={"profiles": profiles})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return {item["id"]: item for item in map(json.loads, response.text.splitlines())}
+
+
+def test_streams_every_profile_and_groups_cultural_maps(client, upstream, monkeypatch):
+    monkeypatch.setattr(main, "autocomplete_entity", lambda *a, **k: pytest.fail("batch must not call Qloo"))
+    results = run_batch(client, PROFILES + [{"id": "bad", "movies": "Inception"}])
+
+    assert set(results) == {"a", "b", "c", "bad"}
+    assert "error" in results["bad"]
+    for profile_id in ("a", "b", "c"):
+        assert results[profile_id]["persona"]["personaName"] == "The Dreamer"
+        assert results[profile_id]["resultId"]
+    # a and b share one map (en, same archetype, default countries); c is Turkish
+    assert upstream.calls["culturalMap"] == 2
+    assert upstream.calls["persona"] == 3
+
+
+def test_shared_map_is_cached_only_for_the_profile_it_was_written_for(client, upstream):
+    results = run_batch(client, PROFILES[:2])
+    cached = {pid: main.country_cache.get((results[pid]["personaFingerprint"], "en", "USA")) for pid in ("a", "b")}
+    assert [value is MISSING for value in cached.values()].count(True) == 1
+
+    # The other profile's country request is generated for its own persona
+    other = next(pid for pid, value in cached.items() if value is MISSING)
+    calls = upstream.calls["culturalMap"]
+    response = client.get("/countries/USA", params={"fingerprint": results[other]["personaFingerprint"], "language": "en"})
+    assert response.status_code == 200
+    assert upstream.calls["culturalMap"] == calls + 1
+
+
+def test_invalid_bodies(client, upstream):
+    assert client.post("/analyze/batch", json=[PROFILES[0]]).status_code == 422
+    assert client.post("/analyze/batch", json={"profiles": "x"}).status_code == 422
+    assert client.post("/analyze/batch", json={"profiles": []}).status_code == 400
+
+
+def test_disconnect_cancels_pending_profiles(upstream, monkeypatch):
+    monkeypatch.setattr(main, "BATCH_CONCURRENCY", 1)
+    generate = upstream.generate_persona_from_taste
+
+    def slow_persona(**kwargs):
+        time.sleep(0.05)
+        return generate(**kwargs)
+
+    monkeypatch.setattr(main, "generate_persona_from_taste", slow_persona)
+    profiles = [{**PROFILES[0], "id": str(i), "randomSeed": i} for i in range(20)]
+    request = Request({"type": "http", "method": "POST", "path": "/analyze/batch", "headers": [], "query_string": b""})
+
+    async def disconnect_midway():
+        response = await main.analyze_batch(main.BatchAnalyzeRequest(profiles=profiles), request)
+
+        async def consume():
+            async for _ in response.body_iterator:
+                pass
+
+        # Starlette cancels the streaming task when the client goes away
+        consumer = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.12)
+        consumer.cancel()
+        await asyncio.gather(consumer, return_exceptions=True)
+        calls = upstream.calls["persona"]
+        await asyncio.sleep(0.3)
+        return calls
+
+    calls = asyncio.run(disconnect_midway())
+    # At most the call already running in its worker thread finishes afterwards
+    assert upstream.calls["persona"] <= calls + 1
+    assert upstream.calls["persona"] < len(profiles)
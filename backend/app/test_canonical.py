@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Unit tests for input canonicalization and the per-type alias table
+"""
+from canonical import AliasTable, canonical_key, canonical_list, canonicalize_request, session_key, split_terms
+
+
+def test_split_and_clean_terms():
+    assert split_terms("  Radiohead ,Muse;; ") == ["Radiohead", "Muse"]
+    assert split_terms("Ｒａｄｉｏｈｅａｄ") == ["Radiohead"]
+    assert split_terms("") == []
+
+
+def test_canonical_list_sorts_and_dedupes():
+    aliases = AliasTable()
+    assert canonical_list("Muse, radiohead, MUSE", aliases, "artist") == "Muse, radiohead"
+
+
+def test_first_spelling_is_kept_for_unknown_terms():
+    aliases = AliasTable()
+    assert canonical_list("radiohead", aliases, "artist") == "radiohead"
+    assert canonical_list("RADIOHEAD", aliases, "artist") == "radiohead"
+
+
+def test_unrecorded_lookup_keeps_no_spelling():
+    aliases = AliasTable()
+    assert canonical_list("radioh", aliases, "artist", record=False) == "radioh"
+    assert canonical_list("RADIOH", aliases, "artist") == "RADIOH"
+    assert canonical_list("radioh", aliases, "artist", record=False) == "RADIOH"
+    assert aliases._display == {("artist", "radioh"): "RADIOH"}
+
+
+def test_learned_alias_replaces_term():
+    aliases = AliasTable()
+    aliases.learn("acdc", "artist", "E1", "AC/DC")
+    assert canonical_list("ACDC", aliases, "artist") == "AC/DC"
+    assert canonical_list("ac/dc", aliases, "artist") == "AC/DC"
+
+
+def test_aliases_are_scoped_to_entity_type():
+    aliases = AliasTable()
+    aliases.learn("queen", "movie", "M1", "The Queen")
+    body = canonicalize_request({"movies": "Queen", "music": "Queen", "brands": "", "gender": "Male"}, aliases)
+    assert body["movies"] == "The Queen"
+    assert body["music"] == "Queen"
+    assert body["gender"] == "male"
+
+
+def test_multi_term_queries_are_not_learned():
+    aliases = AliasTable()
+    aliases.learn("queen, muse", "artist", "E1", "Queen")
+    assert len(aliases) == 0
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "aliases.json")
+    aliases = AliasTable()
+    aliases.learn("queen", "movie", "M1", "The Queen")
+    aliases.save(path)
+
+    loaded = AliasTable()
+    loaded.load(path)
+    assert canonical_list("queen", loaded, "movie") == "The Queen"
+    assert canonical_list("queen", loaded, "artist") == "queen"
+
+
+def test_keys_ignore_case_and_session_key_ignores_seed():
+    body = {"movies": "Inception", "music": "Muse", "brands": "Apple", "gender": "male", "randomSeed": 1, "countries": ["USA"]}
+    upper = {**body, "movies": "INCEPTION"}
+    assert canonical_key(body, "en") == canonical_key(upper, "en")
+    assert canonical_key(body, "en") != canonical_key({**body, "randomSeed": 2}, "en")
+    assert session_key(body, "en") == session_key({**body, "randomSeed": 2}, "en")
+    assert session_key(body, "en") != session_key(body, "tr")
+
+
+def test_first_repeat_hits_cache_after_alias_is_learned(client, upstream, monkeypatch):
+    import main
+
+    resolve = upstream.resolve_entities
+
+    def learning_resolve(body):
+        # What autocomplete_entity does when Qloo resolves the typed name
+        main.entity_aliases.learn(body["movies"], "movie", "M1", "The Matrix")
+        return resolve(body)
+
+    monkeypatch.setattr(main, "resolve_entities", learning_resolve)
+    profile = {"movies": "matrix", "music": "Muse", "brands": "Apple", "gender": "male", "language": "en"}
+    first = client.post("/v2/analyze", json=profile).json()
+    second = client.post("/v2/analyze", json=profile).json()
+    assert upstream.calls["persona"] == 1
+    assert second["resultId"] == first["resultId"]
+
+    # A regenerate of the learned form reuses the seed-independent session context
+    client.post("/v2/analyze", json={**profile, "movies": "The Matrix", "randomSeed": 5})
+    assert upstream.calls["entities"] == 1
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Upstream cassettes: traffic recorded against a local server replays offline
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+import requests
+
+from cassette import Cassette, CassetteMiss, request_key
+
+
+class Upstream(BaseHTTPRequestHandler):
+    hits = 0
+
+    def respond(self, body: bytes):
+        Upstream.hits += 1
+        payload = json.dumps({"path": self.path, "body": body.decode("utf-8"), "hit": Upstream.hits}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self.respond(b"")
+
+    def do_POST(self):
+        self.respond(self.rfile.read(int(self.headers["Content-Length"])))
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Upstream)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    Upstream.hits = 0
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def session_for(cassette: Cassette) -> requests.Session:
+    session = requests.Session()
+    session.mount("http://", cassette.adapter())
+    return session
+
+
+def test_request_key_ignores_date_window_and_param_order():
+    base = "https://qloo.example/v2/insights?filter.type=urn:entity:movie&signal.interests.entities=A1"
+    assert request_key("get", base + "&filter.start_date=2026-01-01&filter.end_date=2026-02-01", None) == \
+        request_key("GET", "https://qloo.example/v2/insights?signal.interests.entities=A1&filter.type=urn:entity:movie", b"")
+    assert request_key("POST", base, b'{"a": 1}') != request_key("POST", base, b'{"a": 2}')
+
+
+def test_requests_record_then_replay(server, tmp_path):
+    path = str(tmp_path / "qloo.jsonl")
+    recorder = session_for(Cassette(path, "record"))
+    first = recorder.get(f"{server}/search?query=Inception&filter.start_date=2026-10-18").json()
+    second = recorder.get(f"{server}/search?query=Inception&filter.start_date=2026-10-19").json()
+    posted = recorder.post(f"{server}/v1/chat", data=b'{"q": 1}').json()
+    assert Upstream.hits == 3
+
+    player = Cassette(path, "replay", speed=0)
+    assert len(player) == 3
+    replay = session_for(player)
+    # Same key recorded twice: played back in order, then the last one repeats
+    assert replay.get(f"{server}/search?query=Inception&filter.start_date=2026-10-20").json() == first
+    assert replay.get(f"{server}/search?query=Inception").json() == second
+    assert replay.get(f"{server}/search?query=Inception").json() == second
+    assert replay.post(f"{server}/v1/chat", data=b'{"q": 1}').json() == posted
+    assert Upstream.hits == 3
+
+    with pytest.raises(requests.ConnectionError):
+        replay.post(f"{server}/v1/chat", data=b'{"q": 2}')
+
+
+def test_httpx_record_then_replay(server, tmp_path):
+    path = str(tmp_path / "openai.jsonl")
+    with httpx.Client(transport=Cassette(path, "record").httpx_transport()) as recorder:
+        recorded = recorder.post(f"{server}/v1/chat/completions", content=b'{"model": "x"}').json()
+
+    with httpx.Client(transport=Cassette(path, "replay", speed=0).httpx_transport()) as replay:
+        assert replay.post(f"{server}/v1/chat/completions", content=b'{"model": "x"}').json() == recorded
+        with pytest.raises(httpx.ConnectError):
+            replay.get(f"{server}/v1/models")
+    assert Upstream.hits == 1
+
+
+def test_missing_cassette_misses_everything(tmp_path):
+    player = Cassette(str(tmp_path / "none.jsonl"), "replay")
+    assert len(player) == 0
+    with pytest.raises(CassetteMiss):
+        player.play("GET", "http://127.0.0.1/", None)
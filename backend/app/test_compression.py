@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the encoding middleware: variants, ETag suffixes, Vary and 304s
+"""
+import json
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from compression import CompressionMiddleware, choose_encoding, strip_etag_variant
+
+ETAG = '"abc"'
+
+
+def build_client() -> TestClient:
+    app = FastAPI()
+
+    @app.get("/item")
+    def item(request: Request, size: int = 2000):
+        if strip_etag_variant(request.headers.get("if-none-match", "")) == ETAG:
+            return Response(status_code=304, headers={"ETag": request.headers["if-none-match"]})
+        body = json.dumps({"text": "x" * size}).encode("utf-8")
+        return Response(body, media_type="application/json", headers={"ETag": ETAG})
+
+    @app.get("/lines")
+    def lines():
+        return StreamingResponse((json.dumps({"i": i}) + "\n" for i in range(3)), media_type="application/x-ndjson")
+
+    return TestClient(CompressionMiddleware(app, minimum_size=1024))
+
+
+def vary(response) -> set[str]:
+    return {v.strip().lower() for v in response.headers.get("vary", "").split(",") if v.strip()}
+
+
+def test_strip_etag_variant():
+    assert strip_etag_variant('"abc-msgpack-gzip"') == '"abc"'
+    assert strip_etag_variant('W/"abc-br"') == '"abc"'
+    assert strip_etag_variant('"abc"') == '"abc"'
+
+
+def test_choose_encoding_respects_quality():
+    assert choose_encoding("gzip") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("") is None
+
+
+def test_gzip_variant_has_own_etag_and_vary():
+    response = build_client().get("/item", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == '"abc-gzip"'
+    assert "accept-encoding" in vary(response)
+    assert response.json()["text"] == "x" * 2000
+
+
+def test_brotli_variant():
+    pytest.importorskip("brotli")
+    response = build_client().get("/item", headers={"Accept-Encoding": "br, gzip"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.headers["etag"] == '"abc-br"'
+
+
+def test_small_and_unnegotiated_bodies_still_vary():
+    client = build_client()
+    small = client.get("/item", params={"size": 10}, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    assert small.headers["etag"] == ETAG
+    assert "accept-encoding" in vary(small)
+
+    plain = client.get("/item", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert "accept-encoding" in vary(plain)
+
+
+def test_msgpack_variant_etags():
+    msgpack = pytest.importorskip("msgpack")
+    client = build_client()
+    packed = client.get("/item", headers={"Accept": "application/msgpack", "Accept-Encoding": "identity"})
+    assert packed.headers["content-type"] == "application/msgpack"
+    assert packed.headers["etag"] == '"abc-msgpack"'
+    assert {"accept", "accept-encoding"} <= vary(packed)
+    assert msgpack.unpackb(packed.content)["text"] == "x" * 2000
+
+    both = client.get("/item", headers={"Accept": "application/msgpack", "Accept-Encoding": "gzip"})
+    assert both.headers["etag"] == '"abc-msgpack-gzip"'
+
+
+def test_304_for_a_variant_keeps_etag_and_vary():
+    response = build_client().get("/item", headers={"Accept-Encoding": "gzip", "If-None-Match": '"abc-gzip"'})
+    assert response.status_code == 304
+    assert response.headers["etag"] == '"abc-gzip"'
+    assert "accept-encoding" in vary(response)
+    assert "content-encoding" not in response.headers
+    assert response.content == b""
+
+
+def test_streaming_response_is_compressed_per_chunk():
+    response = build_client().get("/lines", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert [json.loads(line)["i"] for line in response.text.splitlines()] == [0, 1, 2]
+
+
+def test_analyze_get_revalidates_gzip_variant(client, upstream):
+    params = {"movies": "Inception", "music": "Radiohead", "brands": "Apple", "gender": "male", "language": "en"}
+    first = client.get("/v2/analyze", params=params, headers={"Accept-Encoding": "gzip"})
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    again = client.get("/v2/analyze", params=params, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert "accept-encoding" in vary(again)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+/analyze returns a small country subset and /countries/{country} generates
+the rest on demand for the same persona
+"""
+PROFILE = {"movies": "Inception", "music": "Radiohead", "brands": "Apple", "gender": "male",
+           "language": "en", "randomSeed": 123, "countries": ["USA", "Japan"]}
+
+
+def analyze(client) -> dict:
+    response = client.post("/v2/analyze", json=PROFILE)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_analysis_returns_requested_subset(client, upstream):
+    result = analyze(client)
+    assert set(result["countryInsights"]) == {"USA", "Japan"}
+    assert result["personaFingerprint"]
+
+
+def test_country_generated_on_demand_and_cached(client, upstream):
+    fingerprint = analyze(client)["personaFingerprint"]
+    params = {"fingerprint": fingerprint, "language": "en"}
+
+    response = client.get("/countries/brazil", params=params)
+    assert response.status_code == 200
+    assert response.json()["country"] == "Brazil"
+    assert response.json()["culturalInsight"] == "Brazil insight for The Dreamer"
+
+    calls = upstream.calls["culturalMap"]
+    assert client.get("/countries/Brazil", params=params).json() == response.json()
+    assert upstream.calls["culturalMap"] == calls
+
+    # Analysis countries come straight from the cache
+    assert client.get("/countries/Japan", params=params).json()["culturalInsight"] == "Japan insight for The Dreamer"
+    assert upstream.calls["culturalMap"] == calls
+
+
+def test_unknown_fingerprint_and_country(client, upstream):
+    assert client.get("/countries/Brazil", params={"fingerprint": "nope"}).status_code == 404
+    fingerprint = analyze(client)["personaFingerprint"]
+    assert client.get("/countries/Atlantis", params={"fingerprint": fingerprint}).status_code == 404
+
+
+def test_fallback_insight_is_not_cached(client, upstream):
+    fingerprint = analyze(client)["personaFingerprint"]
+    params = {"fingerprint": fingerprint, "language": "en"}
+
+    # "UK" is one of the canned fallback countries, so the placeholder would match it
+    upstream.insights_fail = True
+    response = client.get("/countries/UK", params=params)
+    assert response.status_code == 503
+    assert response.headers["retry-after"]
+
+    upstream.insights_fail = False
+    response = client.get("/countries/UK", params=params)
+    assert response.status_code == 200
+    assert response.json()["culturalInsight"] == "UK insight for The Dreamer"
+
+
+def test_fallback_analysis_has_no_fingerprint(client, upstream):
+    upstream.insights_fail = True
+    result = analyze(client)
+    assert result["personaFingerprint"] is None
+    assert result["resultId"] is None
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the local entity index: lookups, eviction and the JSONL log
+"""
+import json
+
+from entity_index import EntityIndex, search_key
+
+
+def build(path=None, maxsize=100) -> EntityIndex:
+    index = EntityIndex(path, maxsize=maxsize)
+    index.add("A1", "Queen", "urn:entity:artist")
+    index.add("A2", "Beyoncé", "urn:entity:artist")
+    index.add("M1", "Dancing Queen", "urn:entity:movie")
+    index.add("M2", "The Matrix", "urn:entity:movie")
+    return index
+
+
+def test_search_key_folds_case_and_accents():
+    assert search_key("  BEYONCÉ ") == "beyonce"
+
+
+def test_exact_lookup_is_typed():
+    index = build()
+    assert index.lookup("queen", "artist") == "A1"
+    assert index.lookup("QUEEN", "urn:entity:movie") is None
+    assert index.lookup("beyonce", "artist") == "A2"
+
+
+def test_prefix_word_prefix_and_trigram_suggestions():
+    index = build()
+    assert [e["id"] for e in index.suggest("que")] == ["A1", "M1"]
+    assert [e["id"] for e in index.suggest("que", "movie")] == ["M1"]
+    assert [e["id"] for e in index.suggest("matr")] == ["M2"]
+    # Typo: no prefix matches, trigram overlap still finds it
+    assert [e["id"] for e in index.suggest("the matirx")] == ["M2"]
+    assert index.suggest("") == []
+
+
+def test_oldest_entity_is_evicted_from_every_map():
+    index = build(maxsize=3)
+    assert len(index) == 3
+    assert "A1" not in index.entities
+    assert index.lookup("queen", "artist") is None
+    assert [e["id"] for e in index.suggest("que")] == ["M1"]
+    assert all("A1" not in ids for ids in index._trigrams.values())
+
+
+def test_renamed_entity_drops_old_keys():
+    index = build()
+    index.add("A1", "Freddie", "artist")
+    assert index.lookup("queen", "artist") is None
+    assert [e["id"] for e in index.suggest("fred")] == ["A1"]
+
+
+def test_log_round_trip_and_compaction(tmp_path):
+    path = str(tmp_path / "entities.jsonl")
+    index = build(path)
+    index.add("A1", "Queen", "artist")  # unchanged, not logged again
+    index.add("A2", "Beyonce", "artist")
+    index.close()
+    with open(path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 5
+
+    loaded = EntityIndex(path)
+    loaded.load()
+    assert loaded.entities["A2"]["name"] == "Beyonce"
+    assert len(loaded) == 4
+    with open(path, encoding="utf-8") as f:
+        assert sorted(json.loads(line)["id"] for line in f) == ["A1", "A2", "M1", "M2"]
+    loaded.close()
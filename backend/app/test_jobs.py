@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Async job mode: POST /jobs/analyze queues the analysis, GET /jobs/{id} reports it
+"""
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from jobs import JobQueue, QueueFullError
+
+PROFILE = {"movies": "Inception", "music": "Radiohead", "brands": "Apple", "gender": "male", "language": "en"}
+
+
+async def no_warmup():
+    main.warmup_state["ready"] = True
+
+
+@pytest.fixture
+def running_client(upstream, monkeypatch):
+    monkeypatch.setattr(main, "run_warmup", no_warmup)
+    # The context manager runs startup, which starts the job workers
+    with TestClient(main.app) as client:
+        yield client
+
+
+def poll(client, status_url: str, timeout: float = 5) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(status_url).json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.02)
+    pytest.fail(f"job did not finish: {job}")
+
+
+def test_submit_then_poll_until_done(running_client, upstream):
+    submitted = running_client.post("/jobs/analyze", json=PROFILE)
+    assert submitted.status_code == 202
+    assert submitted.json()["status"] == "queued"
+
+    job = poll(running_client, submitted.json()["statusUrl"])
+    assert job["status"] == "done"
+    assert job["error"] is None and job["partial"] is None
+    assert job["result"]["persona"]["personaName"] == "The Dreamer"
+    assert job["result"]["resultId"]
+    assert job["finishedAt"] >= job["startedAt"] >= job["createdAt"]
+
+
+def test_failed_job_reports_the_error(running_client, upstream, monkeypatch):
+    def broken(**kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(main, "generate_persona_from_taste", broken)
+    job = poll(running_client, running_client.post("/jobs/analyze", json=PROFILE).json()["statusUrl"])
+    assert job["status"] == "failed"
+    assert "boom" in job["error"]
+
+
+def test_missing_fields_and_unknown_jobs(running_client):
+    assert running_client.post("/jobs/analyze", json={"movies": "Inception"}).status_code == 400
+    assert running_client.get("/jobs/does-not-exist").status_code == 404
+
+
+def test_full_queue_rejects_instead_of_growing():
+    async def scenario():
+        queue = JobQueue(workers=0, max_queued=1)
+        await queue.start()
+        queue.submit(lambda on_stage: {})
+        with pytest.raises(QueueFullError):
+            queue.submit(lambda on_stage: {})
+        assert queue.stats()["queued"] == 1
+        await queue.stop()
+
+    asyncio.run(scenario())
+
+
+def test_finished_jobs_expire(monkeypatch):
+    async def scenario():
+        queue = JobQueue(workers=1, ttl_seconds=60)
+        await queue.start()
+        job = queue.submit(lambda on_stage: on_stage("persona", {"persona": {}}) or {"ok": True})
+        await queue._queue.join()
+        assert queue.get(job.id).to_dict()["result"] == {"ok": True}
+
+        later = time.time() + 120
+        monkeypatch.setattr(time, "time", lambda: later)
+        assert queue.get(job.id) is None
+        await queue.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+LoopLagMonitor measures how late the loop wakes up and reports what blocked it
+"""
+import asyncio
+import time
+
+from loopmonitor import LoopLagMonitor
+
+
+def blocking_call(seconds: float):
+    time.sleep(seconds)
+
+
+def run_with_monitor(monitor: LoopLagMonitor, block: float) -> None:
+    async def scenario():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        blocking_call(block)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+    asyncio.run(scenario())
+
+
+def test_blocking_call_shows_up_as_lag():
+    monitor = LoopLagMonitor(interval=0.01, block_threshold=0.1)
+    run_with_monitor(monitor, 0.2)
+    assert monitor.stalls >= 1
+
+    worst = monitor.take_max_lag()
+    assert worst >= 0.15
+    # The next scrape starts again from the latest tick
+    assert monitor.take_max_lag() < worst
+
+
+def test_debug_watchdog_reports_the_blocking_frame():
+    monitor = LoopLagMonitor(interval=0.01, block_threshold=0.05, debug=True)
+    run_with_monitor(monitor, 0.2)
+    assert monitor.blocked
+    assert "blocking_call" in monitor.blocked[0]["stack"]
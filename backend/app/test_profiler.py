@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+ProfileSession samples the calling thread and writes folded stacks plus a stage summary
+"""
+import json
+import os
+import time
+
+import pytest
+
+from profiler import ProfileSession
+
+
+def busy_pipeline(delay: float, on_stage=None):
+    time.sleep(delay)
+    on_stage("persona", {})
+    time.sleep(delay)
+    on_stage("culturalMap", {})
+    return {"ok": True}
+
+
+def test_run_writes_folded_stacks_and_summary(tmp_path):
+    session = ProfileSession(str(tmp_path), interval=0.002, label="test")
+    assert session.run(busy_pipeline, 0.05) == {"ok": True}
+
+    with open(tmp_path / f"{session.id}.folded", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert "busy_pipeline (test_profiler.py:" in stack
+
+    with open(tmp_path / f"{session.id}.json", encoding="utf-8") as f:
+        summary = json.load(f)
+    assert summary["label"] == "test" and summary["outcome"] == "ok"
+    assert [stage["name"] for stage in summary["stages"]] == ["persona", "culturalMap"]
+    assert all(stage["wallSeconds"] >= 0.04 for stage in summary["stages"])
+    assert summary["samples"] == sum(int(line.rsplit(" ", 1)[1]) for line in lines)
+
+
+def test_failed_run_is_still_written(tmp_path):
+    def broken(on_stage=None):
+        raise ValueError("nope")
+
+    session = ProfileSession(str(tmp_path / "nested"))
+    with pytest.raises(ValueError):
+        session.run(broken)
+    with open(os.path.join(tmp_path, "nested", f"{session.id}.json"), encoding="utf-8") as f:
+        assert json.load(f)["outcome"] == "error: nope"
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Token buckets: refill, the memory and SQLite stores, and the 429s the API returns
+"""
+import time
+
+import pytest
+
+import main
+import ratelimit
+from ratelimit import MemoryBucketStore, SQLiteBucketStore, TokenBucketLimiter
+
+PROFILE = {"movies": "Inception", "music": "Radiohead", "brands": "Apple", "gender": "male", "language": "en"}
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    monkeypatch.setattr(ratelimit.time, "time", clock)
+    return clock
+
+
+@pytest.mark.parametrize("store", ["memory", "sqlite"])
+def test_bucket_drains_and_refills(clock, tmp_path, store):
+    store = MemoryBucketStore() if store == "memory" else SQLiteBucketStore(str(tmp_path / "buckets.sqlite3"))
+    limiter = TokenBucketLimiter(per_minute=60, burst=2, store=store)
+
+    assert limiter.hit("a").allowed and limiter.hit("a").allowed
+    denied = limiter.hit("a")
+    assert not denied.allowed
+    assert denied.remaining == 0
+    assert denied.headers()["Retry-After"] == "1"
+    assert limiter.hit("b").allowed
+
+    clock.now += 1
+    refilled = limiter.hit("a")
+    assert refilled.allowed and refilled.remaining == 0
+    clock.now += 60
+    assert limiter.hit("a").remaining == 1
+
+
+def test_cost_larger_than_the_tokens_left(clock):
+    limiter = TokenBucketLimiter(per_minute=60, burst=10)
+    assert limiter.hit("a", cost=8).allowed
+    result = limiter.hit("a", cost=5)
+    assert not result.allowed
+    assert result.retry_after == pytest.approx(3)
+
+
+def test_sqlite_store_is_shared_between_instances(clock, tmp_path):
+    path = str(tmp_path / "buckets.sqlite3")
+    first = TokenBucketLimiter(per_minute=60, burst=1, store=SQLiteBucketStore(path))
+    second = TokenBucketLimiter(per_minute=60, burst=1, store=SQLiteBucketStore(path))
+    assert first.hit("a").allowed
+    assert not second.hit("a").allowed
+
+
+def test_prune_drops_idle_buckets(clock):
+    store = MemoryBucketStore()
+    store.take("old", 1, 1, 1)
+    clock.now += 100
+    store.take("new", 1, 1, 1)
+    assert store.prune(max_idle_seconds=50) == 1
+    assert len(store) == 1
+
+
+def limit_requests(monkeypatch, burst: int, batch_burst: int = 3):
+    monkeypatch.setattr(main, "RATE_LIMIT_ENABLED", True)
+    store = MemoryBucketStore()
+    for limiter, limit in ((main.rate_limiter, burst), (main.batch_limiter, batch_burst)):
+        monkeypatch.setattr(limiter, "store", store)
+        monkeypatch.setattr(limiter, "burst", limit)
+        monkeypatch.setattr(limiter, "rate", 1 / 60)
+
+
+def test_analyze_returns_429_with_retry_after(client, upstream, monkeypatch):
+    limit_requests(monkeypatch, burst=2)
+    first = client.post("/analyze", json=PROFILE)
+    assert first.status_code == 200
+    assert first.headers["x-ratelimit-limit"] == "2"
+    assert first.headers["x-ratelimit-remaining"] == "1"
+    assert client.post("/analyze", json=PROFILE).status_code == 200
+
+    denied = client.post("/analyze", json=PROFILE)
+    assert denied.status_code == 429
+    assert int(denied.headers["retry-after"]) > 0
+    # X-Forwarded-For is ignored unless the proxy is trusted
+    assert client.post("/analyze", json=PROFILE, headers={"X-Forwarded-For": "10.0.0.2"}).status_code == 429
+    monkeypatch.setattr(main, "RATE_LIMIT_TRUST_PROXY", True)
+    assert client.post("/analyze", json=PROFILE, headers={"X-Forwarded-For": "10.0.0.2"}).status_code == 200
+
+
+def test_batch_has_its_own_per_profile_quota(client, upstream, monkeypatch):
+    limit_requests(monkeypatch, burst=10)
+    profiles = [{**PROFILE, "id": str(i), "randomSeed": i} for i in range(2)]
+    assert client.post("/analyze/batch", json={"profiles": profiles}).status_code == 200
+
+    over_quota = client.post("/analyze/batch", json={"profiles": profiles})
+    assert over_quota.status_code == 429
+    assert "retry-after" in over_quota.headers
+
+    too_big = client.post("/analyze/batch", json={"profiles": profiles * 2})
+    assert too_big.status_code == 400
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Persisted, shareable results: content IDs, retention, and one write per computed analysis
+"""
+import json
+
+import pytest
+
+import main
+import results
+from results import ID_LENGTH, ResultStore
+
+PROFILE = {"movies": "Inception", "music": "Radiohead", "brands": "Apple", "gender": "male", "language": "en"}
+
+
+def test_cache_hits_reuse_the_stored_result(client, upstream, monkeypatch):
+    puts = []
+    store = main.get_result_store()
+    original_put = store.put
+    monkeypatch.setattr(store, "put", lambda payload: puts.append(payload) or original_put(payload))
+
+    first = client.post("/v2/analyze", json=PROFILE).json()
+    second = client.post("/v2/analyze", json=PROFILE).json()
+    assert len(puts) == 1
+    assert first["resultId"] and second["resultId"] == first["resultId"]
+    assert second["personaFingerprint"] == first["personaFingerprint"]
+
+    shared = client.get(f"/results/{first['resultId']}")
+    assert shared.status_code == 200
+    assert shared.json()["persona"]["personaName"] == "The Dreamer"
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(results.time, "time", clock)
+    return clock
+
+
+def test_round_trip_with_a_content_id(tmp_path):
+    store = ResultStore(str(tmp_path / "results.sqlite3"))
+    payload = {"persona": {"personaName": "Hayalperest"}, "countryInsights": {}}
+    rid = store.put(payload)
+    assert len(rid) == ID_LENGTH
+    # Key order does not change the ID, storing again does not add a row
+    assert store.put({"countryInsights": {}, "persona": {"personaName": "Hayalperest"}}) == rid
+    assert len(store) == 1
+    assert json.loads(store.get(rid)) == payload
+    assert store.get("missing") is None
+
+
+def test_prune_keeps_recently_read_results(tmp_path, clock):
+    store = ResultStore(str(tmp_path / "results.sqlite3"), touch_after=10)
+    read, unread = store.put({"n": 1}), store.put({"n": 2})
+
+    clock.now += 50
+    assert store.get(read) is not None
+    clock.now += 50
+    assert store.prune(max_age_seconds=75) == 1
+    assert store.get(read) is not None
+    assert store.get(unread) is None
+
+
+def test_shared_link_is_immutable_and_revalidates(client, upstream):
+    rid = client.post("/v2/analyze", json=PROFILE).json()["resultId"]
+    shared = client.get(f"/results/{rid}")
+    assert "immutable" in shared.headers["cache-control"]
+    assert client.get(f"/results/{rid}", headers={"If-None-Match": shared.headers["etag"]}).status_code == 304
+    assert client.get("/results/unknown").status_code == 404
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the upstream scheduler: lane fairness and wait timeouts
+"""
+import threading
+import time
+
+import pytest
+
+from scheduler import SchedulerTimeout, UpstreamScheduler, lane, current_lane
+
+
+def wait_for(predicate, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def queued(scheduler: UpstreamScheduler, lane_name: str) -> int:
+    return scheduler.stats()["api"]["queued"][lane_name]
+
+
+def test_lane_context_manager():
+    assert current_lane.get() == "interactive"
+    with lane("batch"):
+        assert current_lane.get() == "batch"
+    assert current_lane.get() == "interactive"
+    with pytest.raises(ValueError):
+        with lane("bulk"):
+            pass
+
+
+def test_grants_follow_lane_weights():
+    scheduler = UpstreamScheduler({"api": 1}, weights={"interactive": 3, "batch": 1, "prefetch": 1})
+    scheduler.acquire("api", "interactive")
+    order = []
+    lock = threading.Lock()
+
+    def worker(lane_name):
+        scheduler.acquire("api", lane_name)
+        with lock:
+            order.append(lane_name)
+        scheduler.release("api")
+
+    threads = []
+    for lane_name, count in (("interactive", 6), ("batch", 6)):
+        for _ in range(count):
+            thread = threading.Thread(target=worker, args=(lane_name,))
+            thread.start()
+            threads.append(thread)
+    wait_for(lambda: queued(scheduler, "interactive") == 6 and queued(scheduler, "batch") == 6)
+    scheduler.release("api")
+    for thread in threads:
+        thread.join(2)
+
+    # Weight 3:1 -> the first eight grants hold six interactive and two batch
+    assert order[:8].count("interactive") == 6
+    assert order[:8].count("batch") == 2
+    assert len(order) == 12
+
+
+def test_timeout_removes_only_its_own_waiter():
+    scheduler = UpstreamScheduler({"api": 1})
+    scheduler.acquire("api")
+    results = {}
+
+    def patient():
+        scheduler.acquire("api", "batch", timeout=5)
+        results["patient"] = True
+        scheduler.release("api")
+
+    patient_thread = threading.Thread(target=patient)
+    patient_thread.start()
+    wait_for(lambda: queued(scheduler, "batch") == 1)
+
+    # Queued behind the patient waiter in the same lane, then gives up
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire("api", "batch", timeout=0.05)
+
+    assert queued(scheduler, "batch") == 1
+    scheduler.release("api")
+    patient_thread.join(2)
+    assert results.get("patient") is True
+
+    stats = scheduler.stats()["api"]
+    assert stats["active"] == 0
+    assert stats["timeouts"] == 1
+    assert stats["queued"]["batch"] == 0
+
+
+def test_slot_releases_on_error():
+    scheduler = UpstreamScheduler({"api": 1})
+    with pytest.raises(RuntimeError):
+        with scheduler.slot("api"):
+            raise RuntimeError("boom")
+    assert scheduler.stats()["api"]["active"] == 0
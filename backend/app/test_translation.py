@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the translation string walk
+"""
+from translation import collect_strings, parse_translation, replace_strings
+
+
+ANALYSIS = {
+    "persona": {
+        "personaName": "The Dreamer",
+        "culturalTwin": "David Bowie",
+        "culturalDNAScore": {"Europe": "60%", "Asia": "40%"},
+    },
+    "countryInsights": {"Japan": {"country": "Japan", "culturalInsight": "Quiet and precise"}},
+    "personaFingerprint": "abc123",
+    "resultId": "r2d2",
+}
+
+
+def test_names_ids_and_score_values_are_skipped():
+    assert collect_strings(ANALYSIS) == ["The Dreamer", "Europe", "Asia", "Quiet and precise"]
+
+
+def test_replace_keeps_untranslated_fields():
+    translated = replace_strings(ANALYSIS, iter(["Hayalperest", "Avrupa", "Asya", "Sakin ve titiz"]))
+    assert translated["persona"]["personaName"] == "Hayalperest"
+    assert translated["persona"]["culturalDNAScore"] == {"Avrupa": "60%", "Asya": "40%"}
+    assert translated["countryInsights"]["Japan"]["country"] == "Japan"
+    assert translated["personaFingerprint"] == "abc123"
+    assert translated["resultId"] == "r2d2"
+
+
+def test_parse_translation_checks_length():
+    assert parse_translation('```json\n["a", "b"]\n```', 2) == ["a", "b"]
+    assert parse_translation('["a"]', 2) is None
+    assert parse_translation("not json", 1) is None
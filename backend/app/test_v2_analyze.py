@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+/v2/analyze returns the persona as a nested object, including when GPT
+returns fields in a shape the v1 contract passes through untouched
+"""
+import pytest
+
+PROFILE = {"movies": "Inception", "music": "Radiohead", "brands": "Apple", "gender": "male", "language": "en", "randomSeed": 123}
+
+
+def test_v2_returns_nested_persona(client, upstream):
+    response = client.post("/v2/analyze", json=PROFILE)
+    assert response.status_code == 200
+    result = response.json()
+    assert isinstance(result["persona"], dict)
+    assert result["persona"]["personaName"] == "The Dreamer"
+    assert result["culturalTwin"] == result["persona"]["culturalTwin"] == "David Bowie"
+    assert set(result["countryInsights"]) == {"USA", "South Korea", "UK", "Japan"}
+    assert result["personaFingerprint"]
+
+
+def test_v1_and_v2_agree(client, upstream):
+    v1 = client.post("/analyze", json=PROFILE).json()
+    v2 = client.post("/v2/analyze", json=PROFILE).json()
+    assert v1["culturalTwin"] == v2["culturalTwin"]
+    assert {c: i["culturalInsight"] for c, i in v1["countryInsights"].items()} == {c: i["culturalInsight"] for c, i in v2["countryInsights"].items()}
+    assert upstream.calls["persona"] == 1
+
+
+@pytest.mark.parametrize("field, value, expected", [
+    ("culturalTwin", {"name": "Björk", "reason": "both experimental"}, "Björk"),
+    ("traits", "curious, calm", ["curious", "calm"]),
+    ("culturalDNAScore", {"Europe": {"West": "30%", "North": 20}, "Asia": "50%"}, {"Europe / West": "30%", "Europe / North": 20, "Asia": "50%"}),
+    ("archetype", "Explorer", {"name": "Explorer", "description": ""}),
+])
+def test_malformed_gpt_output_is_coerced(client, upstream, field, value, expected):
+    upstream.persona[field] = value
+    assert client.post("/analyze", json=PROFILE).status_code == 200
+
+    for response in (client.post("/v2/analyze", json=PROFILE), client.get("/v2/analyze", params=PROFILE)):
+        assert response.status_code == 200
+        assert response.json()["persona"][field] == expected
+        if field == "culturalTwin":
+            assert response.json()["culturalTwin"] == expected
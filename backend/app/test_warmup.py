@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Startup warm-up: /ready flips once it finishes, and it never runs against a cassette
+"""
+import asyncio
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def warmup_state(monkeypatch):
+    state = {"ready": False, "entities": 0, "resolved": 0, "durationSeconds": None, "error": None, "skipped": None}
+    monkeypatch.setattr(main, "warmup_state", state)
+    return state
+
+
+@pytest.mark.parametrize("mode", ["record", "replay"])
+def test_skipped_while_a_cassette_is_active(monkeypatch, warmup_state, mode):
+    monkeypatch.setattr(main, "UPSTREAM_CASSETTE_MODE", mode)
+    monkeypatch.setattr(main, "open_upstream_connections", lambda: pytest.fail("warm-up must not reach the cassette"))
+    monkeypatch.setattr(main, "warm_entity", lambda *a: pytest.fail("warm-up must not reach the cassette"))
+
+    asyncio.run(main.run_warmup())
+    assert warmup_state["ready"] is True
+    assert mode in warmup_state["skipped"]
+    assert warmup_state["error"] is None
@@ -0,0 +1,82 @@
+"""
+Cross-language reuse of finished analyses
+
+Switching the UI language used to rerun the whole pipeline (Qloo + two GPT
+calls). When an analysis for the same canonical request exists in another
+language, its translatable strings are pulled out in a fixed walk order,
+translated in one small GPT call as a flat JSON list, and written back into
+a copy of the same structure. Keys, numbers, IDs and fields that hold names
+(country, songs, films, the cultural twin) are left untouched. The cultural
+DNA score is the one place where the keys are prose (region or trait labels)
+and the values are percentages, so there the keys are translated instead.
+"""
+import json
+from typing import Any, Iterator
+
+# Values under these keys are proper names, identifiers or numbers, not prose
+UNTRANSLATED_KEYS = frozenset({
+    "country", "music", "movies", "culturalTwin", "user_preferences", "id",
+    "personaFingerprint", "resultId", "randomSeed",
+})
+
+# Dicts under these keys have translatable keys and untranslated values
+KEY_TRANSLATED = frozenset({"culturalDNAScore"})
+
+
+def collect_strings(value: Any, out: list[str] | None = None, key: str = "") -> list[str]:
+    out = [] if out is None else out
+    if key in UNTRANSLATED_KEYS:
+        return out
+    if key in KEY_TRANSLATED:
+        if isinstance(value, dict):
+            out.extend(k for k in value if k.strip())
+        return out
+    if isinstance(value, str):
+        if value.strip():
+            out.append(value)
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            collect_strings(v, out, k)
+    elif isinstance(value, list):
+        for item in value:
+            collect_strings(item, out, key)
+    return out
+
+
+def replace_strings(value: Any, translated: Iterator[str], key: str = "") -> Any:
+    """Same walk as collect_strings, taking replacements from the iterator"""
+    if key in UNTRANSLATED_KEYS:
+        return value
+    if key in KEY_TRANSLATED:
+        if isinstance(value, dict):
+            return {(next(translated) if k.strip() else k): v for k, v in value.items()}
+        return value
+    if isinstance(value, str):
+        return next(translated) if value.strip() else value
+    if isinstance(value, dict):
+        return {k: replace_strings(v, translated, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [replace_strings(item, translated, key) for item in value]
+    return value
+
+
+def build_translation_prompt(strings: list[str], source_language: str, target_language: str) -> str:
+    return (
+        f"Translate every string in the JSON list below from {source_language} to {target_language}.\n"
+        "Keep names of people, bands, songs, films and brands unchanged.\n"
+        f"Return ONLY a JSON list with exactly {len(strings)} strings, in the same order.\n\n"
+        + json.dumps(strings, ensure_ascii=False)
+    )
+
+
+def parse_translation(content: str, expected: int) -> list[str] | None:
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.split("\n", 1)[-1].rsplit("```", 1)[0]
+    try:
+        translated = json.loads(content)
+    except ValueError:
+        return None
+    if not isinstance(translated, list) or len(translated) != expected or not all(isinstance(s, str) for s in translated):
+        return None
+    return translated